@@ -0,0 +1,69 @@
+"""
+Cold-start cost of loading templates from a directory tree vs. a bundle.
+
+Usage:
+    python benchmarks/bench_bundle.py [--templates N]
+"""
+
+from __future__ import annotations
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+from fastapi_post_office.templates.bundle import TemplateBundle, write_bundle
+from fastapi_post_office.templates.loader import load_templates
+
+
+def _make_tree(root: Path, count: int) -> None:
+    for i in range(count):
+        tdir = root / f"template_{i}"
+        tdir.mkdir()
+        (tdir / "manifest.json").write_text(
+            f'{{"name":"template_{i}","revision":1,"description":"Bench","required_vars":["name"]}}',
+            encoding="utf-8",
+        )
+        (tdir / "subject.j2").write_text("Hello {{ name }}", encoding="utf-8")
+        (tdir / "html.j2").write_text(
+            "<p>{% for row in rows %}{{ row }}{% endfor %}</p>" * 20, encoding="utf-8"
+        )
+        (tdir / "text.j2").write_text("Hello {{ name }}", encoding="utf-8")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--templates", type=int, default=1_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp) / "templates"
+        root.mkdir()
+        _make_tree(root, args.templates)
+        bundle_path = Path(tmp) / "templates.fapo"
+
+        start = time.perf_counter()
+        sources = load_templates(root, max_bytes=1_000_000)
+        tree_seconds = time.perf_counter() - start
+        write_bundle(bundle_path, sources)
+
+        start = time.perf_counter()
+        bundle = TemplateBundle(bundle_path)
+        open_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        bundle.get("template_0")
+        first_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        for name in bundle.names():
+            bundle.get(name)
+        all_seconds = time.perf_counter() - start
+        bundle.close()
+
+    print(f"load_templates (tree)     {tree_seconds * 1e3:9.1f} ms")
+    print(f"open bundle (index only)  {open_seconds * 1e3:9.1f} ms")
+    print(f"first template from bundle{first_seconds * 1e3:9.2f} ms")
+    print(f"all templates from bundle {all_seconds * 1e3:9.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
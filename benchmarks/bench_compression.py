@@ -0,0 +1,172 @@
+"""
+Body compression: CPU cost of writing/reading bodies against storage saved.
+
+The corpus is generated transactional/newsletter HTML (table layout, inline
+styles, tracking links, per-recipient text), roughly 5-75 KB per body.
+
+Usage:
+    python benchmarks/bench_compression.py [--bodies N] [--seed S]
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from sqlalchemy import create_engine, select
+
+from fastapi_post_office.config import settings
+from fastapi_post_office.db import Base, EmailMessage, create_session_factory
+from fastapi_post_office.db.compression import ZLIB, ZSTD, _zstd, compress_text, decompress_text
+
+WORDS = [
+    "account",
+    "order",
+    "shipped",
+    "invoice",
+    "welcome",
+    "team",
+    "update",
+    "product",
+    "offer",
+    "limited",
+    "delivery",
+    "return",
+    "support",
+    "thanks",
+    "review",
+    "unsubscribe",
+    "preferences",
+    "password",
+    "reset",
+    "security",
+    "report",
+    "weekly",
+    "monthly",
+    "summary",
+    "discount",
+    "member",
+    "upgrade",
+    "renew",
+    "trial",
+]
+
+ROW = (
+    '<tr><td style="padding:12px 24px;font-family:Helvetica,Arial,sans-serif;'
+    'font-size:15px;line-height:22px;color:#333333;">{text}</td>'
+    '<td align="right" style="padding:12px 24px;font-family:Helvetica,Arial,sans-serif;'
+    'font-size:15px;color:#111111;"><a href="https://example.com/p/{sku}?utm_source=email'
+    '&amp;utm_medium=newsletter&amp;utm_campaign={campaign}&amp;rid={rid}" '
+    'style="color:#0b5ed7;text-decoration:none;">{price}</a></td></tr>'
+)
+
+
+def _sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def _body(rng: random.Random, index: int) -> str:
+    rows = "\n".join(
+        ROW.format(
+            text=_sentence(rng, rng.randint(6, 20)),
+            sku=rng.randint(1000, 99999),
+            campaign=f"c{index % 7}",
+            rid=rng.getrandbits(64),
+            price=f"${rng.randint(1, 999)}.{rng.randint(0, 99):02d}",
+        )
+        for _ in range(rng.randint(20, 250))
+    )
+    return (
+        '<!DOCTYPE html><html><head><meta charset="utf-8"><style>'
+        "body{margin:0;padding:0;background:#f4f4f4}table{border-collapse:collapse}"
+        "@media only screen and (max-width:600px){.container{width:100%!important}}"
+        '</style></head><body><table class="container" width="600" align="center" '
+        'style="background:#ffffff;">'
+        f"<tr><td><h1>Hello user {index}</h1><p>{_sentence(rng, 30)}</p></td></tr>"
+        f"{rows}</table></body></html>"
+    )
+
+
+def _bench_codec(name: str, codec: str, bodies: list[str]) -> None:
+    raw = sum(len(body.encode("utf-8")) for body in bodies)
+    start = time.perf_counter()
+    stored = [compress_text(body, codec) for body in bodies]
+    write = time.perf_counter() - start
+    start = time.perf_counter()
+    for value in stored:
+        decompress_text(value)
+    read = time.perf_counter() - start
+    size = sum(len(value) for value in stored)
+    n = len(bodies)
+    print(
+        f"{name:<6} ratio {raw / size:5.2f}x  stored {size / 1e6:7.2f} MB  "
+        f"write {write / n * 1e6:7.1f} us/body ({raw / write / 1e6:6.1f} MB/s)  "
+        f"read {read / n * 1e6:7.1f} us/body ({raw / read / 1e6:6.1f} MB/s)"
+    )
+
+
+def _bench_sqlite(bodies: list[str], compress: bool) -> None:
+    settings.compress_bodies = compress
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "bench.db"
+        engine = create_engine(f"sqlite+pysqlite:///{path}")
+        Base.metadata.create_all(engine)
+        session = create_session_factory(engine)()
+        messages = [
+            EmailMessage(
+                from_email="no-reply@example.com",
+                to_json=[f"user{i}@example.com"],
+                cc_json=[],
+                bcc_json=[],
+                subject="Bench",
+                html_body=body,
+                text_body=None,
+            )
+            for i, body in enumerate(bodies)
+        ]
+        start = time.perf_counter()
+        session.add_all(messages)
+        session.commit()
+        write = time.perf_counter() - start
+        session.close()
+
+        session = create_session_factory(engine)()
+        start = time.perf_counter()
+        loaded = session.scalars(select(EmailMessage)).all()
+        read = time.perf_counter() - start
+        assert sum(len(m.html_body or "") for m in loaded) == sum(len(b) for b in bodies)
+        session.close()
+        engine.dispose()
+        label = "sqlite compressed" if compress else "sqlite plain"
+        print(
+            f"{label:<18} file {path.stat().st_size / 1e6:7.2f} MB  "
+            f"insert {write * 1e3:8.1f} ms  load {read * 1e3:8.1f} ms"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--bodies", type=int, default=2_000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    bodies = [_body(rng, i) for i in range(args.bodies)]
+    raw = sum(len(body.encode("utf-8")) for body in bodies)
+    print(f"corpus: {len(bodies)} bodies, {raw / 1e6:.2f} MB, {raw / len(bodies) / 1e3:.1f} KB avg")
+
+    _bench_codec("zlib", ZLIB, bodies)
+    if _zstd() is not None:
+        _bench_codec("zstd", ZSTD, bodies)
+    else:
+        print("zstd   skipped (pip install zstandard)")
+
+    _bench_sqlite(bodies, compress=False)
+    _bench_sqlite(bodies, compress=True)
+
+
+if __name__ == "__main__":
+    main()
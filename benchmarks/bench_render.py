@@ -0,0 +1,87 @@
+"""
+Per-render cost of each Jinja environment mode.
+
+Usage:
+    python benchmarks/bench_render.py [--iterations N]
+"""
+
+from __future__ import annotations
+
+import argparse
+import timeit
+
+from jinja2 import StrictUndefined
+from jinja2.sandbox import SandboxedEnvironment
+
+from fastapi_post_office.templates.loader import TemplateSource
+from fastapi_post_office.templates.manifest import TemplateManifest
+from fastapi_post_office.templates.renderer import render_template, template_cache
+
+HTML = """
+<html><body>
+<h1>Hello {{ user.first_name }}</h1>
+<table>
+{% for item in items %}
+  <tr><td>{{ item.name }}</td><td>{{ item.qty }}</td><td>{{ "%.2f"|format(item.price) }}</td></tr>
+{% endfor %}
+</table>
+<p>Total: {{ "%.2f"|format(total) }}</p>
+</body></html>
+"""
+
+SOURCE = TemplateSource(
+    manifest=TemplateManifest(
+        name="bench_order",
+        revision=1,
+        description="Benchmark",
+        required_vars=["user", "items", "total"],
+        tags=[],
+        content_policy=None,
+    ),
+    subject_template="Order for {{ user.first_name }}",
+    html_template=HTML,
+    text_template="Hello {{ user.first_name }}, total {{ total }}",
+    source_hash="bench",
+)
+
+CONTEXT = {
+    "user": {"first_name": "Ana"},
+    "items": [{"name": f"item-{i}", "qty": i, "price": i * 1.5} for i in range(50)],
+    "total": 1234.5,
+}
+
+
+def _uncached() -> None:
+    # What every render cost before environments and compiled templates were shared.
+    env = SandboxedEnvironment(undefined=StrictUndefined, autoescape=False)
+    env.from_string(SOURCE.subject_template).render(**CONTEXT)
+    env.from_string(HTML).render(**CONTEXT)
+    env.from_string(SOURCE.text_template or "").render(**CONTEXT)
+
+
+def _sandboxed() -> None:
+    render_template(SOURCE, CONTEXT, strict=True, max_bytes=1_000_000)
+
+
+def _trusted() -> None:
+    render_template(SOURCE, CONTEXT, strict=True, max_bytes=1_000_000, trusted=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=2_000)
+    args = parser.parse_args()
+
+    template_cache.clear()
+    for label, fn in (
+        ("fresh sandbox per render", _uncached),
+        ("shared sandbox (cached)", _sandboxed),
+        ("shared trusted (cached)", _trusted),
+    ):
+        fn()
+        seconds = timeit.timeit(fn, number=args.iterations)
+        print(f"{label:<28} {seconds / args.iterations * 1e6:9.1f} us/render")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""
+Batch rendering throughput: in-process vs RenderExecutor process pool.
+
+Usage:
+    python benchmarks/bench_render_pool.py [--count N] [--workers W]
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import time
+
+from bench_render import CONTEXT, SOURCE
+
+from fastapi_post_office.templates.executor import RenderExecutor
+from fastapi_post_office.templates.renderer import render_many
+
+
+def _contexts(count: int):
+    for i in range(count):
+        yield {**CONTEXT, "user": {"first_name": f"user-{i}"}}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--count", type=int, default=5_000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    ok = sum(
+        r.ok for r in render_many(SOURCE, _contexts(args.count), strict=True, max_bytes=1_000_000)
+    )
+    elapsed = time.perf_counter() - started
+    print(f"in-process          {ok / elapsed:10.0f} renders/s")
+
+    with RenderExecutor(max_workers=args.workers, preload=[SOURCE]) as executor:
+        # Start the workers before timing.
+        executor.render(SOURCE, CONTEXT, strict=True, max_bytes=1_000_000)
+        started = time.perf_counter()
+        results = executor.render_many(
+            SOURCE, _contexts(args.count), strict=True, max_bytes=1_000_000
+        )
+        ok = sum(r.ok for r in results)
+        elapsed = time.perf_counter() - started
+    print(f"pool ({args.workers:>2} workers)   {ok / elapsed:10.0f} renders/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+import dataclasses
+from pathlib import Path
+
+import typer
+
+from fastapi_post_office.config import settings
+from fastapi_post_office.templates.bundle import BundleError, write_bundle
+from fastapi_post_office.templates.loader import TemplateLoadError, load_templates
+from fastapi_post_office.templates.partials import PartialError, load_partials
+from fastapi_post_office.templates.renderer import (
+    RenderError,
+    precompile_template,
+    vet_partial,
+    vet_template,
+)
+
+
+class BuildError(RuntimeError):
+    pass
+
+
+def build_templates_command(path: str, output: str, compiled: bool = True) -> None:
+    root = Path(path)
+    try:
+        partials = load_partials(root, max_bytes=settings.max_template_bytes)
+        sources = load_templates(root, max_bytes=settings.max_template_bytes)
+    except (TemplateLoadError, PartialError) as exc:
+        raise BuildError(str(exc)) from exc
+
+    # Same vetting as sync-templates: bundled templates may be rendered in trusted mode.
+    for partial in partials:
+        try:
+            vet_partial(partial)
+        except RenderError as exc:
+            raise BuildError(f"Partial {partial.name} is invalid: {exc}") from exc
+    for index, source in enumerate(sources):
+        try:
+            vet_template(source)
+            if compiled:
+                sources[index] = dataclasses.replace(source, compiled=precompile_template(source))
+        except RenderError as exc:
+            raise BuildError(f"Template {source.manifest.name} is invalid: {exc}") from exc
+
+    try:
+        size = write_bundle(Path(output), sources, partials, include_compiled=compiled)
+    except (BundleError, OSError) as exc:
+        raise BuildError(str(exc)) from exc
+
+    typer.echo(f"Built {output}: {len(sources)} templates, {len(partials)} partials ({size} bytes)")
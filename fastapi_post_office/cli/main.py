@@ -2,6 +2,7 @@ from __future__ import annotations
 
 import typer
 
+from .build_templates import build_templates_command
 from .sync_templates import sync_templates_command
 
 app = typer.Typer(add_completion=False)
@@ -11,5 +12,31 @@ app = typer.Typer(add_completion=False)
 def sync_templates(
     path: str = typer.Option(..., "--path", help="Templates root path"),
     upsert: bool = typer.Option(False, "--upsert", help="Upsert templates"),
+    workers: int | None = typer.Option(
+        None, "--workers", min=1, help="Parallel template loaders (default: based on CPU count)"
+    ),
+    hash_cache: bool = typer.Option(
+        True, "--hash-cache/--no-hash-cache", help="Reuse source hashes from <path>/.fapo-cache"
+    ),
+    hash_cache_path: str | None = typer.Option(
+        None, "--hash-cache-path", help="Keep the hash cache in this file instead"
+    ),
 ) -> None:
-    sync_templates_command(path=path, upsert=upsert)
+    sync_templates_command(
+        path=path,
+        upsert=upsert,
+        workers=workers,
+        hash_cache=hash_cache,
+        hash_cache_path=hash_cache_path,
+    )
+
+
+@app.command("build-templates")
+def build_templates(
+    path: str = typer.Option(..., "--path", help="Templates root path"),
+    output: str = typer.Option("templates.fapo", "--output", help="Bundle file to write"),
+    compiled: bool = typer.Option(
+        True, "--compiled/--no-compiled", help="Include precompiled template code"
+    ),
+) -> None:
+    build_templates_command(path=path, output=output, compiled=compiled)
@@ -1,44 +1,177 @@
 from __future__ import annotations
 
+import functools
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
 from pathlib import Path
+from time import perf_counter
+from typing import Any
 
 import typer
 
 from fastapi_post_office.config import settings
 from fastapi_post_office.db import (
     EmailRepository,
-    EmailTemplate,
+    EmailTemplatePartial,
     create_engine_from_url,
     create_session_factory,
 )
-from fastapi_post_office.templates.loader import TemplateLoadError, load_templates
+from fastapi_post_office.templates.hasher import HashCache
+from fastapi_post_office.templates.loader import (
+    TemplateLoadError,
+    TemplateSource,
+    TemplateStamp,
+    load_template_dir,
+    stamp_template_dir,
+    template_dirs,
+)
+from fastapi_post_office.templates.partials import PartialError, PartialSource, load_partials
+from fastapi_post_office.templates.renderer import (
+    RenderError,
+    precompile_template,
+    vet_partial,
+    vet_template,
+)
 
 
 class SyncError(RuntimeError):
     pass
 
 
-def _template_from_source(source) -> EmailTemplate:
-    return EmailTemplate(
-        name=source.manifest.name,
-        revision=source.manifest.revision,
-        subject_template=source.subject_template,
-        html_template=source.html_template,
-        text_template=source.text_template,
-        required_vars_json=source.manifest.required_vars,
-        content_policy_json=source.manifest.content_policy,
-        tags_json=source.manifest.tags,
-        source_hash=source.source_hash,
-        is_active=True,
+@dataclass
+class SyncSummary:
+    created: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    skipped: int = 0
+    scan_seconds: float = 0.0
+    load_seconds: float = 0.0
+    write_seconds: float = 0.0
+
+    @property
+    def total(self) -> int:
+        return self.created + self.updated + self.unchanged + self.skipped
+
+    def __str__(self) -> str:
+        elapsed = self.scan_seconds + self.load_seconds + self.write_seconds
+        return (
+            f"{self.total} templates: {self.created} new, {self.updated} updated, "
+            f"{self.unchanged} unchanged, {self.skipped} skipped in {elapsed:.2f}s "
+            f"(scan {self.scan_seconds:.2f}s, load {self.load_seconds:.2f}s, "
+            f"write {self.write_seconds:.2f}s)"
+        )
+
+
+def _template_values(source: TemplateSource) -> dict[str, Any]:
+    return {
+        "name": source.manifest.name,
+        "revision": source.manifest.revision,
+        "subject_template": source.subject_template,
+        "html_template": source.html_template,
+        "text_template": source.text_template,
+        "required_vars_json": source.manifest.required_vars,
+        "content_policy_json": source.manifest.content_policy,
+        "tags_json": source.manifest.tags,
+        "source_hash": source.source_hash,
+        "template_vars_json": (
+            list(source.template_vars) if source.template_vars is not None else None
+        ),
+        "dependencies_json": source.dependencies,
+        "compiled_json": precompile_template(source),
+        "is_active": True,
+    }
+
+
+def _partial_from_source(partial: PartialSource) -> EmailTemplatePartial:
+    return EmailTemplatePartial(
+        name=partial.name, source=partial.source, source_hash=partial.source_hash
     )
 
 
-def sync_templates_command(path: str, upsert: bool) -> None:
-    root = Path(path)
+def _prepare(stamp: TemplateStamp, partials: Mapping[str, PartialSource]) -> dict[str, Any]:
     try:
-        sources = load_templates(root, max_bytes=settings.max_template_bytes)
+        source = load_template_dir(
+            stamp.path, max_bytes=settings.max_template_bytes, partials=partials
+        )
     except TemplateLoadError as exc:
         raise SyncError(str(exc)) from exc
+    # Vetting: every template must compile under the sandbox and pass the static
+    # attribute check before it reaches the DB, which is what allows
+    # FAPO_TRUSTED_TEMPLATES to skip the sandbox at render time.
+    try:
+        vet_template(source)
+        return _template_values(source)
+    except RenderError as exc:
+        raise SyncError(f"Template {source.manifest.name} is invalid: {exc}") from exc
+
+
+def _load_changed(
+    stamps: list[TemplateStamp], partials: Mapping[str, PartialSource], workers: int | None
+) -> list[dict[str, Any]]:
+    prepare = functools.partial(_prepare, partials=partials)
+    if len(stamps) < 2 or workers == 1:
+        return [prepare(stamp) for stamp in stamps]
+    # Parsing and compiling is pure-Python CPU work, so spread it across processes.
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(prepare, stamps, chunksize=max(1, len(stamps) // 64)))
+
+
+def _dependencies_current(
+    dependencies: Mapping[str, str] | None, partials: Mapping[str, PartialSource]
+) -> bool:
+    return all(
+        (partial := partials.get(name)) is not None and partial.source_hash == source_hash
+        for name, source_hash in (dependencies or {}).items()
+    )
+
+
+def sync_templates_command(
+    path: str,
+    upsert: bool,
+    workers: int | None = None,
+    hash_cache: bool = True,
+    hash_cache_path: str | None = None,
+) -> None:
+    """
+    Sync a templates directory into the database.
+
+    Existing rows are read in one query and compared by source hash, so unchanged
+    templates are never parsed or compiled. Directories are hashed on a thread pool,
+    changed ones are parsed and compiled on a process pool, and everything is
+    written with a single bulk upsert.
+    """
+    summary = SyncSummary()
+    root = Path(path)
+    started = perf_counter()
+    try:
+        partials = {p.name: p for p in load_partials(root, max_bytes=settings.max_template_bytes)}
+        dirs = template_dirs(root)
+        # Source hashes of unchanged files come from <root>/.fapo-cache, or from
+        # hash_cache_path to keep the cache out of the source tree.
+        cache = (
+            HashCache.for_root(root, Path(hash_cache_path) if hash_cache_path else None)
+            if hash_cache
+            else None
+        )
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            stamps = list(pool.map(functools.partial(stamp_template_dir, hash_cache=cache), dirs))
+    except (TemplateLoadError, PartialError) as exc:
+        raise SyncError(str(exc)) from exc
+    for partial in partials.values():
+        try:
+            vet_partial(partial)
+        except RenderError as exc:
+            raise SyncError(f"Partial {partial.name} is invalid: {exc}") from exc
+    if cache is not None:
+        cache.save()
+
+    seen: dict[str, Path] = {}
+    for stamp in stamps:
+        name = stamp.manifest.name
+        if name in seen:
+            raise SyncError(f"Template {name} is defined in both {seen[name]} and {stamp.path}")
+        seen[name] = stamp.path
 
     engine = create_engine_from_url(settings.database_url)
     session_factory = create_session_factory(engine)
@@ -46,23 +179,54 @@ def sync_templates_command(path: str, upsert: bool) -> None:
     repo = EmailRepository(session)
 
     try:
-        for source in sources:
-            existing = repo.get_template(source.manifest.name, active_only=False)
-            if existing:
-                if source.manifest.revision < existing.revision:
-                    raise SyncError(f"Template {source.manifest.name} revision is lower than DB")
+        existing_partials = {p.name: p for p in repo.get_partials()}
+        for partial in partials.values():
+            current = existing_partials.get(partial.name)
+            if current is not None and (not upsert or current.source_hash == partial.source_hash):
+                continue
+            repo.upsert_partial(_partial_from_source(partial))
+
+        index = {row.name: row for row in repo.get_template_index()}
+        changed: list[TemplateStamp] = []
+        for stamp in stamps:
+            existing = index.get(stamp.manifest.name)
+            if existing is not None:
+                if stamp.manifest.revision < existing.revision:
+                    raise SyncError(f"Template {stamp.manifest.name} revision is lower than DB")
                 if (
-                    source.manifest.revision == existing.revision
-                    and source.source_hash != existing.source_hash
+                    stamp.manifest.revision == existing.revision
+                    and stamp.source_hash != existing.source_hash
                 ):
-                    raise SyncError(
-                        f"Template {source.manifest.name} changed without revision bump"
-                    )
+                    raise SyncError(f"Template {stamp.manifest.name} changed without revision bump")
                 if not upsert:
+                    summary.skipped += 1
+                    continue
+                # A template is unchanged when its own files and every partial it
+                # depends on still hash the same. Rows synced before variable
+                # discovery are refreshed once, and an upsert reactivates a
+                # deactivated template.
+                if (
+                    stamp.source_hash == existing.source_hash
+                    and existing.is_active
+                    and existing.template_vars_json is not None
+                    and _dependencies_current(existing.dependencies_json, partials)
+                ):
+                    summary.unchanged += 1
                     continue
+                summary.updated += 1
+            else:
+                summary.created += 1
+            changed.append(stamp)
+        summary.scan_seconds = perf_counter() - started
+
+        started = perf_counter()
+        rows = _load_changed(changed, partials, workers)
+        summary.load_seconds = perf_counter() - started
 
-            repo.upsert_template(_template_from_source(source))
+        started = perf_counter()
+        repo.bulk_upsert_templates(rows)
         repo.commit()
+        summary.write_seconds = perf_counter() - started
     except Exception:
         repo.rollback()
         raise
@@ -71,3 +235,4 @@ def sync_templates_command(path: str, upsert: bool) -> None:
         engine.dispose()
 
     typer.echo("Templates synced successfully")
+    typer.echo(f"Synced {summary}")
@@ -35,15 +35,59 @@ class Settings(BaseSettings):
     # Template rules
     strict_template_vars: bool = True
     max_template_bytes: int = 256_000  # 256KB safety limit
+    template_cache_size: int = 256  # compiled templates kept per process (0 disables)
+    # Render DB templates (written by `fapo sync-templates`) without the Jinja sandbox.
+    trusted_templates: bool = False
+    # Load the precompiled code stored by `fapo sync-templates` instead of parsing
+    # template sources. This executes code read from the DB, so only enable it when
+    # the templates table is as trusted as the application itself.
+    load_precompiled_templates: bool = False
+    # Render in a process pool (0 renders in-process)
+    render_workers: int = 0
+    render_chunk_size: int = 64  # contexts per task when rendering batches in the pool
+    # Bundle built by `fapo build-templates`; templates and partials found there are
+    # served without a DB query (the DB remains the fallback).
+    template_bundle_path: str | None = None
+    # Serve templates from this directory and hot-reload them on change
+    # (development/staging only; see templates.watcher).
+    template_watch_path: str | None = None
+    template_watch_interval: float = 0.5
+    # Cache active DB templates per process; the table is re-checked with one cheap
+    # query at most every N seconds (0 disables the cache).
+    template_source_cache_ttl: float = 0
 
     # Retry policy (seconds)
     max_attempts: int = 3
     retry_schedule_seconds: list[int] = Field(default_factory=lambda: [0, 60, 120])
 
+    # Answer repeated idempotency keys from a per-process LRU for a few seconds
+    # (0 disables it).
+    idempotency_cache_size: int = 0
+    idempotency_cache_ttl: float = 30
+
+    # AsyncEnqueueBuffer: enqueues are gathered for up to N seconds or N rows and
+    # written with one INSERT and one COMMIT.
+    enqueue_buffer_max_latency: float = 0.005
+    enqueue_buffer_max_batch: int = 500
+
     # Retention / logging
     retention_days: int = 30
     log_body: bool = False
     persist_context: bool = False  # off by default (security)
+    # Store the context at enqueue time and render bodies in the worker (requires
+    # persist_context). Rendered bodies are only written back when persist_deferred_bodies.
+    defer_render: bool = False
+    persist_deferred_bodies: bool = False
+    # Store bodies of at least N characters once in email_bodies, keyed by content
+    # hash, so a broadcast keeps one copy instead of one per message.
+    dedupe_bodies: bool = False
+    dedupe_body_min_length: int = 256
+    body_cache_size: int = 256  # shared bodies kept per process (0 disables)
+    # Store bodies of at least N characters compressed ("auto" picks zstd when the
+    # zstandard package is installed, zlib otherwise). Rows are readable either way.
+    compress_bodies: bool = False
+    compress_bodies_codec: str = "auto"
+    compress_body_min_length: int = 512
 
     # Admin (dev only)
     admin_mode: str = Field(
@@ -62,6 +106,10 @@ class Settings(BaseSettings):
     # Celery settings
     celery_broker_url: str | None = None
     celery_backend_url: str | None = None
+    # Hand new messages to a sender right after the enqueue commit ("none" or
+    # "celery"); retry_due stays the safety net and only picks them up after the grace.
+    dispatch_after_commit: str = "none"
+    dispatch_grace_seconds: int = 60
 
     # Provider API settings (v1.1)
     sendgrid_api_key: str | None = None
@@ -74,6 +122,12 @@ class Settings(BaseSettings):
 
     # Suppression list
     block_suppressed: bool = True
+    # In-process Bloom filter over the suppression list, refreshed at most every N
+    # seconds (0 disables it and every check queries the database). Suppressions
+    # added by other processes are missed for up to N seconds.
+    suppression_index_refresh_seconds: float = 0
+    suppression_index_capacity: int = 1_000_000
+    suppression_index_error_rate: float = 0.01
 
     @field_validator("env")
     @classmethod
@@ -104,6 +158,24 @@ class Settings(BaseSettings):
             raise ValueError("retry_schedule_seconds must start with 0 (immediate first attempt)")
         return v
 
+    @field_validator("dispatch_after_commit")
+    @classmethod
+    def validate_dispatch(cls, v: str) -> str:
+        v = v.lower().strip()
+        allowed = {"none", "celery"}
+        if v not in allowed:
+            raise ValueError(f"dispatch_after_commit must be one of: {sorted(allowed)}")
+        return v
+
+    @field_validator("compress_bodies_codec")
+    @classmethod
+    def validate_compress_codec(cls, v: str) -> str:
+        v = v.lower().strip()
+        allowed = {"auto", "zlib", "zstd"}
+        if v not in allowed:
+            raise ValueError(f"compress_bodies_codec must be one of: {sorted(allowed)}")
+        return v
+
     @field_validator("admin_mode")
     @classmethod
     def validate_admin_mode(cls, v: str) -> str:
@@ -126,6 +198,12 @@ class Settings(BaseSettings):
                 "FAPO_ADMIN_MODE=dev_public requires FAPO_ALLOW_INSECURE_ADMIN=true (explicit opt-in)"
             )
 
+        if self.env == "production" and self.template_watch_path:
+            raise RuntimeError("FAPO_TEMPLATE_WATCH_PATH is not allowed in production")
+
+        if self.defer_render and not self.persist_context:
+            raise RuntimeError("FAPO_DEFER_RENDER=true requires FAPO_PERSIST_CONTEXT=true")
+
         if self.email_backend == "smtp" and not self.smtp_host:
             raise RuntimeError("SMTP backend selected but FAPO_SMTP_HOST is not set")
             # Username/password may be optional for some SMTP relays; keep flexible.
@@ -1,6 +1,14 @@
 from .async_repository import AsyncEmailRepository
 from .base import Base
-from .models import EmailMessage, EmailStatus, EmailSuppression, EmailTemplate, SuppressionReason
+from .models import (
+    EmailBody,
+    EmailMessage,
+    EmailStatus,
+    EmailSuppression,
+    EmailTemplate,
+    EmailTemplatePartial,
+    SuppressionReason,
+)
 from .repository import EmailRepository
 from .session import create_engine_from_url, create_session_factory
 from .session_async import create_async_engine_from_url, create_async_session_factory
@@ -8,11 +16,13 @@ from .session_async import create_async_engine_from_url, create_async_session_fa
 __all__ = [
     "AsyncEmailRepository",
     "Base",
+    "EmailBody",
     "EmailMessage",
     "EmailRepository",
     "EmailStatus",
     "EmailSuppression",
     "EmailTemplate",
+    "EmailTemplatePartial",
     "SuppressionReason",
     "create_async_engine_from_url",
     "create_async_session_factory",
@@ -1,17 +1,44 @@
 from __future__ import annotations
 
-from collections.abc import Iterable
+from collections.abc import AsyncIterator, Callable, Iterable, Iterator
 from datetime import datetime, timedelta, timezone
+from typing import Any
 
-from sqlalchemy import and_, delete, select
+from sqlalchemy import and_, case, delete, func, select, update
+from sqlalchemy import insert as sa_insert
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import defer
+from sqlalchemy.orm.attributes import instance_state, set_committed_value
 
-from .models import EmailMessage, EmailStatus, EmailSuppression, EmailTemplate, SuppressionReason
+from fastapi_post_office.config import settings
+
+from .bodies import (
+    BodyCache,
+    apply_plan,
+    get_body_cache,
+    inline_values,
+    plan_bodies,
+    resolve,
+    unresolved,
+)
+from .hooks import after_commit
+from .models import (
+    EmailBody,
+    EmailMessage,
+    EmailStatus,
+    EmailSuppression,
+    EmailTemplate,
+    EmailTemplatePartial,
+    SuppressionReason,
+)
 
 
 class AsyncEmailRepository:
-    def __init__(self, session: AsyncSession) -> None:
+    def __init__(self, session: AsyncSession, body_cache: BodyCache | None = None) -> None:
         self.session = session
+        self.body_cache = body_cache if body_cache is not None else get_body_cache()
 
     async def get_template(self, name: str, active_only: bool = True) -> EmailTemplate | None:
         stmt = select(EmailTemplate).where(EmailTemplate.name == name)
@@ -20,6 +47,20 @@ class AsyncEmailRepository:
         result = await self.session.execute(stmt)
         return result.scalar_one_or_none()
 
+    async def get_template_version(self) -> tuple[Any, ...]:
+        """
+        Cheap fingerprint of the templates table:
+        (count, max(updated_at), sum(revision), number of active templates).
+        """
+        stmt = select(
+            func.count(EmailTemplate.id),
+            func.max(EmailTemplate.updated_at),
+            func.sum(EmailTemplate.revision),
+            func.sum(case((EmailTemplate.is_active.is_(True), 1), else_=0)),
+        )
+        result = await self.session.execute(stmt)
+        return tuple(result.one())
+
     async def upsert_template(self, template: EmailTemplate) -> EmailTemplate:
         existing = await self.get_template(template.name, active_only=False)
         if existing is None:
@@ -33,20 +74,118 @@ class AsyncEmailRepository:
         existing.content_policy_json = template.content_policy_json
         existing.tags_json = template.tags_json
         existing.source_hash = template.source_hash
+        existing.template_vars_json = template.template_vars_json
+        existing.dependencies_json = template.dependencies_json
+        existing.compiled_json = template.compiled_json
         existing.is_active = template.is_active
         return existing
 
+    async def get_partials(self, names: Iterable[str] | None = None) -> list[EmailTemplatePartial]:
+        stmt = select(EmailTemplatePartial)
+        if names is not None:
+            stmt = stmt.where(EmailTemplatePartial.name.in_(list(names)))
+        result = await self.session.execute(stmt)
+        return list(result.scalars().all())
+
+    async def upsert_partial(self, partial: EmailTemplatePartial) -> EmailTemplatePartial:
+        stmt = select(EmailTemplatePartial).where(EmailTemplatePartial.name == partial.name)
+        result = await self.session.execute(stmt)
+        existing = result.scalar_one_or_none()
+        if existing is None:
+            self.session.add(partial)
+            return partial
+        existing.source = partial.source
+        existing.source_hash = partial.source_hash
+        return existing
+
     async def create_message(self, message: EmailMessage) -> EmailMessage:
+        await self._store_bodies([message])
         self.session.add(message)
         return message
 
+    async def insert_message_if_absent(self, message: EmailMessage) -> EmailMessage | None:
+        """
+        Insert `message` unless its idempotency key is taken; returns the stored
+        message (a new instance on PostgreSQL/SQLite), or None on conflict.
+
+        Uses a single `INSERT ... ON CONFLICT (idempotency_key) DO NOTHING RETURNING`
+        where supported, and a savepoint around the INSERT elsewhere.
+        """
+        bodies = await self._store_bodies([message])
+        dialect = self.session.get_bind().dialect
+        if dialect.insert_returning and dialect.name in {"postgresql", "sqlite"}:
+            insert = postgresql.insert if dialect.name == "postgresql" else sqlite.insert
+            stmt = (
+                insert(EmailMessage)
+                .values(**inline_values(_column_values(message)))
+                .on_conflict_do_nothing(index_elements=[EmailMessage.idempotency_key])
+                .returning(EmailMessage)
+            )
+            result = await self.session.scalars(stmt)
+            inserted = result.one_or_none()
+            if inserted is not None:
+                resolve(unresolved([inserted]), bodies)
+            return inserted
+        try:
+            async with self.session.begin_nested():
+                self.session.add(message)
+        except IntegrityError:
+            return None
+        return message
+
     async def get_message(self, message_id) -> EmailMessage | None:
-        return await self.session.get(EmailMessage, message_id)
+        message = await self.session.get(EmailMessage, message_id)
+        if message is not None:
+            # An instance left in the identity map by list_due_messages still
+            # has its bodies deferred, and async sessions cannot lazy-load.
+            state = instance_state(message)
+            deferred = [name for name in _BODY_COLUMNS if name in state.unloaded]
+            if state.persistent and deferred:
+                await self.session.refresh(message, deferred)
+            await self.load_bodies([message])
+        return message
 
     async def get_message_by_idempotency(self, key: str) -> EmailMessage | None:
         stmt = select(EmailMessage).where(EmailMessage.idempotency_key == key)
         result = await self.session.execute(stmt)
-        return result.scalar_one_or_none()
+        message = result.scalar_one_or_none()
+        if message is not None:
+            await self.load_bodies([message])
+        return message
+
+    async def get_messages_by_idempotency(self, keys: Iterable[str]) -> dict[str, EmailMessage]:
+        found: dict[str, EmailMessage] = {}
+        for chunk in _chunks(list(keys)):
+            stmt = select(EmailMessage).where(EmailMessage.idempotency_key.in_(chunk))
+            result = await self.session.execute(stmt)
+            for message in result.scalars():
+                assert message.idempotency_key is not None
+                found[message.idempotency_key] = message
+        await self.load_bodies(found.values())
+        return found
+
+    async def claim_message(self, message: EmailMessage) -> bool:
+        """
+        Atomically move a queued or retrying message to SENDING (not committed).
+
+        Returns False, with `message` refreshed, when another worker claimed or
+        finished it first; concurrent claims on the same row wait for each other.
+        """
+        stmt = (
+            update(EmailMessage)
+            .where(
+                EmailMessage.id == message.id,
+                EmailMessage.status.in_([EmailStatus.QUEUED, EmailStatus.RETRYING]),
+            )
+            .values(status=EmailStatus.SENDING)
+            .execution_options(synchronize_session=False)
+        )
+        result = await self.session.execute(stmt)
+        if getattr(result, "rowcount", 0) != 1:
+            await self.session.refresh(message)
+            return False
+        set_committed_value(message, "status", EmailStatus.SENDING)
+        return True
 
     async def set_status(
         self,
@@ -64,6 +203,23 @@ class AsyncEmailRepository:
         message.next_attempt_at = next_attempt_at
         return message
 
+    async def set_bodies(
+        self,
+        message: EmailMessage,
+        html_body: str | None,
+        text_body: str | None,
+        persist: bool = True,
+    ) -> EmailMessage:
+        if persist:
+            message.html_body = html_body
+            message.text_body = text_body
+            await self._store_bodies([message])
+        else:
+            # Visible to the backend for this send, but never written back.
+            set_committed_value(message, "html_body", html_body)
+            set_committed_value(message, "text_body", text_body)
+        return message
+
     async def increment_attempt(self, message: EmailMessage) -> EmailMessage:
         message.attempt_count += 1
         return message
@@ -78,6 +234,9 @@ class AsyncEmailRepository:
                 EmailMessage.next_attempt_at <= now,
             )
         )
+        # The poll only needs ids and schedules: bodies are neither read nor
+        # decompressed (use get_message to send one).
+        stmt = stmt.options(defer(EmailMessage.html_body), defer(EmailMessage.text_body))
         result = await self.session.execute(stmt)
         return list(result.scalars().all())
 
@@ -95,6 +254,26 @@ class AsyncEmailRepository:
         result = await self.session.execute(stmt)
         return result.scalar_one_or_none() is not None
 
+    async def find_suppressed(self, emails: Iterable[str]) -> set[str]:
+        """Return the (lowercased) addresses among `emails` that are suppressed."""
+        found: set[str] = set()
+        for chunk in _chunks(sorted({email.lower() for email in emails})):
+            stmt = select(EmailSuppression.email).where(EmailSuppression.email.in_(chunk))
+            result = await self.session.execute(stmt)
+            found.update(result.scalars())
+        return found
+
+    async def iter_suppressions(
+        self, since: datetime | None = None, chunk_size: int = 10_000
+    ) -> AsyncIterator[list[tuple[str, datetime | None]]]:
+        """Stream `(email, created_at)` in chunks, optionally only rows created at/after `since`."""
+        stmt = select(EmailSuppression.email, EmailSuppression.created_at)
+        if since is not None:
+            stmt = stmt.where(EmailSuppression.created_at >= since)
+        result = await self.session.stream(stmt.execution_options(yield_per=chunk_size))
+        async for partition in result.partitions():
+            yield [(email, created_at) for email, created_at in partition]
+
     async def add_suppression(
         self,
         email: str,
@@ -125,4 +304,146 @@ class AsyncEmailRepository:
         await self.session.flush()
 
     async def bulk_add(self, items: Iterable[object]) -> None:
-        self.session.add_all(list(items))
+        items = list(items)
+        await self._store_bodies(item for item in items if isinstance(item, EmailMessage))
+        self.session.add_all(items)
+
+    async def bulk_add_nested(self, items: Iterable[object]) -> None:
+        """
+        Add and flush `items` inside a savepoint.
+
+        If the flush violates a constraint only the savepoint is rolled back, with
+        none of the items added, and the `IntegrityError` is re-raised; the
+        surrounding transaction stays usable.
+        """
+        items = list(items)
+        await self._store_bodies(item for item in items if isinstance(item, EmailMessage))
+        async with self.session.begin_nested():
+            self.session.add_all(items)
+
+    async def try_bulk_add(self, items: Iterable[object]) -> bool:
+        """Like `bulk_add_nested`, but return False instead of raising on a conflict."""
+        try:
+            await self.bulk_add_nested(items)
+        except IntegrityError:
+            return False
+        return True
+
+    async def load_bodies(self, messages: Iterable[EmailMessage]) -> None:
+        """
+        Fill in the shared bodies (see `FAPO_DEDUPE_BODIES`) of loaded messages.
+
+        Bodies come from the per-process cache, the rest from one query per
+        1000 hashes. `get_message` and the idempotency lookups call this;
+        `list_due_messages` does not, so scans never read bodies.
+        """
+        refs = unresolved(messages)
+        if not refs:
+            return
+        cache = self.body_cache
+        found = cache.get_many(refs) if cache is not None else {}
+        missing = [digest for digest in refs if digest not in found]
+        loaded: dict[str, str] = {}
+        for chunk in _chunks(missing):
+            stmt = select(EmailBody.hash, EmailBody.content).where(EmailBody.hash.in_(chunk))
+            result = await self.session.execute(stmt)
+            loaded.update(result.tuples().all())
+        if cache is not None and loaded:
+            cache.put_many(loaded)
+        resolve(refs, {**found, **loaded})
+
+    async def cleanup_bodies(self, min_age_seconds: int = 3600) -> int:
+        """
+        Delete shared bodies that no message references any more.
+
+        Bodies stored or reused within the last `min_age_seconds` are kept, as a
+        message using them may not be committed yet. Storing a body refreshes its
+        `last_used_at` under a row lock, and the reference check runs in the same
+        DELETE, so a body an enqueue is about to reference is never removed.
+        """
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=min_age_seconds)
+        stmt = delete(EmailBody).where(
+            EmailBody.last_used_at <= cutoff,
+            ~select(EmailMessage.id).where(EmailMessage.html_body_hash == EmailBody.hash).exists(),
+            ~select(EmailMessage.id).where(EmailMessage.text_body_hash == EmailBody.hash).exists(),
+        )
+        result = await self.session.execute(stmt)
+        rowcount = getattr(result, "rowcount", None)
+        return int(rowcount or 0)
+
+    async def _store_bodies(self, messages: Iterable[EmailMessage]) -> dict[str, str]:
+        """Write long bodies once to email_bodies and point `messages` at them."""
+        if not settings.dedupe_bodies:
+            return {}
+        # The body rows must exist before any flush writes a reference to them.
+        with self.session.no_autoflush:
+            bodies, assignments = plan_bodies(messages)
+            if bodies:
+                await self._insert_bodies(bodies)
+                if self.body_cache is not None:
+                    self.body_cache.put_many(bodies)
+            apply_plan(assignments)
+        return bodies
+
+    async def _insert_bodies(self, bodies: dict[str, str]) -> None:
+        # Existing rows get a fresh last_used_at so cleanup_bodies leaves them alone
+        # until the messages referencing them are committed.
+        now = datetime.now(timezone.utc)
+        rows = [
+            {"hash": digest, "content": content, "last_used_at": now}
+            for digest, content in bodies.items()
+        ]
+        dialect = self.session.get_bind().dialect.name
+        if dialect in {"postgresql", "sqlite"}:
+            insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+            upsert = insert(EmailBody)
+            await self.session.execute(
+                upsert.on_conflict_do_update(
+                    index_elements=[EmailBody.hash],
+                    set_={"last_used_at": upsert.excluded.last_used_at},
+                ),
+                rows,
+            )
+            return
+        existing: set[str] = set()
+        for chunk in _chunks(list(bodies)):
+            await self.session.execute(
+                update(EmailBody).where(EmailBody.hash.in_(chunk)).values(last_used_at=now)
+            )
+            stmt = select(EmailBody.hash).where(EmailBody.hash.in_(chunk))
+            existing.update(await self.session.scalars(stmt))
+        for row in rows:
+            if row["hash"] in existing:
+                continue
+            try:
+                async with self.session.begin_nested():
+                    await self.session.execute(sa_insert(EmailBody), [row])
+            except IntegrityError:
+                pass  # stored concurrently; the content is the same
+
+    def after_commit(
+        self, on_commit: Callable[[], None], on_rollback: Callable[[], None] | None = None
+    ) -> None:
+        """Run `on_commit` when the session's transaction commits (see `hooks.after_commit`)."""
+        after_commit(self.session.sync_session, on_commit, on_rollback)
+
+
+def _column_values(obj: object) -> dict[str, Any]:
+    state = instance_state(obj)
+    return {
+        attr.key: state.dict[attr.key]
+        for attr in state.mapper.column_attrs
+        if attr.key in state.dict
+    }
+
+
+# Keeps IN lists well below the bind-parameter limits of every supported backend.
+_IN_CHUNK_SIZE = 1000
+
+# Deferred by list_due_messages.
+_BODY_COLUMNS = ("html_body", "text_body")
+
+
+def _chunks(values: list[str]) -> Iterator[list[str]]:
+    for start in range(0, len(values), _IN_CHUNK_SIZE):
+        yield values[start : start + _IN_CHUNK_SIZE]
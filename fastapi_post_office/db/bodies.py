@@ -0,0 +1,210 @@
+from __future__ import annotations
+
+import hashlib
+import threading
+from collections import OrderedDict
+from collections.abc import Iterable, Mapping
+from typing import Any
+
+from sqlalchemy import event
+from sqlalchemy.orm import InstanceState, Mapper
+from sqlalchemy.orm.attributes import get_history, instance_state, set_committed_value
+
+from fastapi_post_office.config import settings
+
+from .models import EmailMessage
+
+BODY_FIELDS = ("html_body", "text_body")
+
+_STASH_KEY = "fapo_bodies"
+
+
+def body_hash(content: str) -> str:
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+class BodyCache:
+    """
+    Bounded, thread-safe LRU of shared bodies keyed by content hash.
+
+    Entries can never be stale: a hash always names the same content.
+    """
+
+    def __init__(self, maxsize: int) -> None:
+        if maxsize <= 0:
+            raise ValueError("maxsize must be > 0")
+        self.maxsize = maxsize
+        self._entries: OrderedDict[str, str] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, hashes: Iterable[str]) -> dict[str, str]:
+        found = {}
+        with self._lock:
+            for digest in hashes:
+                content = self._entries.get(digest)
+                if content is not None:
+                    self._entries.move_to_end(digest)
+                    found[digest] = content
+        return found
+
+    def put_many(self, bodies: Mapping[str, str]) -> None:
+        with self._lock:
+            for digest, content in bodies.items():
+                self._entries[digest] = content
+                self._entries.move_to_end(digest)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+_shared_cache: BodyCache | None = None
+
+
+def get_body_cache() -> BodyCache | None:
+    """Return the shared cache, or None when FAPO_BODY_CACHE_SIZE is 0."""
+    global _shared_cache
+    maxsize = settings.body_cache_size
+    if maxsize <= 0:
+        return None
+    if _shared_cache is None or _shared_cache.maxsize != maxsize:
+        _shared_cache = BodyCache(maxsize)
+    return _shared_cache
+
+
+def plan_bodies(
+    messages: Iterable[EmailMessage],
+) -> tuple[dict[str, str], list[tuple[EmailMessage, str, str | None]]]:
+    """
+    Decide which bodies of `messages` are stored in email_bodies.
+
+    Returns the `{hash: content}` rows to store and the `(message, hash field,
+    hash)` assignments to apply once they are; bodies shorter than
+    FAPO_DEDUPE_BODY_MIN_LENGTH stay inline.
+    """
+    min_length = settings.dedupe_body_min_length
+    bodies: dict[str, str] = {}
+    assignments: list[tuple[EmailMessage, str, str | None]] = []
+    for message in messages:
+        state = instance_state(message)
+        for field in BODY_FIELDS:
+            content = _content(state, field)
+            digest = None
+            if content is not None and len(content) >= min_length:
+                digest = body_hash(content)
+                bodies[digest] = content
+            assignments.append((message, f"{field}_hash", digest))
+    return bodies, assignments
+
+
+def apply_plan(assignments: Iterable[tuple[EmailMessage, str, str | None]]) -> None:
+    for message, hash_field, digest in assignments:
+        if getattr(message, hash_field) != digest:
+            setattr(message, hash_field, digest)
+
+
+def inline_values(values: dict[str, Any]) -> dict[str, Any]:
+    """Column values for a Core INSERT: shared bodies are not written inline."""
+    for field in BODY_FIELDS:
+        if values.get(f"{field}_hash") is not None:
+            values[field] = None
+    return values
+
+
+def unresolved(messages: Iterable[EmailMessage]) -> dict[str, list[tuple[EmailMessage, str]]]:
+    """Map each shared body hash not yet loaded to the `(message, field)` pairs needing it."""
+    refs: dict[str, list[tuple[EmailMessage, str]]] = {}
+    for message in messages:
+        state = instance_state(message)
+        for field in BODY_FIELDS:
+            digest = state.dict.get(f"{field}_hash")
+            if digest is not None and state.dict.get(field) is None:
+                refs.setdefault(digest, []).append((message, field))
+    return refs
+
+
+def resolve(
+    refs: Mapping[str, list[tuple[EmailMessage, str]]], contents: Mapping[str, str]
+) -> None:
+    for digest, targets in refs.items():
+        content = contents.get(digest)
+        if content is None:
+            continue
+        for message, field in targets:
+            # Loaded, not changed: the inline column stays NULL.
+            set_committed_value(message, field, content)
+
+
+# The ORM writes NULL into the inline column of a shared body and puts the content
+# back on the instance afterwards, so callers always see `html_body`/`text_body`.
+
+
+def _content(state: InstanceState[Any], field: str) -> str | None:
+    # A flush that failed after `_stash_bodies` leaves the content in the stash.
+    content: str | None = state.dict.get(field)
+    if content is None:
+        content = state.info.get(_STASH_KEY, {}).get(field)
+    return content
+
+
+def _stash_bodies(target: EmailMessage, changed_only: bool) -> None:
+    state = instance_state(target)
+    stash = state.info.get(_STASH_KEY, {})
+    for field in BODY_FIELDS:
+        hash_field = f"{field}_hash"
+        content = state.dict.get(field)
+        digest = state.dict.get(hash_field)
+        if content is None or digest is None:
+            continue
+        if changed_only and not get_history(target, field).added:
+            continue
+        # A body that no longer matches the shared one it points at (e.g. replaced
+        # after FAPO_DEDUPE_BODIES was turned off) is written inline instead.
+        if not settings.dedupe_bodies or (changed_only and body_hash(content) != digest):
+            setattr(target, hash_field, None)
+            continue
+        stash[field] = content
+        setattr(target, field, None)
+    if stash:
+        state.info[_STASH_KEY] = stash
+
+
+def _restore_bodies(target: EmailMessage) -> None:
+    stash = instance_state(target).info.pop(_STASH_KEY, None)
+    if stash:
+        for field, content in stash.items():
+            set_committed_value(target, field, content)
+
+
+@event.listens_for(EmailMessage, "before_insert")
+def _before_insert(mapper: Mapper[Any], connection: Any, target: EmailMessage) -> None:
+    _stash_bodies(target, changed_only=False)
+
+
+@event.listens_for(EmailMessage, "before_update")
+def _before_update(mapper: Mapper[Any], connection: Any, target: EmailMessage) -> None:
+    _stash_bodies(target, changed_only=True)
+
+
+@event.listens_for(EmailMessage, "after_insert")
+@event.listens_for(EmailMessage, "after_update")
+def _after_write(mapper: Mapper[Any], connection: Any, target: EmailMessage) -> None:
+    _restore_bodies(target)
+
+
+@event.listens_for(EmailMessage, "load")
+@event.listens_for(EmailMessage, "refresh")
+def _resolve_cached(target: EmailMessage, context: Any, attrs: Any = None) -> None:
+    # Rows reloaded after a commit (expire_on_commit) get their bodies back from the
+    # cache without a query; anything else waits for `load_bodies`.
+    cache = get_body_cache()
+    if cache is None:
+        return
+    refs = unresolved([target])
+    if refs:
+        resolve(refs, cache.get_many(refs))
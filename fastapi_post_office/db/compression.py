@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import base64
+import binascii
+import functools
+import zlib
+from typing import Any
+
+from sqlalchemy import Dialect, Text
+from sqlalchemy.types import TypeDecorator
+
+from fastapi_post_office.config import settings
+
+# Stored layout: MARKER, one codec character, then the base64 payload. The column
+# stays TEXT, so compressed and plain rows can live side by side.
+MARKER = "\x01"
+ZLIB = "z"
+ZSTD = "s"
+# A plain value that happens to start with MARKER is escaped with this codec.
+PLAIN = "p"
+
+_ZLIB_LEVEL = 6
+_ZSTD_LEVEL = 3
+
+
+class CompressionError(ValueError):
+    pass
+
+
+# Cached so a missing zstandard costs one failed import, not one per bound value.
+@functools.cache
+def _zstd() -> Any:
+    try:
+        import zstandard
+    except ImportError:
+        return None
+    return zstandard
+
+
+def resolve_codec(name: str) -> str:
+    """Map a FAPO_COMPRESS_BODIES_CODEC value to the codec character used on disk."""
+    if name == "zstd":
+        if _zstd() is None:
+            raise CompressionError("zstd compression requires the zstandard package")
+        return ZSTD
+    if name == "auto" and _zstd() is not None:
+        return ZSTD
+    return ZLIB
+
+
+def compress_text(value: str, codec: str = ZLIB) -> str:
+    data = value.encode("utf-8")
+    if codec == ZSTD:
+        payload = _zstd().ZstdCompressor(level=_ZSTD_LEVEL).compress(data)
+    else:
+        payload = zlib.compress(data, _ZLIB_LEVEL)
+    return MARKER + codec + base64.b64encode(payload).decode("ascii")
+
+
+def decompress_text(stored: str) -> str:
+    """Decode a stored value; values without the marker are returned unchanged."""
+    if not stored.startswith(MARKER):
+        return stored
+    codec, payload = stored[1:2], stored[2:]
+    if codec == PLAIN:
+        return payload
+    errors: tuple[type[Exception], ...] = (binascii.Error, zlib.error, ValueError)
+    if codec == ZLIB:
+        decompress = zlib.decompress
+    elif codec == ZSTD:
+        zstandard = _zstd()
+        if zstandard is None:
+            raise CompressionError("Reading a zstd-compressed body requires the zstandard package")
+        decompress = zstandard.ZstdDecompressor().decompress
+        errors += (zstandard.ZstdError,)
+    else:
+        raise CompressionError(f"Unknown body compression codec {codec!r}")
+    try:
+        raw: bytes = decompress(base64.b64decode(payload))
+        return raw.decode("utf-8")
+    except errors as exc:
+        raise CompressionError(f"Corrupt compressed body: {exc}") from exc
+
+
+class CompressedText(TypeDecorator[str]):
+    """
+    TEXT column that stores long values compressed (see `FAPO_COMPRESS_BODIES`).
+
+    Values are compressed on write only while the setting is on. Decompression
+    happens whenever the column is loaded, not when the attribute is first read,
+    so a query that loads whole rows pays for it even if it never reads a body;
+    `defer()` the column in such queries, as `list_due_messages` does. Plain
+    values written before compression was enabled are returned as they are, so
+    existing rows migrate gradually (or never).
+    """
+
+    impl = Text
+    cache_ok = True
+
+    def process_bind_param(self, value: str | None, dialect: Dialect) -> str | None:
+        if value is None:
+            return None
+        if settings.compress_bodies and len(value) >= settings.compress_body_min_length:
+            return compress_text(value, resolve_codec(settings.compress_bodies_codec))
+        if value.startswith(MARKER):
+            return MARKER + PLAIN + value
+        return value
+
+    def process_result_value(self, value: str | None, dialect: Dialect) -> str | None:
+        if value is None:
+            return None
+        return decompress_text(value)
@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+import logging
+from collections.abc import Callable
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, SessionTransaction
+
+logger = logging.getLogger(__name__)
+
+_HOOKS_KEY = "fapo_after_commit"
+
+_Hook = tuple[Callable[[], None], Callable[[], None] | None]
+
+
+def after_commit(
+    session: Session,
+    on_commit: Callable[[], None],
+    on_rollback: Callable[[], None] | None = None,
+) -> None:
+    """
+    Run `on_commit` once the session's current transaction commits.
+
+    If the transaction ends any other way (rollback, or the session is closed
+    without committing), `on_rollback` runs instead. Savepoints do not count:
+    only the outermost transaction decides. Exceptions raised by the callbacks
+    are logged, since the transaction has already ended.
+    """
+    hooks: list[_Hook] | None = session.info.get(_HOOKS_KEY)
+    if hooks is None:
+        hooks = session.info[_HOOKS_KEY] = []
+    if not event.contains(session, "after_commit", _run_commit):
+        event.listen(session, "after_commit", _run_commit)
+        event.listen(session, "after_transaction_end", _run_end)
+    hooks.append((on_commit, on_rollback))
+
+
+def _run_commit(session: Session) -> None:
+    # Also fired when a savepoint is released; its work may still be rolled back.
+    if session.in_nested_transaction():
+        return
+    for on_commit, _ in session.info.pop(_HOOKS_KEY, ()):
+        _call(on_commit)
+
+
+def _run_end(session: Session, transaction: SessionTransaction) -> None:
+    # after_commit has already taken the hooks of a committed transaction, so
+    # whatever is left when the outermost transaction ends was rolled back.
+    if transaction.parent is not None:
+        return
+    for _, on_rollback in session.info.pop(_HOOKS_KEY, ()):
+        if on_rollback is not None:
+            _call(on_rollback)
+
+
+def _call(callback: Callable[[], None]) -> None:
+    try:
+        callback()
+    except Exception:
+        logger.exception("Transaction hook %r failed", callback)
@@ -5,13 +5,14 @@ from datetime import datetime
 from enum import Enum
 from typing import Any
 
-from sqlalchemy import Boolean, DateTime, Integer, String, Text, func
+from sqlalchemy import Boolean, DateTime, ForeignKey, Integer, String, Text, false, func
 from sqlalchemy import Enum as SAEnum
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import Mapped, mapped_column
 from sqlalchemy.types import JSON
 
 from .base import Base
+from .compression import CompressedText
 
 
 class EmailStatus(str, Enum):
@@ -42,6 +43,9 @@ class EmailTemplate(Base):
     content_policy_json: Mapped[dict[str, Any] | None] = mapped_column(_json_type(), nullable=True)
     tags_json: Mapped[list[str]] = mapped_column(_json_type(), nullable=False)
     source_hash: Mapped[str] = mapped_column(String(64), nullable=False)
+    template_vars_json: Mapped[list[str] | None] = mapped_column(_json_type(), nullable=True)
+    dependencies_json: Mapped[dict[str, str] | None] = mapped_column(_json_type(), nullable=True)
+    compiled_json: Mapped[dict[str, Any] | None] = mapped_column(_json_type(), nullable=True)
     is_active: Mapped[bool] = mapped_column(Boolean, default=True, nullable=False)
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
     updated_at: Mapped[datetime] = mapped_column(
@@ -49,6 +53,35 @@ class EmailTemplate(Base):
     )
 
 
+class EmailTemplatePartial(Base):
+    __tablename__ = "email_template_partials"
+
+    id: Mapped[uuid.UUID] = mapped_column(
+        default=uuid.uuid4, primary_key=True, unique=True, nullable=False
+    )
+    name: Mapped[str] = mapped_column(String(255), unique=True, nullable=False)
+    source: Mapped[str] = mapped_column(Text, nullable=False)
+    source_hash: Mapped[str] = mapped_column(String(64), nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
+    )
+
+
+class EmailBody(Base):
+    """A message body stored once and shared by every message with the same content."""
+
+    __tablename__ = "email_bodies"
+
+    hash: Mapped[str] = mapped_column(String(64), primary_key=True)
+    content: Mapped[str] = mapped_column(CompressedText, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    # Refreshed each time a new message reuses the body; cleanup goes by this.
+    last_used_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), index=True
+    )
+
+
 class EmailMessage(Base):
     __tablename__ = "email_messages"
 
@@ -66,8 +99,20 @@ class EmailMessage(Base):
     cc_json: Mapped[list[str]] = mapped_column(_json_type(), nullable=False)
     bcc_json: Mapped[list[str]] = mapped_column(_json_type(), nullable=False)
     subject: Mapped[str] = mapped_column(Text, nullable=False)
-    html_body: Mapped[str | None] = mapped_column(Text, nullable=True)
-    text_body: Mapped[str | None] = mapped_column(Text, nullable=True)
+    html_body: Mapped[str | None] = mapped_column(CompressedText, nullable=True)
+    text_body: Mapped[str | None] = mapped_column(CompressedText, nullable=True)
+    # Set when the body lives in email_bodies; the inline column is then NULL.
+    html_body_hash: Mapped[str | None] = mapped_column(
+        String(64), ForeignKey("email_bodies.hash"), nullable=True, index=True
+    )
+    text_body_hash: Mapped[str | None] = mapped_column(
+        String(64), ForeignKey("email_bodies.hash"), nullable=True, index=True
+    )
+    context_json: Mapped[dict[str, Any] | None] = mapped_column(_json_type(), nullable=True)
+    # Enqueued with FAPO_DEFER_RENDER: send_now renders the bodies from context_json.
+    render_deferred: Mapped[bool] = mapped_column(
+        Boolean, default=False, server_default=false(), nullable=False
+    )
     attempt_count: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
     max_attempts: Mapped[int] = mapped_column(Integer, default=3, nullable=False)
     next_attempt_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
@@ -98,4 +143,6 @@ class EmailSuppression(Base):
     )
     provider: Mapped[str | None] = mapped_column(String(64), nullable=True)
     metadata_json: Mapped[dict[str, Any] | None] = mapped_column(_json_type(), nullable=True)
-    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), index=True
+    )
@@ -1,17 +1,43 @@
 from __future__ import annotations
 
-from collections.abc import Iterable
+from collections.abc import Callable, Iterable, Iterator, Sequence
 from datetime import datetime, timedelta, timezone
+from typing import Any
 
-from sqlalchemy import and_, delete, select
-from sqlalchemy.orm import Session
+from sqlalchemy import Row, Table, and_, case, delete, func, select, update
+from sqlalchemy import insert as sa_insert
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, defer
+from sqlalchemy.orm.attributes import instance_state, set_committed_value
 
-from .models import EmailMessage, EmailStatus, EmailSuppression, EmailTemplate, SuppressionReason
+from fastapi_post_office.config import settings
+
+from .bodies import (
+    BodyCache,
+    apply_plan,
+    get_body_cache,
+    inline_values,
+    plan_bodies,
+    resolve,
+    unresolved,
+)
+from .hooks import after_commit
+from .models import (
+    EmailBody,
+    EmailMessage,
+    EmailStatus,
+    EmailSuppression,
+    EmailTemplate,
+    EmailTemplatePartial,
+    SuppressionReason,
+)
 
 
 class EmailRepository:
-    def __init__(self, session: Session) -> None:
+    def __init__(self, session: Session, body_cache: BodyCache | None = None) -> None:
         self.session = session
+        self.body_cache = body_cache if body_cache is not None else get_body_cache()
 
     def get_template(self, name: str, active_only: bool = True) -> EmailTemplate | None:
         stmt = select(EmailTemplate).where(EmailTemplate.name == name)
@@ -32,24 +58,176 @@ class EmailRepository:
         existing.content_policy_json = template.content_policy_json
         existing.tags_json = template.tags_json
         existing.source_hash = template.source_hash
+        existing.template_vars_json = template.template_vars_json
+        existing.dependencies_json = template.dependencies_json
+        existing.compiled_json = template.compiled_json
         existing.is_active = template.is_active
         return existing
 
+    def get_template_version(self) -> tuple[Any, ...]:
+        """
+        Cheap fingerprint of the templates table:
+        (count, max(updated_at), sum(revision), number of active templates).
+        """
+        stmt = select(
+            func.count(EmailTemplate.id),
+            func.max(EmailTemplate.updated_at),
+            func.sum(EmailTemplate.revision),
+            func.sum(case((EmailTemplate.is_active.is_(True), 1), else_=0)),
+        )
+        return tuple(self.session.execute(stmt).one())
+
+    def get_template_index(
+        self,
+    ) -> Sequence[Row[str, int, str, dict[str, str] | None, list[str] | None, bool]]:
+        """
+        Return `(name, revision, source_hash, dependencies_json, template_vars_json,
+        is_active)` for every template in one query, without loading template bodies.
+        """
+        stmt = select(
+            EmailTemplate.name,
+            EmailTemplate.revision,
+            EmailTemplate.source_hash,
+            EmailTemplate.dependencies_json,
+            EmailTemplate.template_vars_json,
+            EmailTemplate.is_active,
+        )
+        return self.session.execute(stmt).all()
+
+    def bulk_upsert_templates(self, rows: Sequence[dict[str, Any]]) -> None:
+        """
+        Insert or update many templates (keyed by name) in a single statement.
+
+        Uses the dialect's native upsert where available and falls back to
+        row-by-row `upsert_template` elsewhere.
+        """
+        if not rows:
+            return
+        # Core statements bypass the ORM `onupdate`, so set updated_at explicitly.
+        now = datetime.now(timezone.utc)
+        rows = [{**row, "updated_at": now} for row in rows]
+        table: Table = EmailTemplate.__table__  # type: ignore[assignment]
+        updated = [key for key in rows[0] if key not in {"id", "name", "created_at"}]
+        dialect = self.session.get_bind().dialect.name
+
+        if dialect in {"postgresql", "sqlite"}:
+            insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+            stmt = insert(table)
+            self.session.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=[table.c.name],
+                    set_={key: stmt.excluded[key] for key in updated},
+                ),
+                rows,
+            )
+        elif dialect in {"mysql", "mariadb"}:
+            mysql_stmt = mysql.insert(table)
+            self.session.execute(
+                mysql_stmt.on_duplicate_key_update(
+                    {key: mysql_stmt.inserted[key] for key in updated}
+                ),
+                rows,
+            )
+        else:
+            for row in rows:
+                self.upsert_template(EmailTemplate(**row))
+
+    def get_partials(self, names: Iterable[str] | None = None) -> list[EmailTemplatePartial]:
+        stmt = select(EmailTemplatePartial)
+        if names is not None:
+            stmt = stmt.where(EmailTemplatePartial.name.in_(list(names)))
+        return list(self.session.execute(stmt).scalars().all())
+
+    def upsert_partial(self, partial: EmailTemplatePartial) -> EmailTemplatePartial:
+        stmt = select(EmailTemplatePartial).where(EmailTemplatePartial.name == partial.name)
+        existing = self.session.execute(stmt).scalar_one_or_none()
+        if existing is None:
+            self.session.add(partial)
+            return partial
+        existing.source = partial.source
+        existing.source_hash = partial.source_hash
+        return existing
+
     def create_message(self, message: EmailMessage) -> EmailMessage:
+        self._store_bodies([message])
         self.session.add(message)
         return message
 
+    def insert_message_if_absent(self, message: EmailMessage) -> EmailMessage | None:
+        """
+        Insert `message` unless its idempotency key is taken; returns the stored
+        message (a new instance on PostgreSQL/SQLite), or None on conflict.
+
+        Uses a single `INSERT ... ON CONFLICT (idempotency_key) DO NOTHING RETURNING`
+        where supported, and a savepoint around the INSERT elsewhere.
+        """
+        bodies = self._store_bodies([message])
+        dialect = self.session.get_bind().dialect
+        if dialect.insert_returning and dialect.name in {"postgresql", "sqlite"}:
+            insert = postgresql.insert if dialect.name == "postgresql" else sqlite.insert
+            stmt = (
+                insert(EmailMessage)
+                .values(**inline_values(_column_values(message)))
+                .on_conflict_do_nothing(index_elements=[EmailMessage.idempotency_key])
+                .returning(EmailMessage)
+            )
+            inserted = self.session.scalars(stmt).one_or_none()
+            if inserted is not None:
+                resolve(unresolved([inserted]), bodies)
+            return inserted
+        try:
+            with self.session.begin_nested():
+                self.session.add(message)
+        except IntegrityError:
+            return None
+        return message
+
     def get_message(self, message_id) -> EmailMessage | None:
-        return self.session.get(EmailMessage, message_id)
+        message = self.session.get(EmailMessage, message_id)
+        if message is not None:
+            self.load_bodies([message])
+        return message
 
     def get_message_by_idempotency(self, key: str) -> EmailMessage | None:
         stmt = select(EmailMessage).where(EmailMessage.idempotency_key == key)
-        return self.session.execute(stmt).scalar_one_or_none()
+        message = self.session.execute(stmt).scalar_one_or_none()
+        if message is not None:
+            self.load_bodies([message])
+        return message
+
+    def get_messages_by_idempotency(self, keys: Iterable[str]) -> dict[str, EmailMessage]:
+        found: dict[str, EmailMessage] = {}
+        for chunk in _chunks(list(keys)):
+            stmt = select(EmailMessage).where(EmailMessage.idempotency_key.in_(chunk))
+            for message in self.session.execute(stmt).scalars():
+                assert message.idempotency_key is not None
+                found[message.idempotency_key] = message
+        self.load_bodies(found.values())
+        return found
 
     def is_suppressed(self, email: str) -> bool:
         stmt = select(EmailSuppression).where(EmailSuppression.email == email.lower())
         return self.session.execute(stmt).scalar_one_or_none() is not None
 
+    def find_suppressed(self, emails: Iterable[str]) -> set[str]:
+        """Return the (lowercased) addresses among `emails` that are suppressed."""
+        found: set[str] = set()
+        for chunk in _chunks(sorted({email.lower() for email in emails})):
+            stmt = select(EmailSuppression.email).where(EmailSuppression.email.in_(chunk))
+            found.update(self.session.execute(stmt).scalars())
+        return found
+
+    def iter_suppressions(
+        self, since: datetime | None = None, chunk_size: int = 10_000
+    ) -> Iterator[list[tuple[str, datetime | None]]]:
+        """Stream `(email, created_at)` in chunks, optionally only rows created at/after `since`."""
+        stmt = select(EmailSuppression.email, EmailSuppression.created_at)
+        if since is not None:
+            stmt = stmt.where(EmailSuppression.created_at >= since)
+        result = self.session.execute(stmt.execution_options(yield_per=chunk_size))
+        for partition in result.partitions():
+            yield [(email, created_at) for email, created_at in partition]
+
     def add_suppression(
         self,
         email: str,
@@ -70,6 +248,29 @@ class EmailRepository:
         stmt = delete(EmailSuppression).where(EmailSuppression.email == email.lower())
         self.session.execute(stmt)
 
+    def claim_message(self, message: EmailMessage) -> bool:
+        """
+        Atomically move a queued or retrying message to SENDING (not committed).
+
+        Returns False, with `message` refreshed, when another worker claimed or
+        finished it first; concurrent claims on the same row wait for each other.
+        """
+        stmt = (
+            update(EmailMessage)
+            .where(
+                EmailMessage.id == message.id,
+                EmailMessage.status.in_([EmailStatus.QUEUED, EmailStatus.RETRYING]),
+            )
+            .values(status=EmailStatus.SENDING)
+            .execution_options(synchronize_session=False)
+        )
+        result = self.session.execute(stmt)
+        if getattr(result, "rowcount", 0) != 1:
+            self.session.refresh(message)
+            return False
+        set_committed_value(message, "status", EmailStatus.SENDING)
+        return True
+
     def set_status(
         self,
         message: EmailMessage,
@@ -86,6 +287,23 @@ class EmailRepository:
         message.next_attempt_at = next_attempt_at
         return message
 
+    def set_bodies(
+        self,
+        message: EmailMessage,
+        html_body: str | None,
+        text_body: str | None,
+        persist: bool = True,
+    ) -> EmailMessage:
+        if persist:
+            message.html_body = html_body
+            message.text_body = text_body
+            self._store_bodies([message])
+        else:
+            # Visible to the backend for this send, but never written back.
+            set_committed_value(message, "html_body", html_body)
+            set_committed_value(message, "text_body", text_body)
+        return message
+
     def increment_attempt(self, message: EmailMessage) -> EmailMessage:
         message.attempt_count += 1
         return message
@@ -100,6 +318,9 @@ class EmailRepository:
                 EmailMessage.next_attempt_at <= now,
             )
         )
+        # The poll only needs ids and schedules: bodies are neither read nor
+        # decompressed (accessing one later loads it).
+        stmt = stmt.options(defer(EmailMessage.html_body), defer(EmailMessage.text_body))
         return list(self.session.execute(stmt).scalars().all())
 
     def cleanup_sent(self, retention_days: int) -> int:
@@ -121,4 +342,142 @@ class EmailRepository:
         self.session.flush()
 
     def bulk_add(self, items: Iterable[object]) -> None:
-        self.session.add_all(list(items))
+        items = list(items)
+        self._store_bodies(item for item in items if isinstance(item, EmailMessage))
+        self.session.add_all(items)
+
+    def bulk_add_nested(self, items: Iterable[object]) -> None:
+        """
+        Add and flush `items` inside a savepoint.
+
+        If the flush violates a constraint only the savepoint is rolled back, with
+        none of the items added, and the `IntegrityError` is re-raised; the
+        surrounding transaction stays usable.
+        """
+        items = list(items)
+        self._store_bodies(item for item in items if isinstance(item, EmailMessage))
+        with self.session.begin_nested():
+            self.session.add_all(items)
+
+    def try_bulk_add(self, items: Iterable[object]) -> bool:
+        """Like `bulk_add_nested`, but return False instead of raising on a conflict."""
+        try:
+            self.bulk_add_nested(items)
+        except IntegrityError:
+            return False
+        return True
+
+    def load_bodies(self, messages: Iterable[EmailMessage]) -> None:
+        """
+        Fill in the shared bodies (see `FAPO_DEDUPE_BODIES`) of loaded messages.
+
+        Bodies come from the per-process cache, the rest from one query per
+        1000 hashes. `get_message` and the idempotency lookups call this;
+        `list_due_messages` does not, so scans never read bodies.
+        """
+        refs = unresolved(messages)
+        if not refs:
+            return
+        cache = self.body_cache
+        found = cache.get_many(refs) if cache is not None else {}
+        missing = [digest for digest in refs if digest not in found]
+        loaded: dict[str, str] = {}
+        for chunk in _chunks(missing):
+            stmt = select(EmailBody.hash, EmailBody.content).where(EmailBody.hash.in_(chunk))
+            loaded.update(self.session.execute(stmt).tuples().all())
+        if cache is not None and loaded:
+            cache.put_many(loaded)
+        resolve(refs, {**found, **loaded})
+
+    def cleanup_bodies(self, min_age_seconds: int = 3600) -> int:
+        """
+        Delete shared bodies that no message references any more.
+
+        Bodies stored or reused within the last `min_age_seconds` are kept, as a
+        message using them may not be committed yet. Storing a body refreshes its
+        `last_used_at` under a row lock, and the reference check runs in the same
+        DELETE, so a body an enqueue is about to reference is never removed.
+        """
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=min_age_seconds)
+        stmt = delete(EmailBody).where(
+            EmailBody.last_used_at <= cutoff,
+            ~select(EmailMessage.id).where(EmailMessage.html_body_hash == EmailBody.hash).exists(),
+            ~select(EmailMessage.id).where(EmailMessage.text_body_hash == EmailBody.hash).exists(),
+        )
+        result = self.session.execute(stmt)
+        rowcount = getattr(result, "rowcount", None)
+        return int(rowcount or 0)
+
+    def _store_bodies(self, messages: Iterable[EmailMessage]) -> dict[str, str]:
+        """Write long bodies once to email_bodies and point `messages` at them."""
+        if not settings.dedupe_bodies:
+            return {}
+        # The body rows must exist before any flush writes a reference to them.
+        with self.session.no_autoflush:
+            bodies, assignments = plan_bodies(messages)
+            if bodies:
+                self._insert_bodies(bodies)
+                if self.body_cache is not None:
+                    self.body_cache.put_many(bodies)
+            apply_plan(assignments)
+        return bodies
+
+    def _insert_bodies(self, bodies: dict[str, str]) -> None:
+        # Existing rows get a fresh last_used_at so cleanup_bodies leaves them alone
+        # until the messages referencing them are committed.
+        now = datetime.now(timezone.utc)
+        rows = [
+            {"hash": digest, "content": content, "last_used_at": now}
+            for digest, content in bodies.items()
+        ]
+        dialect = self.session.get_bind().dialect.name
+        if dialect in {"postgresql", "sqlite"}:
+            insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+            upsert = insert(EmailBody)
+            self.session.execute(
+                upsert.on_conflict_do_update(
+                    index_elements=[EmailBody.hash],
+                    set_={"last_used_at": upsert.excluded.last_used_at},
+                ),
+                rows,
+            )
+            return
+        existing: set[str] = set()
+        for chunk in _chunks(list(bodies)):
+            self.session.execute(
+                update(EmailBody).where(EmailBody.hash.in_(chunk)).values(last_used_at=now)
+            )
+            stmt = select(EmailBody.hash).where(EmailBody.hash.in_(chunk))
+            existing.update(self.session.scalars(stmt))
+        for row in rows:
+            if row["hash"] in existing:
+                continue
+            try:
+                with self.session.begin_nested():
+                    self.session.execute(sa_insert(EmailBody), [row])
+            except IntegrityError:
+                pass  # stored concurrently; the content is the same
+
+    def after_commit(
+        self, on_commit: Callable[[], None], on_rollback: Callable[[], None] | None = None
+    ) -> None:
+        """Run `on_commit` when the session's transaction commits (see `hooks.after_commit`)."""
+        after_commit(self.session, on_commit, on_rollback)
+
+
+def _column_values(obj: object) -> dict[str, Any]:
+    state = instance_state(obj)
+    return {
+        attr.key: state.dict[attr.key]
+        for attr in state.mapper.column_attrs
+        if attr.key in state.dict
+    }
+
+
+# Keeps IN lists well below the bind-parameter limits of every supported backend.
+_IN_CHUNK_SIZE = 1000
+
+
+def _chunks(values: list[str]) -> Iterator[list[str]]:
+    for start in range(0, len(values), _IN_CHUNK_SIZE):
+        yield values[start : start + _IN_CHUNK_SIZE]
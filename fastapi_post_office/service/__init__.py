@@ -1,4 +1,14 @@
 from .async_email_service import AsyncEmailService
+from .batch import EmailRequest, EnqueueOutcome, EnqueueResult, TemplateEmailRequest
 from .email_service import EmailService
+from .enqueue_buffer import AsyncEnqueueBuffer
 
-__all__ = ["AsyncEmailService", "EmailService"]
+__all__ = [
+    "AsyncEmailService",
+    "AsyncEnqueueBuffer",
+    "EmailRequest",
+    "EmailService",
+    "EnqueueOutcome",
+    "EnqueueResult",
+    "TemplateEmailRequest",
+]
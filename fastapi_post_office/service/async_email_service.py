@@ -1,29 +1,95 @@
 from __future__ import annotations
 
 import asyncio
-from collections.abc import Iterable
+import itertools
+import logging
+import uuid
+from collections.abc import Callable, Iterable, Iterator, Sequence
 from datetime import datetime, timedelta, timezone
 from typing import Any
 
 from fastapi_post_office.backends import get_backend
 from fastapi_post_office.config import settings
 from fastapi_post_office.db.async_repository import AsyncEmailRepository
-from fastapi_post_office.db.models import EmailMessage, EmailStatus, EmailTemplate
-from fastapi_post_office.service.composer import compose_from_template
-from fastapi_post_office.service.idempotency import ensure_idempotency_async
+from fastapi_post_office.db.models import (
+    EmailMessage,
+    EmailStatus,
+    EmailTemplate,
+    EmailTemplatePartial,
+)
+from fastapi_post_office.service.batch import (
+    EmailRequest,
+    EnqueueBatch,
+    EnqueueResult,
+    TemplateEmailRequest,
+    build_message,
+)
+from fastapi_post_office.service.composer import (
+    BatchComposeResult,
+    ComposedEmail,
+    compose_deferred,
+    compose_deferred_many,
+    compose_from_template_async,
+    compose_many,
+    persistable_context,
+)
+from fastapi_post_office.service.dispatch import MessageDispatcher, dispatch, get_dispatcher
+from fastapi_post_office.service.idempotency import (
+    IdempotencyError,
+    normalize_idempotency_key,
+)
+from fastapi_post_office.service.recent_keys import RecentKeyCache, get_recent_key_cache
+from fastapi_post_office.service.source_cache import (
+    TemplateSourceCache,
+    get_template_source_cache,
+)
+from fastapi_post_office.service.suppression_index import (
+    SuppressionIndex,
+    get_suppression_index,
+)
 from fastapi_post_office.service.validator import (
+    ensure_not_suppressed,
     validate_from,
     validate_recipients,
     validate_subject,
 )
+from fastapi_post_office.templates.executor import RenderExecutor, get_render_executor
 from fastapi_post_office.templates.loader import TemplateSource
 from fastapi_post_office.templates.manifest import TemplateManifest
+from fastapi_post_office.templates.partials import PartialSource, partial_registry
+from fastapi_post_office.templates.provider import TemplateProvider, get_template_provider
+from fastapi_post_office.templates.renderer import validate_context
+
+logger = logging.getLogger(__name__)
 
 
 class AsyncEmailService:
-    def __init__(self, repo: AsyncEmailRepository) -> None:
+    def __init__(
+        self,
+        repo: AsyncEmailRepository,
+        render_executor: RenderExecutor | None = None,
+        template_provider: TemplateProvider | None = None,
+        source_cache: TemplateSourceCache | None = None,
+        suppression_index: SuppressionIndex | None = None,
+        recent_keys: RecentKeyCache | None = None,
+        dispatcher: MessageDispatcher | None = None,
+        autocommit: bool = True,
+    ) -> None:
         self.repo = repo
         self.backend = get_backend()
+        self.render_executor = render_executor or get_render_executor()
+        self.template_provider = template_provider or get_template_provider()
+        self.source_cache = (
+            source_cache if source_cache is not None else get_template_source_cache()
+        )
+        self.suppression_index = (
+            suppression_index if suppression_index is not None else get_suppression_index()
+        )
+        self.recent_keys = recent_keys if recent_keys is not None else get_recent_key_cache()
+        self.dispatcher = dispatcher if dispatcher is not None else get_dispatcher()
+        # With autocommit=False, enqueues join the session's current transaction and
+        # the caller commits (e.g. together with the row that triggered the email).
+        self.autocommit = autocommit
 
     async def enqueue_template(
         self,
@@ -35,20 +101,216 @@ class AsyncEmailService:
         bcc: Iterable[str] | None = None,
         from_email: str | None = None,
     ) -> EmailMessage:
-        existing = await ensure_idempotency_async(self.repo, idempotency_key)
-        if existing is not None:
-            return _ensure_message(existing)
+        key = normalize_idempotency_key(idempotency_key)
+        recent = self._recent(key)
+        if recent is not None:
+            return recent
+        try:
+            message = await self._template_message(
+                template_name, to, context, key, cc=cc, bcc=bcc, from_email=from_email
+            )
+        except ValueError:
+            existing = await self.repo.get_message_by_idempotency(key)
+            if existing is None:
+                raise
+            # A retry of an accepted request gets the original message even if it
+            # would no longer be accepted (e.g. a recipient was suppressed since).
+            return self._remember(_ensure_message(existing))
+        return await self._insert_message(message)
 
-        template = await self.repo.get_template(template_name, active_only=True)
-        if template is None:
+    async def enqueue(
+        self,
+        to: Iterable[str],
+        subject: str,
+        html: str | None,
+        text: str | None,
+        idempotency_key: str,
+        cc: Iterable[str] | None = None,
+        bcc: Iterable[str] | None = None,
+        from_email: str | None = None,
+    ) -> EmailMessage:
+        key = normalize_idempotency_key(idempotency_key)
+        recent = self._recent(key)
+        if recent is not None:
+            return recent
+        try:
+            message = await self._raw_message(
+                to, subject, html, text, key, cc=cc, bcc=bcc, from_email=from_email
+            )
+        except ValueError:
+            existing = await self.repo.get_message_by_idempotency(key)
+            if existing is None:
+                raise
+            return self._remember(_ensure_message(existing))
+        return await self._insert_message(message)
+
+    async def enqueue_many(self, requests: Sequence[EmailRequest]) -> list[EnqueueResult]:
+        """
+        Enqueue many raw emails with one idempotency query, one suppression query
+        and one commit.
+
+        Returns one result per request, in order. An invalid or suppressed item is
+        reported as rejected instead of failing the batch.
+        """
+        batch = EnqueueBatch(request.idempotency_key for request in requests)
+        batch.resolve_existing(await self.repo.get_messages_by_idempotency(batch.unsettled_keys()))
+        self._add_raw(batch, [(index, key, requests[index]) for index, key in batch.open_items()])
+        await self._store_batch(batch)
+        return batch.results()
+
+    async def enqueue_template_many(
+        self, template_name: str, requests: Sequence[TemplateEmailRequest]
+    ) -> list[EnqueueResult]:
+        """
+        Render one template for many recipients and enqueue the results like
+        `enqueue_many`.
+
+        The template is compiled once; a context that fails to render only rejects
+        its own item, while a missing or invalid template raises.
+        """
+        batch = EnqueueBatch(request.idempotency_key for request in requests)
+        batch.resolve_existing(await self.repo.get_messages_by_idempotency(batch.unsettled_keys()))
+        items = [(index, key, requests[index]) for index, key in batch.open_items()]
+        if not items:
+            return batch.results()
+        await self._add_templated(batch, template_name, items)
+        await self._store_batch(batch)
+        return batch.results()
+
+    async def enqueue_mixed(
+        self, requests: Sequence[tuple[str | None, EmailRequest | TemplateEmailRequest]]
+    ) -> list[EnqueueResult]:
+        """
+        Enqueue raw and templated emails together with one commit.
+
+        Each item is `(None, EmailRequest)` or `(template_name, TemplateEmailRequest)`.
+        Unlike `enqueue_template_many`, a missing or invalid template only rejects
+        the items that use it.
+        """
+        batch = EnqueueBatch(request.idempotency_key for _, request in requests)
+        batch.resolve_existing(await self.repo.get_messages_by_idempotency(batch.unsettled_keys()))
+        raw: list[tuple[int, str, EmailRequest]] = []
+        templated: dict[str, list[tuple[int, str, TemplateEmailRequest]]] = {}
+        for index, key in batch.open_items():
+            template_name, request = requests[index]
+            if template_name is None:
+                assert isinstance(request, EmailRequest)
+                raw.append((index, key, request))
+            else:
+                assert isinstance(request, TemplateEmailRequest)
+                templated.setdefault(template_name, []).append((index, key, request))
+        self._add_raw(batch, raw)
+        for template_name, items in templated.items():
+            try:
+                await self._add_templated(batch, template_name, items)
+            except ValueError as exc:
+                for index, _, _ in items:
+                    batch.reject(index, exc)
+        await self._store_batch(batch)
+        return batch.results()
+
+    async def send_now(self, message_id) -> EmailMessage:
+        message = await self.repo.get_message(message_id)
+        if message is None:
+            raise ValueError("Message not found")
+
+        if message.status in {EmailStatus.SENT, EmailStatus.FAILED}:
+            return message
+
+        # Only the worker that moves the message to SENDING may send it, so an
+        # immediate dispatch and retry_due can never both deliver it.
+        if not await self.repo.claim_message(message):
+            return message
+
+        if _render_pending(message):
+            failure = await self._render_deferred(message)
+            if failure is not None:
+                error, retryable = failure
+                if retryable:
+                    await self.repo.increment_attempt(message)
+                    await self._record_failure(message, error)
+                else:
+                    await self.repo.set_status(
+                        message,
+                        EmailStatus.FAILED,
+                        error_message=error,
+                        next_attempt_at=None,
+                    )
+                await self.repo.commit()
+                return message
+
+        result = await asyncio.to_thread(self.backend.send, message)
+        now = datetime.now(timezone.utc)
+
+        await self.repo.increment_attempt(message)
+        if result.ok:
+            await self.repo.set_status(
+                message,
+                EmailStatus.SENT,
+                provider_message_id=result.provider_message_id,
+                sent_at=now,
+                next_attempt_at=None,
+            )
+        else:
+            await self._record_failure(message, result.error_message)
+
+        await self.repo.commit()
+        return message
+
+    async def _record_failure(self, message: EmailMessage, error: str | None) -> None:
+        if message.attempt_count >= message.max_attempts:
+            await self.repo.set_status(
+                message,
+                EmailStatus.FAILED,
+                error_message=error,
+                next_attempt_at=None,
+            )
+        else:
+            await self.repo.set_status(
+                message,
+                EmailStatus.RETRYING,
+                error_message=error,
+                next_attempt_at=_next_attempt_at(message.attempt_count),
+            )
+
+    async def _template_message(
+        self,
+        template_name: str,
+        to: Iterable[str],
+        context: dict[str, Any],
+        idempotency_key: str,
+        cc: Iterable[str] | None = None,
+        bcc: Iterable[str] | None = None,
+        from_email: str | None = None,
+    ) -> EmailMessage:
+        source = await self._get_source(template_name)
+        if source is None:
             raise ValueError(f"Template not found: {template_name}")
 
-        source = _template_source_from_db(template)
-        composed = compose_from_template(
-            source,
-            context=context,
-            strict=settings.strict_template_vars,
-            max_bytes=settings.max_template_bytes,
+        validate_context(source, context, strict=settings.strict_template_vars)
+        await self._ensure_partials(source)
+        composed: ComposedEmail
+        if settings.defer_render:
+            composed = compose_deferred(
+                source,
+                context=context,
+                strict=settings.strict_template_vars,
+                max_bytes=settings.max_template_bytes,
+                trusted=settings.trusted_templates,
+            )
+        else:
+            composed = await compose_from_template_async(
+                source,
+                context=context,
+                strict=settings.strict_template_vars,
+                max_bytes=settings.max_template_bytes,
+                trusted=settings.trusted_templates,
+                executor=self.render_executor,
+            )
+        context_json = (
+            persistable_context(context)
+            if settings.persist_context or settings.defer_render
+            else None
         )
 
         from_email_val = validate_from(from_email or settings.default_from)
@@ -57,7 +319,7 @@ class AsyncEmailService:
         bcc_list = validate_recipients("bcc", bcc) if bcc else []
         await self._ensure_not_suppressed(to_list + cc_list + bcc_list)
 
-        message = EmailMessage(
+        return EmailMessage(
             template_name=composed.template_name,
             template_revision_used=composed.template_revision,
             provider=self.backend.name,
@@ -69,16 +331,15 @@ class AsyncEmailService:
             subject=validate_subject(composed.subject),
             html_body=composed.html_body,
             text_body=composed.text_body,
+            context_json=context_json,
+            render_deferred=composed.deferred,
             attempt_count=0,
             max_attempts=settings.max_attempts,
-            next_attempt_at=_next_attempt_at(0),
+            next_attempt_at=self._first_attempt_at(),
             idempotency_key=idempotency_key,
         )
-        await self.repo.create_message(message)
-        await self.repo.commit()
-        return message
 
-    async def enqueue(
+    async def _raw_message(
         self,
         to: Iterable[str],
         subject: str,
@@ -89,10 +350,6 @@ class AsyncEmailService:
         bcc: Iterable[str] | None = None,
         from_email: str | None = None,
     ) -> EmailMessage:
-        existing = await ensure_idempotency_async(self.repo, idempotency_key)
-        if existing is not None:
-            return _ensure_message(existing)
-
         from_email_val = validate_from(from_email or settings.default_from)
         to_list = validate_recipients("to", to)
         cc_list = validate_recipients("cc", cc) if cc else []
@@ -102,7 +359,7 @@ class AsyncEmailService:
         if not html and not text:
             raise ValueError("Either html or text body is required")
 
-        message = EmailMessage(
+        return EmailMessage(
             template_name=None,
             template_revision_used=None,
             provider=self.backend.name,
@@ -116,61 +373,303 @@ class AsyncEmailService:
             text_body=text,
             attempt_count=0,
             max_attempts=settings.max_attempts,
-            next_attempt_at=_next_attempt_at(0),
+            next_attempt_at=self._first_attempt_at(),
             idempotency_key=idempotency_key,
         )
-        await self.repo.create_message(message)
+
+    async def _insert_message(self, message: EmailMessage) -> EmailMessage:
+        # Insert first and only look the key up on conflict: one round trip plus
+        # the commit for a new message, and a concurrent request with the same key
+        # gets the winner's message instead of an IntegrityError.
+        inserted = await self.repo.insert_message_if_absent(message)
+        if inserted is not None:
+            # Snapshot before the commit expires the instance, but only publish the
+            # key once the message is committed.
+            await self._commit([inserted.id], self._stage(inserted))
+            return inserted
+        assert message.idempotency_key is not None
+        existing = await self.repo.get_message_by_idempotency(message.idempotency_key)
+        if existing is None:
+            raise IdempotencyError(
+                f"Message for idempotency_key {message.idempotency_key!r} conflicted but "
+                "could not be read back"
+            )
+        return self._remember(_ensure_message(existing))
+
+    async def _commit(self, message_ids: list[uuid.UUID], remember: Callable[[], None]) -> None:
+        """Commit new messages, or hand them to the caller's transaction."""
+        if not self.autocommit:
+            dispatch_callback = self._dispatch_callback(message_ids)
+
+            def on_commit() -> None:
+                remember()
+                dispatch_callback()
+
+            self.repo.after_commit(on_commit)
+            return
         await self.repo.commit()
+        remember()
+        await self._dispatch(message_ids)
+
+    def _dispatch_callback(self, message_ids: list[uuid.UUID]) -> Callable[[], None]:
+        # Commit hooks run synchronously on the event loop; the dispatcher may
+        # block (e.g. a broker round trip), so it runs in the default executor.
+        dispatcher = self.dispatcher
+        if dispatcher is None:
+            return lambda: None
+        loop = asyncio.get_running_loop()
+
+        def on_commit() -> None:
+            loop.run_in_executor(None, dispatch, dispatcher, message_ids)
+
+        return on_commit
+
+    async def _dispatch(self, message_ids: list[uuid.UUID]) -> None:
+        if self.dispatcher is not None:
+            await asyncio.to_thread(dispatch, self.dispatcher, message_ids)
+
+    def _first_attempt_at(self) -> datetime:
+        # A dispatched message is sent right away; retry_due only takes it over
+        # if that send never happens.
+        if self.dispatcher is not None:
+            return datetime.now(timezone.utc) + timedelta(seconds=settings.dispatch_grace_seconds)
+        return _next_attempt_at(0)
+
+    def _recent(self, key: str) -> EmailMessage | None:
+        return self.recent_keys.get(key) if self.recent_keys is not None else None
+
+    def _stage(self, message: EmailMessage) -> Callable[[], None]:
+        if self.recent_keys is None:
+            return lambda: None
+        return self.recent_keys.stage(message)
+
+    def _stage_many(self, messages: list[EmailMessage]) -> Callable[[], None]:
+        if self.recent_keys is None:
+            return lambda: None
+        return self.recent_keys.stage_many(messages)
+
+    def _remember(self, message: EmailMessage) -> EmailMessage:
+        # Inside the caller's transaction the row may be this transaction's own
+        # uncommitted insert: only publish it once that transaction commits.
+        store = self._stage(message)
+        if self.autocommit:
+            store()
+        else:
+            self.repo.after_commit(store)
         return message
 
-    async def send_now(self, message_id) -> EmailMessage:
-        message = await self.repo.get_message(message_id)
-        if message is None:
-            raise ValueError("Message not found")
+    async def _render_deferred(self, message: EmailMessage) -> tuple[str, bool] | None:
+        """
+        Render the bodies of a deferred message.
 
-        if message.status in {EmailStatus.SENT, EmailStatus.FAILED}:
-            return message
+        Returns the error and whether a later attempt may succeed on failure.
+        """
+        assert message.template_name is not None and message.context_json is not None
+        source = await self._get_source(message.template_name)
+        if source is None:
+            return f"Template not found: {message.template_name}", False
+
+        await self._ensure_partials(source)
+        # Only the active revision's source is kept. A message queued before a sync
+        # is sent entirely from the new revision, subject included, never a mix,
+        # and template_revision_used is moved to the revision that was rendered.
+        revision = source.manifest.revision
+        revision_changed = message.template_revision_used != revision
+        try:
+            composed = await compose_from_template_async(
+                source,
+                context=message.context_json,
+                strict=settings.strict_template_vars,
+                max_bytes=settings.max_template_bytes,
+                trusted=settings.trusted_templates,
+                executor=self.render_executor,
+            )
+            subject = validate_subject(composed.subject) if revision_changed else None
+        except ValueError as exc:
+            # The stored context was valid for the pinned revision; a newer one may
+            # need variables it lacks until the template is fixed or rolled back.
+            return str(exc), revision_changed
+        if subject is not None:
+            logger.warning(
+                "Deferred message %s was queued with %s revision %s; sending revision %s",
+                message.id,
+                message.template_name,
+                message.template_revision_used,
+                revision,
+            )
+            message.subject = subject
+            message.template_revision_used = revision
+        await self.repo.set_bodies(
+            message,
+            composed.html_body,
+            composed.text_body,
+            persist=settings.persist_deferred_bodies,
+        )
+        return None
 
-        await self.repo.set_status(message, EmailStatus.SENDING)
-        await self.repo.flush()
+    async def _get_source(self, template_name: str) -> TemplateSource | None:
+        if self.template_provider is not None:
+            source = self.template_provider.get(template_name)
+            if source is not None:
+                return source
+        cache = self.source_cache
+        if cache is not None:
+            if cache.needs_probe():
+                cache.validate(await self.repo.get_template_version())
+            source = cache.get(template_name)
+            if source is not None:
+                return source
+            generation = cache.generation
+        template = await self.repo.get_template(template_name, active_only=True)
+        if template is None:
+            return None
+        source = _template_source_from_db(template)
+        if cache is not None:
+            cache.put(template_name, source, generation)
+        return source
 
-        result = await asyncio.to_thread(self.backend.send, message)
-        now = datetime.now(timezone.utc)
+    async def _ensure_partials(self, source: TemplateSource) -> None:
+        # Only hit the DB when a layout/partial is missing or changed since the
+        # registry was filled.
+        stale = partial_registry.stale(source.dependencies)
+        if stale and self.template_provider is not None:
+            partial_registry.update(self.template_provider.get_partials(stale))
+            stale = partial_registry.stale(source.dependencies)
+        if stale:
+            partials = await self.repo.get_partials(stale)
+            partial_registry.update(_partial_source_from_db(p) for p in partials)
 
-        await self.repo.increment_attempt(message)
-        if result.ok:
-            await self.repo.set_status(
-                message,
-                EmailStatus.SENT,
-                provider_message_id=result.provider_message_id,
-                sent_at=now,
-                next_attempt_at=None,
+    def _compose_batch(
+        self, source: TemplateSource, contexts: list[dict[str, Any]]
+    ) -> Iterator[BatchComposeResult]:
+        if settings.defer_render:
+            return compose_deferred_many(
+                source,
+                contexts,
+                strict=settings.strict_template_vars,
+                max_bytes=settings.max_template_bytes,
+                trusted=settings.trusted_templates,
             )
-        else:
-            if message.attempt_count >= message.max_attempts:
-                await self.repo.set_status(
-                    message,
-                    EmailStatus.FAILED,
-                    error_message=result.error_message,
-                    next_attempt_at=None,
+        return compose_many(
+            source,
+            contexts,
+            strict=settings.strict_template_vars,
+            max_bytes=settings.max_template_bytes,
+            trusted=settings.trusted_templates,
+            executor=self.render_executor,
+        )
+
+    def _add_raw(self, batch: EnqueueBatch, items: Iterable[tuple[int, str, EmailRequest]]) -> None:
+        next_attempt_at = self._first_attempt_at()
+        for index, key, request in items:
+            try:
+                message = build_message(
+                    provider=self.backend.name,
+                    to=request.to,
+                    cc=request.cc,
+                    bcc=request.bcc,
+                    from_email=request.from_email,
+                    subject=request.subject,
+                    html=request.html,
+                    text=request.text,
+                    idempotency_key=key,
+                    next_attempt_at=next_attempt_at,
                 )
+            except ValueError as exc:
+                batch.reject(index, exc)
             else:
-                await self.repo.set_status(
-                    message,
-                    EmailStatus.RETRYING,
-                    error_message=result.error_message,
-                    next_attempt_at=_next_attempt_at(message.attempt_count),
-                )
+                batch.add(index, message)
 
-        await self.repo.commit()
-        return message
+    async def _add_templated(
+        self,
+        batch: EnqueueBatch,
+        template_name: str,
+        items: list[tuple[int, str, TemplateEmailRequest]],
+    ) -> None:
+        source = await self._get_source(template_name)
+        if source is None:
+            raise ValueError(f"Template not found: {template_name}")
+        await self._ensure_partials(source)
+        contexts = [request.context for _, _, request in items]
+        persist_context = settings.persist_context or settings.defer_render
+        next_attempt_at = self._first_attempt_at()
+        results = self._compose_batch(source, contexts)
+        # Render one chunk per thread hop and build its messages before the next,
+        # so rendered results never pile up for the whole batch.
+        while chunk := await asyncio.to_thread(_take, results, settings.render_chunk_size):
+            for result in chunk:
+                index, key, request = items[result.index]
+                if result.composed is None:
+                    assert result.error is not None
+                    batch.reject(index, result.error)
+                    continue
+                composed = result.composed
+                try:
+                    message = build_message(
+                        provider=self.backend.name,
+                        to=request.to,
+                        cc=request.cc,
+                        bcc=request.bcc,
+                        from_email=request.from_email,
+                        subject=composed.subject,
+                        html=composed.html_body,
+                        text=composed.text_body,
+                        idempotency_key=key,
+                        next_attempt_at=next_attempt_at,
+                        template_name=composed.template_name,
+                        template_revision=composed.template_revision,
+                        context_json=(
+                            persistable_context(request.context) if persist_context else None
+                        ),
+                        render_deferred=composed.deferred,
+                    )
+                except ValueError as exc:
+                    batch.reject(index, exc)
+                else:
+                    batch.add(index, message)
+
+    async def _store_batch(self, batch: EnqueueBatch) -> None:
+        if settings.block_suppressed and batch.pending:
+            batch.reject_suppressed(await self._find_suppressed(batch.recipients()))
+        if not batch.pending:
+            return
+        if not await self._insert_batch(batch):
+            return
+        messages = list(batch.pending.values())
+        await self._commit([message.id for message in messages], self._stage_many(messages))
+
+    async def _insert_batch(self, batch: EnqueueBatch) -> bool:
+        """Flush the pending messages in a savepoint; returns False if none are left."""
+        # A conflict only rolls back the savepoint, never other work in the session,
+        # including the caller's own when the service joins its transaction.
+        if await self.repo.try_bulk_add(batch.pending.values()):
+            return True
+        # Another request committed one of the idempotency keys after the lookup:
+        # report those items as duplicates and insert the rest once more.
+        batch.resolve_existing(await self.repo.get_messages_by_idempotency(batch.unsettled_keys()))
+        if not batch.pending:
+            return False
+        await self.repo.bulk_add_nested(batch.pending.values())
+        return True
+
+    async def _find_suppressed(self, recipients: Iterable[str]) -> set[str]:
+        index = self.suppression_index
+        if index is not None:
+            refresh = index.begin_refresh()
+            if refresh is not None:
+                async for rows in self.repo.iter_suppressions(refresh.since):
+                    refresh.add(rows)
+                refresh.commit()
+            # Only addresses the filter cannot rule out need the database.
+            recipients = index.candidates(recipients)
+            if not recipients:
+                return set()
+        return await self.repo.find_suppressed(recipients)
 
     async def _ensure_not_suppressed(self, recipients: list[str]) -> None:
         if not settings.block_suppressed:
             return
-        for email in recipients:
-            if await self.repo.is_suppressed(email):
-                raise ValueError(f"Recipient suppressed: {email}")
+        ensure_not_suppressed(recipients, await self._find_suppressed(recipients))
 
 
 def _template_source_from_db(template: EmailTemplate) -> TemplateSource:
@@ -188,6 +687,29 @@ def _template_source_from_db(template: EmailTemplate) -> TemplateSource:
         html_template=template.html_template,
         text_template=template.text_template,
         source_hash=template.source_hash,
+        compiled=template.compiled_json,
+        dependencies=template.dependencies_json,
+        template_vars=(
+            tuple(template.template_vars_json) if template.template_vars_json is not None else None
+        ),
+    )
+
+
+def _partial_source_from_db(partial: EmailTemplatePartial) -> PartialSource:
+    return PartialSource(name=partial.name, source=partial.source, source_hash=partial.source_hash)
+
+
+def _take(results: Iterator[BatchComposeResult], count: int) -> list[BatchComposeResult]:
+    return list(itertools.islice(results, count))
+
+
+def _render_pending(message: EmailMessage) -> bool:
+    return (
+        message.render_deferred
+        and message.template_name is not None
+        and message.context_json is not None
+        and message.html_body is None
+        and message.text_body is None
     )
 
 
@@ -0,0 +1,213 @@
+from __future__ import annotations
+
+import uuid
+from collections.abc import Iterable, Mapping, Sequence
+from dataclasses import dataclass
+from datetime import datetime
+from enum import Enum
+from typing import Any
+
+from fastapi_post_office.config import settings
+from fastapi_post_office.db.models import EmailMessage, EmailStatus
+from fastapi_post_office.service.idempotency import IdempotencyError, normalize_idempotency_key
+from fastapi_post_office.service.validator import (
+    SuppressedRecipientError,
+    ensure_not_suppressed,
+    validate_from,
+    validate_recipients,
+    validate_subject,
+)
+
+
+class EnqueueOutcome(str, Enum):
+    CREATED = "created"
+    DUPLICATE = "duplicate"
+    REJECTED = "rejected"
+
+
+@dataclass(frozen=True)
+class EmailRequest:
+    """One raw email for `enqueue_many`; the fields mirror the arguments of `enqueue`."""
+
+    to: Sequence[str]
+    subject: str
+    idempotency_key: str
+    html: str | None = None
+    text: str | None = None
+    cc: Sequence[str] | None = None
+    bcc: Sequence[str] | None = None
+    from_email: str | None = None
+
+
+@dataclass(frozen=True)
+class TemplateEmailRequest:
+    """One recipient set and context for `enqueue_template_many`."""
+
+    to: Sequence[str]
+    context: dict[str, Any]
+    idempotency_key: str
+    cc: Sequence[str] | None = None
+    bcc: Sequence[str] | None = None
+    from_email: str | None = None
+
+
+@dataclass(frozen=True)
+class EnqueueResult:
+    """
+    Outcome of one item of a bulk enqueue, at the item's position in the input.
+
+    `message` is the new message (created) or the one already holding the
+    idempotency key (duplicate); `error` explains a rejection.
+    """
+
+    index: int
+    outcome: EnqueueOutcome
+    message: EmailMessage | None = None
+    error: ValueError | None = None
+
+    @property
+    def ok(self) -> bool:
+        return self.outcome is not EnqueueOutcome.REJECTED
+
+
+class EnqueueBatch:
+    """
+    Per-item bookkeeping for one bulk enqueue.
+
+    Items are settled as rejected or duplicate as soon as that is known; the
+    rest end up in `pending` and become "created" once inserted. Within the
+    batch, the first item with a given idempotency key wins and later items
+    with the same key share its outcome.
+    """
+
+    def __init__(self, keys: Iterable[str]) -> None:
+        self.pending: dict[int, EmailMessage] = {}
+        self._keys: dict[int, str] = {}
+        self._settled: dict[int, EnqueueResult] = {}
+        self._aliases: dict[int, int] = {}
+        first: dict[str, int] = {}
+        self.size = 0
+        for index, raw_key in enumerate(keys):
+            self.size = index + 1
+            try:
+                key = normalize_idempotency_key(raw_key)
+            except IdempotencyError as exc:
+                self.reject(index, exc)
+                continue
+            if key in first:
+                self._aliases[index] = first[key]
+            else:
+                first[key] = index
+                self._keys[index] = key
+
+    def open_items(self) -> list[tuple[int, str]]:
+        """Items that are neither settled nor pending, as `(index, idempotency_key)`."""
+        return [
+            (index, key)
+            for index, key in self._keys.items()
+            if index not in self._settled and index not in self.pending
+        ]
+
+    def unsettled_keys(self) -> list[str]:
+        return [key for index, key in self._keys.items() if index not in self._settled]
+
+    def resolve_existing(self, existing: Mapping[str, EmailMessage]) -> None:
+        """Settle the items whose idempotency key is already taken by `existing`."""
+        for index in [i for i in self._keys if i not in self._settled]:
+            message = existing.get(self._keys[index])
+            if message is not None:
+                self.pending.pop(index, None)
+                self._settled[index] = EnqueueResult(
+                    index=index, outcome=EnqueueOutcome.DUPLICATE, message=message
+                )
+
+    def reject(self, index: int, error: ValueError) -> None:
+        self.pending.pop(index, None)
+        self._settled[index] = EnqueueResult(
+            index=index, outcome=EnqueueOutcome.REJECTED, error=error
+        )
+
+    def add(self, index: int, message: EmailMessage) -> None:
+        self.pending[index] = message
+
+    def recipients(self) -> set[str]:
+        return {
+            email
+            for message in self.pending.values()
+            for email in (*message.to_json, *message.cc_json, *message.bcc_json)
+        }
+
+    def reject_suppressed(self, suppressed: set[str]) -> None:
+        if not suppressed:
+            return
+        for index, message in list(self.pending.items()):
+            try:
+                ensure_not_suppressed(
+                    (*message.to_json, *message.cc_json, *message.bcc_json), suppressed
+                )
+            except SuppressedRecipientError as exc:
+                self.reject(index, exc)
+
+    def results(self) -> list[EnqueueResult]:
+        """Settle the pending items as created and return one result per input item."""
+        for index, message in self.pending.items():
+            self._settled[index] = EnqueueResult(
+                index=index, outcome=EnqueueOutcome.CREATED, message=message
+            )
+        self.pending = {}
+        for index, first in self._aliases.items():
+            result = self._settled[first]
+            outcome = result.outcome
+            if outcome is EnqueueOutcome.CREATED:
+                outcome = EnqueueOutcome.DUPLICATE
+            self._settled[index] = EnqueueResult(
+                index=index, outcome=outcome, message=result.message, error=result.error
+            )
+        return [self._settled[index] for index in range(self.size)]
+
+
+def build_message(
+    *,
+    provider: str,
+    to: Iterable[str],
+    cc: Iterable[str] | None,
+    bcc: Iterable[str] | None,
+    from_email: str | None,
+    subject: str,
+    html: str | None,
+    text: str | None,
+    idempotency_key: str,
+    next_attempt_at: datetime,
+    template_name: str | None = None,
+    template_revision: int | None = None,
+    context_json: dict[str, Any] | None = None,
+    render_deferred: bool = False,
+) -> EmailMessage:
+    """Validate one bulk item and build its queued message (raises ValueError)."""
+    from_email_val = validate_from(from_email or settings.default_from)
+    to_list = validate_recipients("to", to)
+    cc_list = validate_recipients("cc", cc) if cc else []
+    bcc_list = validate_recipients("bcc", bcc) if bcc else []
+    if template_name is None and not html and not text:
+        raise ValueError("Either html or text body is required")
+    return EmailMessage(
+        # Assigned up front so the ids can be dispatched without reloading the rows.
+        id=uuid.uuid4(),
+        template_name=template_name,
+        template_revision_used=template_revision,
+        provider=provider,
+        status=EmailStatus.QUEUED,
+        from_email=from_email_val,
+        to_json=to_list,
+        cc_json=cc_list,
+        bcc_json=bcc_list,
+        subject=validate_subject(subject),
+        html_body=html,
+        text_body=text,
+        context_json=context_json,
+        render_deferred=render_deferred,
+        attempt_count=0,
+        max_attempts=settings.max_attempts,
+        next_attempt_at=next_attempt_at,
+        idempotency_key=idempotency_key,
+    )
@@ -1,10 +1,23 @@
 from __future__ import annotations
 
+import asyncio
+import json
+from collections.abc import Iterable, Iterator
 from dataclasses import dataclass
-from typing import Any
+from typing import TYPE_CHECKING, Any
 
 from fastapi_post_office.templates.loader import TemplateSource
-from fastapi_post_office.templates.renderer import RenderedTemplate, render_template
+from fastapi_post_office.templates.renderer import (
+    BatchRenderResult,
+    RenderedTemplate,
+    RenderError,
+    render_many,
+    render_subject,
+    render_template,
+)
+
+if TYPE_CHECKING:
+    from fastapi_post_office.templates.executor import RenderExecutor
 
 
 @dataclass(frozen=True)
@@ -14,6 +27,29 @@ class ComposedEmail:
     subject: str
     html_body: str | None
     text_body: str | None
+    # Bodies are rendered by the worker at send time from the stored context.
+    deferred: bool = False
+
+
+@dataclass(frozen=True)
+class BatchComposeResult:
+    index: int
+    composed: ComposedEmail | None = None
+    error: RenderError | None = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def _composed(source: TemplateSource, rendered: RenderedTemplate) -> ComposedEmail:
+    return ComposedEmail(
+        template_name=source.manifest.name,
+        template_revision=source.manifest.revision,
+        subject=rendered.subject,
+        html_body=rendered.html,
+        text_body=rendered.text,
+    )
 
 
 def compose_from_template(
@@ -21,14 +57,106 @@ def compose_from_template(
     context: dict[str, Any],
     strict: bool,
     max_bytes: int,
+    trusted: bool = False,
+    executor: RenderExecutor | None = None,
 ) -> ComposedEmail:
-    rendered: RenderedTemplate = render_template(
-        source, context, strict=strict, max_bytes=max_bytes
-    )
+    rendered: RenderedTemplate
+    if executor is not None:
+        rendered = executor.render(source, context, strict, max_bytes, trusted)
+    else:
+        rendered = render_template(
+            source, context, strict=strict, max_bytes=max_bytes, trusted=trusted
+        )
+    return _composed(source, rendered)
+
+
+async def compose_from_template_async(
+    source: TemplateSource,
+    context: dict[str, Any],
+    strict: bool,
+    max_bytes: int,
+    trusted: bool = False,
+    executor: RenderExecutor | None = None,
+) -> ComposedEmail:
+    if executor is None:
+        return compose_from_template(
+            source, context, strict=strict, max_bytes=max_bytes, trusted=trusted
+        )
+    future = executor.submit(source, context, strict, max_bytes, trusted)
+    rendered = await asyncio.wrap_future(future)
+    return _composed(source, rendered)
+
+
+def compose_deferred(
+    source: TemplateSource,
+    context: dict[str, Any],
+    strict: bool,
+    max_bytes: int,
+    trusted: bool = False,
+) -> ComposedEmail:
+    """Compose an email whose bodies are rendered at send time from the stored context."""
+    subject = render_subject(source, context, strict=strict, max_bytes=max_bytes, trusted=trusted)
     return ComposedEmail(
         template_name=source.manifest.name,
         template_revision=source.manifest.revision,
-        subject=rendered.subject,
-        html_body=rendered.html,
-        text_body=rendered.text,
+        subject=subject,
+        html_body=None,
+        text_body=None,
+        deferred=True,
+    )
+
+
+def compose_deferred_many(
+    source: TemplateSource,
+    contexts: Iterable[dict[str, Any]],
+    strict: bool,
+    max_bytes: int,
+    trusted: bool = False,
+) -> Iterator[BatchComposeResult]:
+    """`compose_deferred` for many contexts; a failing context only fails its own item."""
+    for index, context in enumerate(contexts):
+        try:
+            composed = compose_deferred(
+                source, context, strict=strict, max_bytes=max_bytes, trusted=trusted
+            )
+        except RenderError as exc:
+            yield BatchComposeResult(index=index, error=exc)
+        except Exception as exc:
+            error = RenderError(f"Template rendering failed: {exc}")
+            error.__cause__ = exc
+            yield BatchComposeResult(index=index, error=error)
+        else:
+            yield BatchComposeResult(index=index, composed=composed)
+
+
+def persistable_context(context: dict[str, Any]) -> dict[str, Any]:
+    try:
+        json.dumps(context, separators=(",", ":"))
+    except (TypeError, ValueError) as exc:
+        raise ValueError(
+            f"Template context must be JSON serializable to be persisted: {exc}"
+        ) from exc
+    return context
+
+
+def compose_many(
+    source: TemplateSource,
+    contexts: Iterable[dict[str, Any]],
+    strict: bool,
+    max_bytes: int,
+    trusted: bool = False,
+    executor: RenderExecutor | None = None,
+) -> Iterator[BatchComposeResult]:
+    results: Iterator[BatchRenderResult]
+    if executor is not None:
+        results = executor.render_many(source, contexts, strict, max_bytes, trusted)
+    else:
+        results = render_many(source, contexts, strict=strict, max_bytes=max_bytes, trusted=trusted)
+    return (
+        BatchComposeResult(
+            index=result.index,
+            composed=_composed(source, result.rendered) if result.rendered is not None else None,
+            error=result.error,
+        )
+        for result in results
     )
@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+import logging
+import uuid
+from collections.abc import Callable, Sequence
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+
+from fastapi_post_office.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Called with the ids of freshly committed messages. It must only schedule the
+# send (e.g. enqueue a task) and return quickly.
+MessageDispatcher = Callable[[Sequence[uuid.UUID]], None]
+
+
+def celery_dispatcher(message_ids: Sequence[uuid.UUID]) -> None:
+    """Queue the `fastapi_post_office.send_message` task for each message."""
+    from fastapi_post_office.tasks.send import send_message
+
+    for message_id in message_ids:
+        send_message.delay(str(message_id))
+
+
+class InProcessDispatcher:
+    """
+    Send messages from a background thread pool, for apps that run without Celery.
+
+    Each send opens its own session from `session_factory`. Sends that are lost
+    (e.g. the process exits first) are picked up by `retry_due` after the grace
+    period.
+    """
+
+    def __init__(self, session_factory: Callable[[], Any], max_workers: int = 4) -> None:
+        self.session_factory = session_factory
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="fapo-send")
+
+    def __call__(self, message_ids: Sequence[uuid.UUID]) -> None:
+        for message_id in message_ids:
+            self._pool.submit(self._send, message_id)
+
+    def _send(self, message_id: uuid.UUID) -> None:
+        from fastapi_post_office.db.repository import EmailRepository
+        from fastapi_post_office.service.email_service import EmailService
+
+        try:
+            with self.session_factory() as session:
+                EmailService(EmailRepository(session)).send_now(message_id)
+        except Exception:
+            logger.exception("In-process send of message %s failed", message_id)
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._pool.shutdown(wait=wait)
+
+
+def get_dispatcher() -> MessageDispatcher | None:
+    """Return the dispatcher selected by FAPO_DISPATCH_AFTER_COMMIT, or None."""
+    if settings.dispatch_after_commit == "celery":
+        return celery_dispatcher
+    return None
+
+
+def dispatch(dispatcher: MessageDispatcher, message_ids: Sequence[uuid.UUID]) -> None:
+    """Run `dispatcher`, logging failures: the messages are committed either way."""
+    if not message_ids:
+        return
+    try:
+        dispatcher(message_ids)
+    except Exception:
+        logger.exception(
+            "Dispatching %d message(s) failed; retry_due will send them", len(message_ids)
+        )
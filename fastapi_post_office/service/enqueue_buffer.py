@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Callable, Iterable
+from typing import Any
+
+from fastapi_post_office.config import settings
+from fastapi_post_office.db.async_repository import AsyncEmailRepository
+from fastapi_post_office.db.models import EmailMessage
+from fastapi_post_office.service.async_email_service import AsyncEmailService
+from fastapi_post_office.service.batch import EmailRequest, TemplateEmailRequest
+
+_Entry = tuple[str | None, EmailRequest | TemplateEmailRequest, "asyncio.Future[EmailMessage]"]
+
+
+class AsyncEnqueueBuffer:
+    """
+    Group commit for `AsyncEmailService.enqueue` and `enqueue_template`.
+
+    Calls from any number of coroutines are gathered for up to `max_latency`
+    seconds or `max_batch_size` items, then written by `enqueue_mixed` with one
+    multi-row INSERT and one COMMIT on a session of its own. Each caller gets its
+    own message, or the exception its item raised alone; a failed commit fails
+    every caller of that batch.
+
+    Create one buffer per process and call `close()` on shutdown. Cancelling a
+    caller does not withdraw an item that was already handed to a flush.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Any],
+        max_latency: float | None = None,
+        max_batch_size: int | None = None,
+        service_factory: Callable[[Any], AsyncEmailService] | None = None,
+    ) -> None:
+        self.session_factory = session_factory
+        self.max_latency = (
+            max_latency if max_latency is not None else settings.enqueue_buffer_max_latency
+        )
+        self.max_batch_size = (
+            max_batch_size if max_batch_size is not None else settings.enqueue_buffer_max_batch
+        )
+        if self.max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+        self.service_factory = service_factory or _default_service
+        self._pending: list[_Entry] = []
+        self._timer: asyncio.TimerHandle | None = None
+        self._flushes: set[asyncio.Task[None]] = set()
+        self._closed = False
+
+    async def enqueue(
+        self,
+        to: Iterable[str],
+        subject: str,
+        html: str | None,
+        text: str | None,
+        idempotency_key: str,
+        cc: Iterable[str] | None = None,
+        bcc: Iterable[str] | None = None,
+        from_email: str | None = None,
+    ) -> EmailMessage:
+        request = EmailRequest(
+            to=list(to),
+            subject=subject,
+            idempotency_key=idempotency_key,
+            html=html,
+            text=text,
+            cc=list(cc) if cc else None,
+            bcc=list(bcc) if bcc else None,
+            from_email=from_email,
+        )
+        return await self._submit(None, request)
+
+    async def enqueue_template(
+        self,
+        template_name: str,
+        to: Iterable[str],
+        context: dict[str, Any],
+        idempotency_key: str,
+        cc: Iterable[str] | None = None,
+        bcc: Iterable[str] | None = None,
+        from_email: str | None = None,
+    ) -> EmailMessage:
+        request = TemplateEmailRequest(
+            to=list(to),
+            context=context,
+            idempotency_key=idempotency_key,
+            cc=list(cc) if cc else None,
+            bcc=list(bcc) if bcc else None,
+            from_email=from_email,
+        )
+        return await self._submit(template_name, request)
+
+    async def flush(self) -> None:
+        """Write everything buffered so far and wait for in-flight batches."""
+        self._start_flush()
+        if self._flushes:
+            await asyncio.gather(*self._flushes, return_exceptions=True)
+
+    async def close(self) -> None:
+        self._closed = True
+        await self.flush()
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    async def _submit(
+        self, template_name: str | None, request: EmailRequest | TemplateEmailRequest
+    ) -> EmailMessage:
+        if self._closed:
+            raise RuntimeError("Enqueue buffer is closed")
+        loop = asyncio.get_running_loop()
+        future: asyncio.Future[EmailMessage] = loop.create_future()
+        self._pending.append((template_name, request, future))
+        if len(self._pending) >= self.max_batch_size:
+            self._start_flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_latency, self._start_flush)
+        return await future
+
+    def _start_flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        entries, self._pending = self._pending, []
+        task = asyncio.get_running_loop().create_task(self._flush(entries))
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+
+    async def _flush(self, entries: list[_Entry]) -> None:
+        try:
+            async with self.session_factory() as session:
+                service = self.service_factory(session)
+                results = await service.enqueue_mixed(
+                    [(template_name, request) for template_name, request, _ in entries]
+                )
+        except asyncio.CancelledError:
+            for _, _, future in entries:
+                future.cancel()
+            raise
+        except Exception as exc:
+            for _, _, future in entries:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        for (_, _, future), result in zip(entries, results, strict=True):
+            if future.done():
+                continue
+            if result.message is not None:
+                future.set_result(result.message)
+            else:
+                assert result.error is not None
+                future.set_exception(result.error)
+
+
+def _default_service(session: Any) -> AsyncEmailService:
+    return AsyncEmailService(AsyncEmailRepository(session))
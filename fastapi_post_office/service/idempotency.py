@@ -15,21 +15,21 @@ class IdempotencyError(ValueError):
     pass
 
 
-def ensure_idempotency(repo: IdempotencyRepo, key: str):
+def normalize_idempotency_key(key: str) -> str:
     if not key or not str(key).strip():
         raise IdempotencyError("idempotency_key is required")
+    return str(key).strip()
+
 
-    existing = repo.get_message_by_idempotency(str(key).strip())
+def ensure_idempotency(repo: IdempotencyRepo, key: str):
+    existing = repo.get_message_by_idempotency(normalize_idempotency_key(key))
     if existing is not None:
         return existing
     return None
 
 
 async def ensure_idempotency_async(repo: AsyncIdempotencyRepo, key: str):
-    if not key or not str(key).strip():
-        raise IdempotencyError("idempotency_key is required")
-
-    existing = await repo.get_message_by_idempotency(str(key).strip())
+    existing = await repo.get_message_by_idempotency(normalize_idempotency_key(key))
     if existing is not None:
         return existing
     return None
@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import copy
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Iterable
+from typing import Any
+
+from sqlalchemy.orm.attributes import instance_state
+
+from fastapi_post_office.config import settings
+from fastapi_post_office.db.models import EmailMessage
+
+# Too large to keep per key; a hit leaves them unset.
+_UNCACHED = frozenset({"html_body", "text_body", "context_json"})
+
+
+def _snapshot(message: EmailMessage) -> dict[str, Any]:
+    # Only loaded attributes: reading an expired one would query the database.
+    state = instance_state(message)
+    return {
+        attr.key: copy.deepcopy(state.dict[attr.key])
+        for attr in state.mapper.column_attrs
+        if attr.key in state.dict and attr.key not in _UNCACHED
+    }
+
+
+class RecentKeyCache:
+    """
+    Bounded LRU of recently enqueued idempotency keys, each kept for `ttl_seconds`.
+
+    Lets the services answer a burst of client retries without a database
+    round trip. A hit returns a new, detached `EmailMessage` holding the values
+    the message had when it was enqueued (its status may have moved on since),
+    without its bodies and context: re-read it by id if you need those.
+    The unique constraint on `idempotency_key` stays the source of truth: a
+    miss, or a key enqueued by another process, falls through to the database.
+    """
+
+    def __init__(
+        self, maxsize: int, ttl_seconds: float, clock: Callable[[], float] = time.monotonic
+    ) -> None:
+        if maxsize <= 0:
+            raise ValueError("maxsize must be > 0")
+        if ttl_seconds <= 0:
+            raise ValueError("ttl_seconds must be > 0")
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._entries: OrderedDict[str, tuple[float, dict[str, Any]]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> EmailMessage | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, values = entry
+            if self._clock() >= expires_at:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+        return EmailMessage(**copy.deepcopy(values))
+
+    def put(self, message: EmailMessage) -> None:
+        self.stage(message)()
+
+    def stage(self, message: EmailMessage) -> Callable[[], None]:
+        """
+        Snapshot `message` now and return a callable that stores the snapshot.
+
+        Lets the services take the snapshot before a commit expires the instance
+        but only publish the key once the message is actually committed.
+        """
+        return self.stage_many([message])
+
+    def stage_many(self, messages: Iterable[EmailMessage]) -> Callable[[], None]:
+        """Like `stage`, for the messages of one batch."""
+        snapshots = []
+        for message in messages:
+            values = _snapshot(message)
+            if message.idempotency_key is not None and values.get("id") is not None:
+                snapshots.append((message.idempotency_key, values))
+
+        def store() -> None:
+            with self._lock:
+                expires_at = self._clock() + self.ttl_seconds
+                for key, values in snapshots:
+                    self._entries[key] = (expires_at, values)
+                    self._entries.move_to_end(key)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+
+        return store
+
+    def discard(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+_shared_cache: RecentKeyCache | None = None
+
+
+def get_recent_key_cache() -> RecentKeyCache | None:
+    """Return the shared cache, or None when FAPO_IDEMPOTENCY_CACHE_SIZE is 0."""
+    global _shared_cache
+    maxsize = settings.idempotency_cache_size
+    ttl = settings.idempotency_cache_ttl
+    if maxsize <= 0 or ttl <= 0:
+        return None
+    if _shared_cache is None or (_shared_cache.maxsize, _shared_cache.ttl_seconds) != (
+        maxsize,
+        ttl,
+    ):
+        _shared_cache = RecentKeyCache(maxsize, ttl)
+    return _shared_cache
@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import threading
+import time
+import weakref
+from collections.abc import Callable, Hashable
+from typing import Any
+
+from sqlalchemy import event
+
+from fastapi_post_office.config import settings
+from fastapi_post_office.db.models import EmailTemplate
+from fastapi_post_office.templates.loader import TemplateSource
+
+
+class TemplateSourceCache:
+    """
+    Process-wide cache of active templates read from the database.
+
+    Entries are not expired one by one. Once every `ttl_seconds` the services run a
+    single probe query (`get_template_version`: count, max(updated_at) and
+    sum(revision) of the templates table, plus the number of active templates) and
+    the whole cache is dropped when the result differs from the previous one. A
+    template change made by `fapo sync-templates` in another process is therefore
+    picked up at most `ttl_seconds` later. Deactivating or deleting a template
+    through the ORM in this process drops its entry immediately.
+
+    Every drop bumps `generation`. A caller reads it before loading a template
+    from the database and passes it to `put`, so a row read before a drop is not
+    cached after it.
+    """
+
+    def __init__(self, ttl_seconds: float, clock: Callable[[], float] = time.monotonic) -> None:
+        if ttl_seconds <= 0:
+            raise ValueError("ttl_seconds must be > 0")
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._entries: dict[str, TemplateSource] = {}
+        self._version: Hashable | None = None
+        self._checked_at: float | None = None
+        self._generation = 0
+        self._lock = threading.Lock()
+        _live_caches.add(self)
+
+    def needs_probe(self) -> bool:
+        checked_at = self._checked_at
+        return checked_at is None or self._clock() - checked_at >= self.ttl_seconds
+
+    def validate(self, version: Hashable) -> None:
+        """Record a probe result, dropping every entry if the table changed."""
+        with self._lock:
+            if version != self._version:
+                self._entries.clear()
+                self._version = version
+                self._generation += 1
+            self._checked_at = self._clock()
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def get(self, name: str) -> TemplateSource | None:
+        return self._entries.get(name)
+
+    def put(self, name: str, source: TemplateSource, generation: int) -> None:
+        """Cache `source` unless the cache was dropped since `generation` was read."""
+        with self._lock:
+            if generation == self._generation:
+                self._entries[name] = source
+
+    def discard(self, name: str) -> None:
+        with self._lock:
+            self._entries.pop(name, None)
+            self._generation += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._generation += 1
+            self._version = None
+            self._checked_at = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+_live_caches: weakref.WeakSet[TemplateSourceCache] = weakref.WeakSet()
+
+
+def _forget(name: str) -> None:
+    for cache in list(_live_caches):
+        cache.discard(name)
+
+
+# Runs at flush, before commit: a rolled-back deactivation only costs a cache miss.
+@event.listens_for(EmailTemplate, "after_update")
+def _forget_deactivated(mapper: Any, connection: Any, target: EmailTemplate) -> None:
+    if not target.is_active:
+        _forget(target.name)
+
+
+@event.listens_for(EmailTemplate, "after_delete")
+def _forget_deleted(mapper: Any, connection: Any, target: EmailTemplate) -> None:
+    _forget(target.name)
+
+
+_shared_cache: TemplateSourceCache | None = None
+
+
+def get_template_source_cache() -> TemplateSourceCache | None:
+    """Return the shared cache, or None when FAPO_TEMPLATE_SOURCE_CACHE_TTL is 0."""
+    global _shared_cache
+    ttl = settings.template_source_cache_ttl
+    if ttl <= 0:
+        return None
+    if _shared_cache is None or _shared_cache.ttl_seconds != ttl:
+        _shared_cache = TemplateSourceCache(ttl)
+    return _shared_cache
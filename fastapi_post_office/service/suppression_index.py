@@ -0,0 +1,226 @@
+from __future__ import annotations
+
+import hashlib
+import math
+import threading
+import time
+import weakref
+from collections.abc import Callable, Iterable
+from datetime import datetime, timedelta
+from typing import Any
+
+from sqlalchemy import event
+
+from fastapi_post_office.config import settings
+from fastapi_post_office.db.models import EmailSuppression
+
+# Rows are re-read from this far behind the newest `created_at` seen, so a
+# suppression committed late by a long transaction is still picked up. Adding an
+# address twice is harmless.
+_WATERMARK_OVERLAP = timedelta(minutes=5)
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over strings.
+
+    Sized for `capacity` items at `error_rate` false positives: about
+    -ln(error_rate) / ln(2)^2 bits per item, i.e. ~1.14 MiB per million items at 1%.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.01) -> None:
+        if capacity <= 0:
+            raise ValueError("capacity must be > 0")
+        if not 0 < error_rate < 1:
+            raise ValueError("error_rate must be between 0 and 1")
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.bit_count = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.bit_count / capacity * math.log(2)))
+        self._bits = bytearray((self.bit_count + 7) // 8)
+        self._items = 0
+
+    def _positions(self, item: str) -> list[int]:
+        # Double hashing: k positions from two 64-bit halves of one digest.
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        m = self.bit_count
+        return [(h1 + i * h2) % m for i in range(self.hash_count)]
+
+    def add(self, item: str) -> bool:
+        """Add `item`; returns False if it was (probably) already present."""
+        bits = self._bits
+        added = False
+        for pos in self._positions(item):
+            mask = 1 << (pos & 7)
+            if not bits[pos >> 3] & mask:
+                bits[pos >> 3] |= mask
+                added = True
+        if added:
+            self._items += 1
+        return added
+
+    def __contains__(self, item: object) -> bool:
+        if not isinstance(item, str):
+            return False
+        bits = self._bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+    def __len__(self) -> int:
+        return self._items
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._bits)
+
+
+class SuppressionIndexRefresh:
+    """One refresh in progress: feed it rows from `iter_suppressions(since)`, then commit."""
+
+    def __init__(self, index: SuppressionIndex, since: datetime | None) -> None:
+        self.index = index
+        self.since = since
+        self._filter = index._filter if since is not None else index._new_filter()
+        self._watermark = index._watermark if since is not None else None
+
+    def add(self, rows: Iterable[tuple[str, datetime | None]]) -> None:
+        bloom = self._filter
+        assert bloom is not None
+        watermark = self._watermark
+        for email, created_at in rows:
+            bloom.add(email.lower())
+            if created_at is not None and (watermark is None or created_at > watermark):
+                watermark = created_at
+        self._watermark = watermark
+
+    def commit(self) -> None:
+        self.index._commit(self._filter, self._watermark)
+
+
+class SuppressionIndex:
+    """
+    In-process filter over `email_suppressions` that answers "not suppressed"
+    without a database round trip.
+
+    The first refresh loads every address into a Bloom filter; later refreshes
+    (at most every `refresh_seconds`) only read rows created since the newest
+    `created_at` seen. Addresses the filter reports as possibly suppressed must
+    still be confirmed with `find_suppressed`, so false positives and removed
+    suppressions cost a query, never a wrong answer. When more addresses than
+    `capacity` have been added, the next refresh reloads everything into a
+    filter twice as large (which also drops removed addresses).
+
+    Suppressions written through the ORM in this process are added to the filter
+    as soon as they are flushed. Those written by other processes (or with plain
+    SQL) are only seen at the next refresh: for up to `refresh_seconds` the filter
+    may answer "not suppressed" for them.
+    """
+
+    def __init__(
+        self,
+        refresh_seconds: float,
+        capacity: int = 1_000_000,
+        error_rate: float = 0.01,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        if refresh_seconds <= 0:
+            raise ValueError("refresh_seconds must be > 0")
+        self.refresh_seconds = refresh_seconds
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self._clock = clock
+        self._filter: BloomFilter | None = None
+        self._watermark: datetime | None = None
+        self._refreshed_at: float | None = None
+        # Addresses noted since the current refresh began, replayed into the
+        # filter a full reload builds.
+        self._noted: list[str] = []
+        self._lock = threading.Lock()
+        _live_indexes.add(self)
+
+    @property
+    def ready(self) -> bool:
+        return self._filter is not None
+
+    def _new_filter(self) -> BloomFilter:
+        loaded = len(self._filter) if self._filter is not None else 0
+        return BloomFilter(max(self.capacity, loaded * 2), self.error_rate)
+
+    def begin_refresh(self) -> SuppressionIndexRefresh | None:
+        """
+        Start a refresh if one is due, or None.
+
+        The refresh is claimed when it starts, so concurrent callers do not reload
+        the same rows, and a failed refresh is retried after `refresh_seconds`.
+        """
+        with self._lock:
+            now = self._clock()
+            if self._refreshed_at is not None and now - self._refreshed_at < self.refresh_seconds:
+                return None
+            self._refreshed_at = now
+            self._noted = []
+            bloom, watermark = self._filter, self._watermark
+            since = None
+            if bloom is not None and watermark is not None and len(bloom) <= bloom.capacity:
+                since = watermark - _WATERMARK_OVERLAP
+        return SuppressionIndexRefresh(self, since)
+
+    def _commit(self, bloom: BloomFilter | None, watermark: datetime | None) -> None:
+        with self._lock:
+            if bloom is not None and bloom is not self._filter:
+                for email in self._noted:
+                    bloom.add(email)
+            self._noted = []
+            self._filter = bloom
+            if watermark is not None:
+                self._watermark = watermark
+
+    def add(self, email: str) -> None:
+        """Add a suppression written by this process without waiting for a refresh."""
+        email = email.lower()
+        with self._lock:
+            if self._filter is not None:
+                self._filter.add(email)
+            self._noted.append(email)
+
+    def invalidate(self) -> None:
+        """Reload every address on the next refresh, e.g. after bulk removals."""
+        with self._lock:
+            self._watermark = None
+            self._refreshed_at = None
+
+    def candidates(self, emails: Iterable[str]) -> list[str]:
+        """The addresses that may be suppressed; all of them until the first load."""
+        bloom = self._filter
+        if bloom is None:
+            return list(emails)
+        return [email for email in emails if email.lower() in bloom]
+
+
+_live_indexes: weakref.WeakSet[SuppressionIndex] = weakref.WeakSet()
+
+
+# Runs at flush, before commit: a rolled-back suppression only costs a query.
+@event.listens_for(EmailSuppression, "after_insert")
+def _note_suppression(mapper: Any, connection: Any, target: EmailSuppression) -> None:
+    for index in list(_live_indexes):
+        index.add(target.email)
+
+
+_shared_index: SuppressionIndex | None = None
+
+
+def get_suppression_index() -> SuppressionIndex | None:
+    """Return the shared index, or None when FAPO_SUPPRESSION_INDEX_REFRESH_SECONDS is 0."""
+    global _shared_index
+    refresh_seconds = settings.suppression_index_refresh_seconds
+    if refresh_seconds <= 0:
+        return None
+    if _shared_index is None or _shared_index.refresh_seconds != refresh_seconds:
+        _shared_index = SuppressionIndex(
+            refresh_seconds,
+            capacity=settings.suppression_index_capacity,
+            error_rate=settings.suppression_index_error_rate,
+        )
+    return _shared_index
@@ -37,3 +37,19 @@ def validate_from(from_email: str) -> str:
         raise ValidationError("from_email must not be empty")
     _check_header_injection(from_email, "from_email")
     return from_email
+
+
+class SuppressedRecipientError(ValidationError):
+    """Raised when recipients are on the suppression list; `emails` lists all of them."""
+
+    def __init__(self, emails: list[str]) -> None:
+        self.emails = emails
+        label = "Recipient" if len(emails) == 1 else "Recipients"
+        super().__init__(f"{label} suppressed: {', '.join(emails)}")
+
+
+def ensure_not_suppressed(recipients: Iterable[str], suppressed: set[str]) -> None:
+    """Raise if any recipient is in `suppressed` (lowercased addresses)."""
+    blocked = [email for email in dict.fromkeys(recipients) if email.lower() in suppressed]
+    if blocked:
+        raise SuppressedRecipientError(blocked)
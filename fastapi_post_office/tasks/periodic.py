@@ -45,4 +45,7 @@ def cleanup_sent_messages() -> int:
     with _session_scope() as session:
         repo = EmailRepository(session)
         deleted = repo.cleanup_sent(settings.retention_days)
+        # Without dedupe the email_bodies table may not exist (see the upgrade DDL).
+        if settings.dedupe_bodies:
+            repo.cleanup_bodies()
     return deleted
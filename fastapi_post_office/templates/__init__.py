@@ -1,18 +1,76 @@
+from .bundle import BundleError, TemplateBundle, get_template_bundle, write_bundle
+from .cache import CacheStats, TemplateCache
+from .executor import RenderExecutor, get_render_executor
 from .hasher import compute_source_hash
+from .instrumentation import (
+    RenderEvent,
+    RenderHistogram,
+    add_render_hook,
+    remove_render_hook,
+    render_hooks,
+)
 from .loader import TemplateLoadError, TemplateSource, load_template_dir, load_templates
 from .manifest import ManifestError, TemplateManifest, load_manifest
-from .renderer import RenderedTemplate, RenderError, render_template
+from .partials import PartialError, PartialSource, load_partials, partial_registry
+from .provider import TemplateProvider, get_template_provider
+from .renderer import (
+    BatchRenderResult,
+    CompiledTemplate,
+    RenderedTemplate,
+    RenderError,
+    compile_template,
+    invalidate_compiled,
+    render_many,
+    render_subject,
+    render_template,
+    template_cache,
+    validate_context,
+    vet_partial,
+    vet_template,
+)
+from .watcher import TemplateWatcher, get_template_watcher
 
 __all__ = [
+    "BatchRenderResult",
+    "BundleError",
+    "CacheStats",
+    "CompiledTemplate",
     "ManifestError",
+    "PartialError",
+    "PartialSource",
     "RenderError",
+    "RenderEvent",
+    "RenderExecutor",
+    "RenderHistogram",
     "RenderedTemplate",
+    "TemplateBundle",
+    "TemplateCache",
     "TemplateLoadError",
     "TemplateManifest",
+    "TemplateProvider",
     "TemplateSource",
+    "TemplateWatcher",
+    "add_render_hook",
+    "compile_template",
     "compute_source_hash",
+    "get_render_executor",
+    "get_template_bundle",
+    "get_template_provider",
+    "get_template_watcher",
+    "invalidate_compiled",
     "load_manifest",
+    "load_partials",
     "load_template_dir",
     "load_templates",
+    "partial_registry",
+    "remove_render_hook",
+    "render_hooks",
+    "render_many",
+    "render_subject",
     "render_template",
+    "template_cache",
+    "validate_context",
+    "vet_partial",
+    "vet_template",
+    "write_bundle",
 ]
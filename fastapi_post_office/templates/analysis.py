@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+from jinja2 import Environment, meta, nodes
+from jinja2.sandbox import (
+    UNSAFE_ASYNC_GENERATOR_ATTRIBUTES,
+    UNSAFE_COROUTINE_ATTRIBUTES,
+    UNSAFE_GENERATOR_ATTRIBUTES,
+)
+
+# Parsing only; no template is ever rendered through this environment.
+_parse_env = Environment(autoescape=False)
+
+# Attribute names the sandbox refuses even without a leading underscore.
+UNSAFE_ATTRIBUTES = (
+    frozenset({"mro"})
+    | UNSAFE_GENERATOR_ATTRIBUTES
+    | UNSAFE_COROUTINE_ATTRIBUTES
+    | UNSAFE_ASYNC_GENERATOR_ATTRIBUTES
+)
+
+
+def is_unsafe_attribute(name: str) -> bool:
+    return name.startswith("_") or name in UNSAFE_ATTRIBUTES
+
+
+def _defined_test(node: nodes.Node) -> tuple[str, bool] | None:
+    """For `x is defined` / `x is undefined` return (x, True/False), else None."""
+    if (
+        isinstance(node, nodes.Test)
+        and node.name in ("defined", "undefined")
+        and isinstance(node.node, nodes.Name)
+    ):
+        return node.node.name, node.name == "defined"
+    return None
+
+
+def _unguarded_names(node: nodes.Node, defined: frozenset[str], found: set[str]) -> None:
+    """
+    Collect the names loaded somewhere without a guard.
+
+    Under StrictUndefined only `x | default(...)`, `x is defined` and the branch
+    such a test selects cope with `x` being missing; `{% if x %}` still raises.
+    """
+    if isinstance(node, nodes.Name):
+        if node.ctx == "load" and node.name not in defined:
+            found.add(node.name)
+        return
+    if isinstance(node, (nodes.If, nodes.CondExpr)):
+        test = _defined_test(node.test)
+        if test is not None:
+            name, is_defined = test
+            if isinstance(node, nodes.If):
+                taken, other = list(node.body), [*node.elif_, *node.else_]
+            else:
+                taken, other = [node.expr1], [node.expr2] if node.expr2 is not None else []
+            if not is_defined:
+                taken, other = other, taken
+            for child in taken:
+                _unguarded_names(child, defined | {name}, found)
+            for child in other:
+                _unguarded_names(child, defined, found)
+            return
+    skip: nodes.Node | None = None
+    if isinstance(node, nodes.Filter) and node.name in ("default", "d"):
+        if isinstance(node.node, nodes.Name):
+            skip = node.node
+    elif _defined_test(node) is not None:
+        assert isinstance(node, nodes.Test)
+        skip = node.node
+    for child in node.iter_child_nodes():
+        if child is not skip:
+            _unguarded_names(child, defined, found)
+
+
+def find_template_vars(*template_sources: str | None) -> set[str]:
+    """
+    Return the context variables the given template sources require.
+
+    Names assigned inside the templates and Jinja globals (`range`, `dict`, ...)
+    are excluded, and so are names whose every use is guarded with
+    `| default(...)` or `is defined`. Raises `jinja2.TemplateSyntaxError` for
+    invalid sources.
+    """
+    names: set[str] = set()
+    for template_source in template_sources:
+        if template_source is None:
+            continue
+        ast = _parse_env.parse(template_source)
+        undeclared = meta.find_undeclared_variables(ast)
+        unguarded: set[str] = set()
+        _unguarded_names(ast, frozenset(), unguarded)
+        # A name the template also assigns keeps jinja's scoping answer.
+        assigned = {name.name for name in ast.find_all(nodes.Name) if name.ctx != "load"}
+        names |= undeclared & (unguarded | assigned)
+    return names - set(_parse_env.globals)
+
+
+def _const_name(node: nodes.Node) -> str | None:
+    if isinstance(node, nodes.Const) and isinstance(node.value, str):
+        return node.value
+    return None
+
+
+def _unsafe_accesses(ast: nodes.Template) -> list[str]:
+    problems: list[str] = []
+    for node in ast.find_all((nodes.Getattr, nodes.Getitem, nodes.Filter, nodes.Test)):
+        if isinstance(node, nodes.Getattr):
+            if is_unsafe_attribute(node.attr):
+                problems.append(f".{node.attr} (line {node.lineno})")
+        elif isinstance(node, nodes.Getitem):
+            name = _const_name(node.arg)
+            if name is not None and is_unsafe_attribute(name):
+                problems.append(f"[{name!r}] (line {node.lineno})")
+        elif isinstance(node, (nodes.Filter, nodes.Test)):
+            problems.extend(_unsafe_attribute_args(node))
+    return problems
+
+
+def _unsafe_attribute_args(node: nodes.Filter | nodes.Test) -> list[str]:
+    # `attr(...)` and the `attribute=` argument of map/sort/groupby/... look
+    # attributes up by name.
+    problems: list[str] = []
+    if isinstance(node, nodes.Filter) and node.name == "attr":
+        name = _const_name(node.args[0]) if node.args else None
+        if name is None:
+            problems.append(f"attr() with a computed name (line {node.lineno})")
+        elif is_unsafe_attribute(name):
+            problems.append(f"attr({name!r}) (line {node.lineno})")
+    for keyword in node.kwargs:
+        if keyword.key != "attribute":
+            continue
+        name = _const_name(keyword.value)
+        if name is not None and any(is_unsafe_attribute(part) for part in name.split(".")):
+            problems.append(f"attribute={name!r} (line {node.lineno})")
+    return problems
+
+
+def find_unsafe_access(*template_sources: str | None) -> list[str]:
+    """
+    Return the attribute lookups the Jinja sandbox would refuse, in source order.
+
+    This is the static half of vetting a template for trusted (unsandboxed)
+    rendering: underscore-prefixed and internal attributes reached through `.`,
+    constant subscripts, `attr()` or `attribute=`. Names computed at render time
+    are checked by the trusted environment itself. Raises
+    `jinja2.TemplateSyntaxError` for invalid sources.
+    """
+    problems: list[str] = []
+    for template_source in template_sources:
+        if template_source is None:
+            continue
+        problems.extend(_unsafe_accesses(_parse_env.parse(template_source)))
+    return problems
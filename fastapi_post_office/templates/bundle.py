@@ -0,0 +1,217 @@
+from __future__ import annotations
+
+import json
+import mmap
+import os
+import struct
+import threading
+from collections.abc import Iterable
+from dataclasses import asdict
+from pathlib import Path
+from typing import Any
+
+from fastapi_post_office.config import settings
+
+from .loader import TemplateSource
+from .manifest import TemplateManifest
+from .partials import PartialSource
+from .renderer import RenderError, vet_partial, vet_template
+
+# Layout: header | JSON index | entries. The header holds the magic, the format
+# version and the index length; the index maps names to (offset, length) of
+# JSON-encoded entries, relative to the end of the index.
+BUNDLE_MAGIC = b"FAPOBNDL"
+BUNDLE_VERSION = 1
+_HEADER = struct.Struct("<8sHI")
+
+
+class BundleError(ValueError):
+    pass
+
+
+def _template_entry(source: TemplateSource, include_compiled: bool) -> dict[str, Any]:
+    return {
+        "manifest": asdict(source.manifest),
+        "subject": source.subject_template,
+        "html": source.html_template,
+        "text": source.text_template,
+        "source_hash": source.source_hash,
+        "template_vars": list(source.template_vars) if source.template_vars is not None else None,
+        "dependencies": source.dependencies,
+        "compiled": source.compiled if include_compiled else None,
+    }
+
+
+def _encode(entry: dict[str, Any]) -> bytes:
+    return json.dumps(entry, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def write_bundle(
+    path: Path,
+    sources: Iterable[TemplateSource],
+    partials: Iterable[PartialSource] = (),
+    include_compiled: bool = True,
+) -> int:
+    """Write a bundle atomically and return its size in bytes."""
+    blobs: list[bytes] = []
+    offset = 0
+    index: dict[str, dict[str, list[int]]] = {"templates": {}, "partials": {}}
+
+    def add(kind: str, name: str, blob: bytes) -> None:
+        nonlocal offset
+        if name in index[kind]:
+            raise BundleError(f"Duplicate {kind[:-1]} in bundle: {name}")
+        index[kind][name] = [offset, len(blob)]
+        blobs.append(blob)
+        offset += len(blob)
+
+    for source in sources:
+        add("templates", source.manifest.name, _encode(_template_entry(source, include_compiled)))
+    for partial in partials:
+        add(
+            "partials",
+            partial.name,
+            _encode({"source": partial.source, "hash": partial.source_hash}),
+        )
+
+    index_blob = _encode(index)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    try:
+        with tmp.open("wb") as fh:
+            fh.write(_HEADER.pack(BUNDLE_MAGIC, BUNDLE_VERSION, len(index_blob)))
+            fh.write(index_blob)
+            for blob in blobs:
+                fh.write(blob)
+        os.replace(tmp, path)
+    finally:
+        tmp.unlink(missing_ok=True)
+    return _HEADER.size + len(index_blob) + offset
+
+
+class TemplateBundle:
+    """
+    Read-only view of a bundle built by `fapo build-templates`.
+
+    The file is memory-mapped and only the index is parsed on open; each template
+    is decoded on first access and then kept in memory. With FAPO_TRUSTED_TEMPLATES
+    every template and partial is vetted on first access as well, so a bundle that
+    was not written by `fapo build-templates` cannot leave the sandbox.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        try:
+            with path.open("rb") as fh:
+                self._mmap = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError) as exc:
+            raise BundleError(f"Cannot open template bundle {path}: {exc}") from exc
+        try:
+            self._templates, self._partials, self._data_start = self._read_index()
+        except BundleError:
+            self._mmap.close()
+            raise
+        self._loaded: dict[str, TemplateSource] = {}
+        self._lock = threading.Lock()
+
+    def _read_index(self) -> tuple[dict[str, list[int]], dict[str, list[int]], int]:
+        if len(self._mmap) < _HEADER.size:
+            raise BundleError(f"Not a template bundle: {self.path}")
+        magic, version, index_length = _HEADER.unpack_from(self._mmap, 0)
+        if magic != BUNDLE_MAGIC:
+            raise BundleError(f"Not a template bundle: {self.path}")
+        if version != BUNDLE_VERSION:
+            raise BundleError(
+                f"Unsupported template bundle version {version} (expected {BUNDLE_VERSION})"
+            )
+        data_start = _HEADER.size + index_length
+        if data_start > len(self._mmap):
+            raise BundleError(f"Truncated template bundle: {self.path}")
+        try:
+            index = json.loads(self._mmap[_HEADER.size : data_start])
+        except ValueError as exc:
+            raise BundleError(f"Corrupt template bundle index: {self.path}") from exc
+        return index.get("templates", {}), index.get("partials", {}), data_start
+
+    def _entry(self, location: list[int]) -> dict[str, Any]:
+        offset, length = location
+        start = self._data_start + offset
+        if start + length > len(self._mmap):
+            raise BundleError(f"Truncated template bundle: {self.path}")
+        entry: dict[str, Any] = json.loads(self._mmap[start : start + length])
+        return entry
+
+    def names(self) -> list[str]:
+        return sorted(self._templates)
+
+    def get(self, name: str) -> TemplateSource | None:
+        source = self._loaded.get(name)
+        if source is not None:
+            return source
+        location = self._templates.get(name)
+        if location is None:
+            return None
+        entry = self._entry(location)
+        template_vars = entry.get("template_vars")
+        source = TemplateSource(
+            manifest=TemplateManifest(**entry["manifest"]),
+            subject_template=entry["subject"],
+            html_template=entry.get("html"),
+            text_template=entry.get("text"),
+            source_hash=entry["source_hash"],
+            compiled=entry.get("compiled"),
+            template_vars=tuple(template_vars) if template_vars is not None else None,
+            dependencies=entry.get("dependencies"),
+        )
+        if settings.trusted_templates:
+            try:
+                vet_template(source)
+            except RenderError as exc:
+                raise BundleError(f"Template {name} in {self.path} is invalid: {exc}") from exc
+        with self._lock:
+            return self._loaded.setdefault(name, source)
+
+    def get_partials(self, names: Iterable[str] | None = None) -> list[PartialSource]:
+        wanted = self._partials if names is None else names
+        partials = []
+        for name in wanted:
+            location = self._partials.get(name)
+            if location is None:
+                continue
+            entry = self._entry(location)
+            partial = PartialSource(name=name, source=entry["source"], source_hash=entry["hash"])
+            if settings.trusted_templates:
+                try:
+                    vet_partial(partial)
+                except RenderError as exc:
+                    raise BundleError(f"Partial {name} in {self.path} is invalid: {exc}") from exc
+            partials.append(partial)
+        return partials
+
+    def close(self) -> None:
+        self._mmap.close()
+
+    def __contains__(self, name: object) -> bool:
+        return name in self._templates
+
+    def __len__(self) -> int:
+        return len(self._templates)
+
+    def __enter__(self) -> TemplateBundle:
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+
+_shared_bundle: TemplateBundle | None = None
+
+
+def get_template_bundle() -> TemplateBundle | None:
+    """Return the bundle configured by FAPO_TEMPLATE_BUNDLE_PATH, opened once per process."""
+    global _shared_bundle
+    if not settings.template_bundle_path:
+        return None
+    path = Path(settings.template_bundle_path)
+    if _shared_bundle is None or _shared_bundle.path != path:
+        _shared_bundle = TemplateBundle(path)
+    return _shared_bundle
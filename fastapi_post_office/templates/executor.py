@@ -0,0 +1,343 @@
+from __future__ import annotations
+
+import atexit
+import itertools
+import os
+from collections import deque
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import Future, ProcessPoolExecutor
+from contextlib import AbstractContextManager, nullcontext
+from typing import Any
+
+from fastapi_post_office.config import settings
+
+from .bundle import get_template_bundle
+from .instrumentation import RenderEvent, render_hooks
+from .loader import TemplateSource
+from .partials import PartialSource, partial_registry
+from .renderer import (
+    BatchRenderResult,
+    RenderedTemplate,
+    RenderError,
+    compile_template,
+    render_many,
+    render_template,
+)
+
+# (name, revision, source hash): what jobs send instead of the template itself.
+TemplateKey = tuple[str, int, str]
+
+# Templates a worker has received, by name: the preloaded ones from `_init_worker`,
+# the others from the first job that had to ship them.
+_worker_sources: dict[str, TemplateSource] = {}
+
+
+class TemplateNotShipped(Exception):
+    """A worker was asked to render a template it has not received; the parent resends it."""
+
+
+def _template_key(source: TemplateSource) -> TemplateKey:
+    return (source.manifest.name, source.manifest.revision, source.source_hash)
+
+
+def _install(source: TemplateSource, partials: list[PartialSource]) -> None:
+    partial_registry.update(partials)
+    _worker_sources[source.manifest.name] = source
+
+
+def _init_worker(
+    sources: list[TemplateSource], partials: list[PartialSource], strict: bool, trusted: bool
+) -> None:
+    # Forked children inherit the parent's render hooks; events are sent back to
+    # the parent instead, so hooks only ever run in the process that registered them.
+    render_hooks.clear()
+    partial_registry.update(partials)
+    # Keep the preloaded templates and warm the child's compiled-template cache, so
+    # jobs only carry a template key and the first batch does not pay for
+    # compilation on every worker.
+    for source in sources:
+        _worker_sources[source.manifest.name] = source
+        try:
+            compile_template(source, strict, trusted)
+        except RenderError:
+            continue
+
+
+_Shipment = tuple[TemplateSource, list[PartialSource]]
+
+
+def _worker_source(key: TemplateKey, shipment: _Shipment | None) -> TemplateSource:
+    if shipment is not None:
+        _install(*shipment)
+        return shipment[0]
+    source = _worker_sources.get(key[0])
+    if (
+        source is None
+        or _template_key(source) != key
+        or partial_registry.stale(source.dependencies)
+    ):
+        raise TemplateNotShipped(key)
+    return source
+
+
+def _render_one(
+    key: TemplateKey,
+    shipment: _Shipment | None,
+    context: dict[str, Any],
+    strict: bool,
+    max_bytes: int,
+    trusted: bool,
+    observe: bool,
+) -> tuple[RenderedTemplate | None, Exception | None, list[RenderEvent]]:
+    source = _worker_source(key, shipment)
+    if not observe:
+        return render_template(source, context, strict, max_bytes, trusted), None, []
+    with render_hooks.collect() as events:
+        try:
+            rendered = render_template(source, context, strict, max_bytes, trusted)
+        except Exception as exc:
+            return None, exc, events
+    return rendered, None, events
+
+
+def _render_chunk(
+    key: TemplateKey,
+    shipment: _Shipment | None,
+    start: int,
+    contexts: list[dict[str, Any]],
+    strict: bool,
+    max_bytes: int,
+    trusted: bool,
+    observe: bool,
+) -> tuple[list[BatchRenderResult], list[RenderEvent]]:
+    source = _worker_source(key, shipment)
+    collector: AbstractContextManager[list[RenderEvent]] = (
+        render_hooks.collect() if observe else nullcontext([])
+    )
+    with collector as events:
+        results = [
+            BatchRenderResult(
+                index=start + result.index, rendered=result.rendered, error=result.error
+            )
+            for result in render_many(
+                source, contexts, strict=strict, max_bytes=max_bytes, trusted=trusted
+            )
+        ]
+    return results, events
+
+
+_RenderJob = Future[tuple[RenderedTemplate | None, Exception | None, list[RenderEvent]]]
+
+
+def _resolve(
+    job: _RenderJob,
+    result: Future[RenderedTemplate],
+    resend: Callable[[], _RenderJob] | None,
+) -> None:
+    try:
+        rendered, error, events = job.result()
+    except TemplateNotShipped:
+        if resend is None:
+            raise
+        try:
+            retry = resend()
+        except BaseException as exc:
+            result.set_exception(exc)
+            return
+        retry.add_done_callback(lambda done: _resolve(done, result, None))
+        return
+    except BaseException as exc:
+        result.set_exception(exc)
+        return
+    # Replay the child's render events to the hooks registered in this process.
+    render_hooks.emit_all(events)
+    if error is not None:
+        result.set_exception(error)
+    else:
+        assert rendered is not None
+        result.set_result(rendered)
+
+
+class RenderExecutor:
+    """
+    Render templates in a pool of worker processes.
+
+    Jinja rendering is pure Python, so a single process renders on one core. The
+    executor spreads single renders and batches across processes. `preload`
+    templates reach every worker through the pool initializer, and jobs for them
+    carry only the template's (name, revision, source hash) and the contexts.
+    Each chunk of a `render_many` batch for any other template (or a preloaded one
+    whose revision or partials changed since) carries the source itself, so no
+    worker has to miss it first. A single render ships it once per worker, with
+    the first job that lands on a worker without it. Each child keeps its own
+    compiled-template cache.
+    """
+
+    def __init__(
+        self,
+        max_workers: int | None = None,
+        preload: Iterable[TemplateSource] = (),
+        chunk_size: int = 64,
+        strict: bool = True,
+        trusted: bool = False,
+        partials: Iterable[PartialSource] | None = None,
+    ) -> None:
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be >= 1")
+        self.chunk_size = chunk_size
+        self.max_workers = max_workers or os.cpu_count() or 1
+        sources = list(preload)
+        if partials is None:
+            partials = [
+                partial
+                for source in sources
+                for partial in partial_registry.resolve(source.dependencies)
+            ]
+        partials = list(partials)
+        self._preloaded = {_template_key(source) for source in sources}
+        self._preloaded_partials = {partial.name: partial.source_hash for partial in partials}
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            initializer=_init_worker,
+            initargs=(sources, partials, strict, trusted),
+        )
+
+    def _is_preloaded(self, source: TemplateSource) -> bool:
+        return _template_key(source) in self._preloaded and all(
+            self._preloaded_partials.get(name) == source_hash
+            for name, source_hash in (source.dependencies or {}).items()
+        )
+
+    def _shipment(self, source: TemplateSource) -> _Shipment:
+        # Children have their own partial registry; layouts/partials travel with
+        # the template.
+        return source, partial_registry.resolve(source.dependencies)
+
+    def submit(
+        self,
+        source: TemplateSource,
+        context: dict[str, Any],
+        strict: bool,
+        max_bytes: int,
+        trusted: bool = False,
+    ) -> Future[RenderedTemplate]:
+        key = _template_key(source)
+        observe = bool(render_hooks)
+
+        def send(shipment: _Shipment | None) -> _RenderJob:
+            return self._pool.submit(
+                _render_one, key, shipment, context, strict, max_bytes, trusted, observe
+            )
+
+        result: Future[RenderedTemplate] = Future()
+        send(None).add_done_callback(
+            lambda done: _resolve(done, result, lambda: send(self._shipment(source)))
+        )
+        return result
+
+    def render(
+        self,
+        source: TemplateSource,
+        context: dict[str, Any],
+        strict: bool,
+        max_bytes: int,
+        trusted: bool = False,
+    ) -> RenderedTemplate:
+        return self.submit(source, context, strict, max_bytes, trusted).result()
+
+    def render_many(
+        self,
+        source: TemplateSource,
+        contexts: Iterable[dict[str, Any]],
+        strict: bool,
+        max_bytes: int,
+        trusted: bool = False,
+    ) -> Iterator[BatchRenderResult]:
+        """
+        Render a batch across the pool, yielding results in input order.
+
+        Contexts are sent in chunks and only a bounded number of chunks is in
+        flight, so memory stays flat for very large batches. Unless the template is
+        preloaded unchanged, every chunk carries its source and partials. A compile
+        error is raised when the first result is requested.
+        """
+        max_in_flight = 2 * self.max_workers
+        key = _template_key(source)
+        observe = bool(render_hooks)
+        shipment = None if self._is_preloaded(source) else self._shipment(source)
+
+        def send(
+            shipment: _Shipment | None, start: int, chunk: list[dict[str, Any]]
+        ) -> Future[tuple[list[BatchRenderResult], list[RenderEvent]]]:
+            return self._pool.submit(
+                _render_chunk, key, shipment, start, chunk, strict, max_bytes, trusted, observe
+            )
+
+        iterator = iter(contexts)
+        pending: deque[
+            tuple[
+                Future[tuple[list[BatchRenderResult], list[RenderEvent]]],
+                int,
+                list[dict[str, Any]],
+            ]
+        ] = deque()
+        start = 0
+        while True:
+            while len(pending) < max_in_flight:
+                chunk = list(itertools.islice(iterator, self.chunk_size))
+                if not chunk:
+                    break
+                pending.append((send(shipment, start, chunk), start, chunk))
+                start += len(chunk)
+            if not pending:
+                return
+            job, chunk_start, chunk = pending.popleft()
+            try:
+                results, events = job.result()
+            except TemplateNotShipped:
+                # A worker's partials were replaced by another template's shipment
+                # after it was preloaded.
+                results, events = send(self._shipment(source), chunk_start, chunk).result()
+            render_hooks.emit_all(events)
+            yield from results
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._pool.shutdown(wait=wait, cancel_futures=not wait)
+
+    def __enter__(self) -> RenderExecutor:
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.shutdown()
+
+
+_shared_executor: RenderExecutor | None = None
+
+
+def get_render_executor() -> RenderExecutor | None:
+    """
+    Return the process-wide executor, or None when FAPO_RENDER_WORKERS is 0.
+
+    With FAPO_TEMPLATE_BUNDLE_PATH every bundled template is preloaded into the
+    workers; other templates are shipped to each worker on first use.
+    """
+    global _shared_executor
+    if settings.render_workers <= 0:
+        return None
+    if _shared_executor is None:
+        bundle = get_template_bundle()
+        preload: list[TemplateSource] = []
+        partials: list[PartialSource] | None = None
+        if bundle is not None:
+            preload = [source for name in bundle.names() if (source := bundle.get(name))]
+            partials = bundle.get_partials()
+        _shared_executor = RenderExecutor(
+            max_workers=settings.render_workers,
+            preload=preload,
+            chunk_size=settings.render_chunk_size,
+            strict=settings.strict_template_vars,
+            trusted=settings.trusted_templates,
+            partials=partials,
+        )
+        atexit.register(_shared_executor.shutdown)
+    return _shared_executor
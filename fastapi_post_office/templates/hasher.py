@@ -1,14 +1,145 @@
 from __future__ import annotations
 
 import hashlib
+import json
+import os
+import threading
+import time
+from collections.abc import Callable, Sequence
 from pathlib import Path
+from typing import Any
 
+HASH_CACHE_FILE = ".fapo-cache"
+HASH_CACHE_VERSION = 1
 
-def compute_source_hash(*paths: Path) -> str:
+_CHUNK_SIZE = 1 << 20
+# Files modified this recently may still change within the same mtime tick, so
+# their hash is not cached (the "racy timestamp" problem).
+_RACY_WINDOW_NS = 2_000_000_000
+
+_Stat = tuple[int, int] | None
+
+
+def _hash_paths(paths: Sequence[Path]) -> str:
     digest = hashlib.sha256()
     for path in paths:
-        if not path.exists():
+        try:
+            fh = path.open("rb")
+        except FileNotFoundError:
             continue
-        digest.update(path.name.encode("utf-8"))
-        digest.update(path.read_bytes())
+        with fh:
+            digest.update(path.name.encode("utf-8"))
+            while chunk := fh.read(_CHUNK_SIZE):
+                digest.update(chunk)
     return digest.hexdigest()
+
+
+def _stat(path: Path) -> _Stat:
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return None
+    return (st.st_size, st.st_mtime_ns)
+
+
+class HashCache:
+    """
+    On-disk cache of source hashes keyed by file path, size and mtime.
+
+    With a warm cache, hashing an unchanged set of files costs one `stat()` per
+    file. The cache is best-effort: an unreadable or outdated file is ignored and
+    a failed save is silently skipped. Entries not used since loading are pruned
+    on save. Paths are keyed relative to `root` (default: the cache file's
+    directory), so the file may live outside the source tree.
+    """
+
+    def __init__(
+        self, path: Path, entries: dict[str, Any] | None = None, root: Path | None = None
+    ) -> None:
+        self.path = path
+        self._root = root if root is not None else path.parent
+        self._entries: dict[str, Any] = entries or {}
+        self._used: set[str] = set()
+        self._dirty = False
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path: Path, root: Path | None = None) -> HashCache:
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return cls(path, root=root)
+        if not isinstance(data, dict) or data.get("version") != HASH_CACHE_VERSION:
+            return cls(path, root=root)
+        entries = data.get("entries")
+        return cls(path, entries if isinstance(entries, dict) else None, root=root)
+
+    @classmethod
+    def for_root(cls, root: Path, path: Path | None = None) -> HashCache:
+        """Load the cache for a templates root, from `<root>/.fapo-cache` by default."""
+        return cls.load(path if path is not None else root / HASH_CACHE_FILE, root=root)
+
+    def _key(self, paths: Sequence[Path]) -> str:
+        parts = []
+        for path in paths:
+            try:
+                parts.append(path.relative_to(self._root).as_posix())
+            except ValueError:
+                parts.append(str(path))
+        return "\n".join(parts)
+
+    def get_or_compute(self, paths: Sequence[Path], compute: Callable[[], str]) -> str:
+        # Stat before hashing: if a file changes while it is hashed, its new
+        # stat no longer matches the stored one and the next lookup recomputes.
+        stats = [_stat(path) for path in paths]
+        signature = [list(stat) if stat is not None else None for stat in stats]
+        key = self._key(paths)
+        with self._lock:
+            self._used.add(key)
+            entry = self._entries.get(key)
+        if entry is not None and entry.get("stat") == signature:
+            return str(entry["hash"])
+
+        value = compute()
+        newest = max((stat[1] for stat in stats if stat is not None), default=0)
+        with self._lock:
+            if time.time_ns() - newest >= _RACY_WINDOW_NS:
+                self._entries[key] = {"stat": signature, "hash": value}
+            else:
+                self._entries.pop(key, None)
+            self._dirty = True
+        return value
+
+    def save(self) -> None:
+        with self._lock:
+            stale = self._entries.keys() - self._used
+            if not self._dirty and not stale:
+                return
+            for key in stale:
+                del self._entries[key]
+            payload = json.dumps(
+                {"version": HASH_CACHE_VERSION, "entries": self._entries},
+                separators=(",", ":"),
+                sort_keys=True,
+            )
+            self._dirty = False
+        tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        try:
+            tmp.write_text(payload, encoding="utf-8")
+            os.replace(tmp, self.path)
+        except OSError:
+            tmp.unlink(missing_ok=True)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def compute_source_hash(*paths: Path, cache: HashCache | None = None) -> str:
+    """
+    Hash the names and contents of `paths` (missing files are skipped).
+
+    Files are streamed in chunks. With a `cache`, unchanged files are not read.
+    """
+    if cache is None:
+        return _hash_paths(paths)
+    return cache.get_or_compute(paths, lambda: _hash_paths(paths))
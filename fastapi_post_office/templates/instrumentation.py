@@ -0,0 +1,215 @@
+from __future__ import annotations
+
+import bisect
+import copy
+import logging
+import threading
+from collections.abc import Callable, Iterable, Iterator, Sequence
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class RenderEvent:
+    """
+    One render of one template.
+
+    `durations` and `output_bytes` are keyed by part ("subject", "html", "text") and
+    only contain the parts that were rendered. `compile_seconds` covers the
+    compiled-template cache lookup, including compilation on a miss.
+    """
+
+    template_name: str
+    revision: int
+    cache_hit: bool
+    compile_seconds: float
+    durations: dict[str, float] = field(default_factory=dict)
+    output_bytes: dict[str, int] = field(default_factory=dict)
+    error: str | None = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    @property
+    def render_seconds(self) -> float:
+        return sum(self.durations.values())
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(self.output_bytes.values())
+
+
+RenderHook = Callable[[RenderEvent], None]
+
+
+class RenderHookRegistry:
+    """
+    Callbacks notified after every render.
+
+    The renderer checks `bool(registry)` once per render and only measures when a
+    hook is registered, so an empty registry costs nothing. Hooks may be called
+    from any thread; an exception in a hook is logged and never fails the render.
+    """
+
+    def __init__(self) -> None:
+        self._hooks: tuple[RenderHook, ...] = ()
+        self._lock = threading.Lock()
+
+    def register(self, hook: RenderHook) -> None:
+        with self._lock:
+            if hook not in self._hooks:
+                self._hooks = (*self._hooks, hook)
+
+    def unregister(self, hook: RenderHook) -> None:
+        with self._lock:
+            self._hooks = tuple(h for h in self._hooks if h != hook)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._hooks = ()
+
+    def emit(self, event: RenderEvent) -> None:
+        for hook in self._hooks:
+            try:
+                hook(event)
+            except Exception:
+                logger.exception("Render hook %r failed", hook)
+
+    def emit_all(self, events: Iterable[RenderEvent]) -> None:
+        for event in events:
+            self.emit(event)
+
+    @contextmanager
+    def collect(self) -> Iterator[list[RenderEvent]]:
+        """Temporarily replace the hooks with a collector (used by render workers)."""
+        events: list[RenderEvent] = []
+        with self._lock:
+            saved = self._hooks
+            self._hooks = (events.append,)
+        try:
+            yield events
+        finally:
+            with self._lock:
+                self._hooks = saved
+
+    def __bool__(self) -> bool:
+        return bool(self._hooks)
+
+    def __len__(self) -> int:
+        return len(self._hooks)
+
+
+render_hooks = RenderHookRegistry()
+
+
+def add_render_hook(hook: RenderHook) -> None:
+    render_hooks.register(hook)
+
+
+def remove_render_hook(hook: RenderHook) -> None:
+    render_hooks.unregister(hook)
+
+
+DEFAULT_DURATION_BUCKETS: tuple[float, ...] = (
+    0.0001,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+)
+DEFAULT_SIZE_BUCKETS: tuple[int, ...] = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+
+@dataclass
+class Histogram:
+    """Per-bucket (non-cumulative) counts; the last bucket holds values above every bound."""
+
+    bounds: tuple[float, ...]
+    counts: list[int]
+    count: int = 0
+    total: float = 0.0
+
+    @classmethod
+    def with_bounds(cls, bounds: Sequence[float]) -> Histogram:
+        return cls(bounds=tuple(bounds), counts=[0] * (len(bounds) + 1))
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+
+
+@dataclass
+class TemplateRenderStats:
+    renders: int = 0
+    errors: int = 0
+    cache_hits: int = 0
+    cache_misses: int = 0
+    durations: dict[str, Histogram] = field(default_factory=dict)
+    output_bytes: dict[str, Histogram] = field(default_factory=dict)
+
+
+class RenderHistogram:
+    """
+    In-process metrics adapter: per-template, per-part duration and size histograms.
+
+    Register it with `add_render_hook(histogram)` and export `snapshot()` to your
+    metrics system, or use it as a reference for a Prometheus/StatsD hook.
+    """
+
+    def __init__(
+        self,
+        duration_buckets: Sequence[float] = DEFAULT_DURATION_BUCKETS,
+        size_buckets: Sequence[float] = DEFAULT_SIZE_BUCKETS,
+    ) -> None:
+        self.duration_buckets = tuple(duration_buckets)
+        self.size_buckets = tuple(size_buckets)
+        self._stats: dict[tuple[str, int], TemplateRenderStats] = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, event: RenderEvent) -> None:
+        key = (event.template_name, event.revision)
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = TemplateRenderStats()
+            stats.renders += 1
+            if not event.ok:
+                stats.errors += 1
+            if event.cache_hit:
+                stats.cache_hits += 1
+            else:
+                stats.cache_misses += 1
+            for part, seconds in event.durations.items():
+                histogram = stats.durations.get(part)
+                if histogram is None:
+                    histogram = stats.durations[part] = Histogram.with_bounds(self.duration_buckets)
+                histogram.observe(seconds)
+            for part, size in event.output_bytes.items():
+                histogram = stats.output_bytes.get(part)
+                if histogram is None:
+                    histogram = stats.output_bytes[part] = Histogram.with_bounds(self.size_buckets)
+                histogram.observe(size)
+
+    def get(self, template_name: str, revision: int) -> TemplateRenderStats | None:
+        with self._lock:
+            stats = self._stats.get((template_name, revision))
+            return copy.deepcopy(stats)
+
+    def snapshot(self) -> dict[tuple[str, int], TemplateRenderStats]:
+        with self._lock:
+            return copy.deepcopy(self._stats)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats.clear()
@@ -1,10 +1,22 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+from collections.abc import Mapping
+from dataclasses import dataclass, field
 from pathlib import Path
+from typing import Any
 
-from .hasher import compute_source_hash
+from jinja2 import TemplateSyntaxError
+
+from .analysis import find_template_vars
+from .hasher import HashCache, compute_source_hash
 from .manifest import ManifestError, TemplateManifest, load_manifest
+from .partials import (
+    PARTIALS_DIR,
+    PartialError,
+    PartialSource,
+    find_dependencies,
+    load_partials,
+)
 
 
 @dataclass(frozen=True)
@@ -14,19 +26,48 @@ class TemplateSource:
     html_template: str | None
     text_template: str | None
     source_hash: str
+    # Precompiled Jinja output for this revision (see templates.precompiled).
+    compiled: dict[str, Any] | None = field(default=None, compare=False, repr=False)
+    # Variables referenced by the templates (minus manifest optional_vars); None
+    # when unknown, e.g. for rows synced before discovery existed.
+    template_vars: tuple[str, ...] | None = None
+    # Shared partials the templates extend/include, as name -> partial hash.
+    dependencies: dict[str, str] | None = field(default=None, compare=False)
 
 
 class TemplateLoadError(ValueError):
     pass
 
 
+@dataclass(frozen=True)
+class TemplateStamp:
+    """Manifest and source hash of a template directory, without parsing its templates."""
+
+    path: Path
+    manifest: TemplateManifest
+    source_hash: str
+
+
+# Files that make up a template directory, in source-hash order.
+TEMPLATE_FILES = ("manifest.json", "subject.j2", "html.j2", "text.j2")
+
+
+def _source_paths(path: Path) -> tuple[Path, ...]:
+    return tuple(path / name for name in TEMPLATE_FILES)
+
+
 def _read_optional(path: Path) -> str | None:
     if not path.exists():
         return None
     return path.read_text(encoding="utf-8")
 
 
-def load_template_dir(path: Path, max_bytes: int) -> TemplateSource:
+def load_template_dir(
+    path: Path,
+    max_bytes: int,
+    partials: Mapping[str, PartialSource] | None = None,
+    hash_cache: HashCache | None = None,
+) -> TemplateSource:
     if not path.exists() or not path.is_dir():
         raise TemplateLoadError(f"Template path does not exist: {path}")
 
@@ -58,9 +99,19 @@ def load_template_dir(path: Path, max_bytes: int) -> TemplateSource:
     if size > max_bytes:
         raise TemplateLoadError(f"Template size exceeds limit ({max_bytes} bytes) in {path}")
 
-    source_hash = compute_source_hash(
-        manifest_path, subject_path, path / "html.j2", path / "text.j2"
-    )
+    partials = partials or {}
+    try:
+        dependencies = find_dependencies((subject, html, text), partials)
+        template_vars = find_template_vars(
+            subject, html, text, *(partials[name].source for name in dependencies)
+        )
+    except TemplateSyntaxError as exc:
+        raise TemplateLoadError(f"Invalid template syntax in {path}: {exc}") from exc
+    except PartialError as exc:
+        raise TemplateLoadError(f"{exc} in {path}") from exc
+    template_vars -= set(manifest.optional_vars)
+
+    source_hash = compute_source_hash(*_source_paths(path), cache=hash_cache)
 
     return TemplateSource(
         manifest=manifest,
@@ -68,15 +119,52 @@ def load_template_dir(path: Path, max_bytes: int) -> TemplateSource:
         html_template=html,
         text_template=text,
         source_hash=source_hash,
+        template_vars=tuple(sorted(template_vars)),
+        dependencies=dependencies or None,
+    )
+
+
+def stamp_template_dir(path: Path, hash_cache: HashCache | None = None) -> TemplateStamp:
+    """
+    Read only the manifest and hash the source files of a template directory.
+
+    This is enough to tell whether a directory changed since it was last synced;
+    `load_template_dir` does the full validation and analysis.
+    """
+    manifest_path = path / "manifest.json"
+    if not manifest_path.exists():
+        raise TemplateLoadError(f"Missing manifest.json in {path}")
+    try:
+        manifest = load_manifest(manifest_path)
+    except ManifestError as exc:
+        raise TemplateLoadError(str(exc)) from exc
+    return TemplateStamp(
+        path=path,
+        manifest=manifest,
+        source_hash=compute_source_hash(*_source_paths(path), cache=hash_cache),
     )
 
 
-def load_templates(root: Path, max_bytes: int) -> list[TemplateSource]:
+def template_dirs(root: Path) -> list[Path]:
     if not root.exists() or not root.is_dir():
         raise TemplateLoadError(f"Templates root does not exist: {root}")
+    # <root>/_partials holds shared partials; every other directory is a template.
+    return [
+        child for child in sorted(root.iterdir()) if child.is_dir() and child.name != PARTIALS_DIR
+    ]
+
+
+def load_templates(
+    root: Path, max_bytes: int, hash_cache: HashCache | None = None
+) -> list[TemplateSource]:
+    dirs = template_dirs(root)
+
+    try:
+        partials = {p.name: p for p in load_partials(root, max_bytes=max_bytes)}
+    except PartialError as exc:
+        raise TemplateLoadError(str(exc)) from exc
 
-    sources: list[TemplateSource] = []
-    for child in sorted(root.iterdir()):
-        if child.is_dir():
-            sources.append(load_template_dir(child, max_bytes=max_bytes))
-    return sources
+    return [
+        load_template_dir(child, max_bytes=max_bytes, partials=partials, hash_cache=hash_cache)
+        for child in dirs
+    ]
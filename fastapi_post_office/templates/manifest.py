@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 import json
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from pathlib import Path
 from typing import Any
 
@@ -14,6 +14,9 @@ class TemplateManifest:
     required_vars: list[str]
     tags: list[str]
     content_policy: dict[str, Any] | None
+    # Variables the templates may reference but callers are allowed to omit
+    # (e.g. guarded with `is defined`).
+    optional_vars: list[str] = field(default_factory=list)
 
 
 class ManifestError(ValueError):
@@ -45,6 +48,7 @@ def load_manifest(path: Path) -> TemplateManifest:
     required_vars = list(data.get("required_vars", []))
     tags = list(data.get("tags", []))
     content_policy = data.get("content_policy")
+    optional_vars = data.get("optional_vars", [])
 
     if not isinstance(required_vars, list):
         raise ManifestError("required_vars must be a list")
@@ -52,6 +56,10 @@ def load_manifest(path: Path) -> TemplateManifest:
         raise ManifestError("required_vars must be a list of non-empty strings")
     if not isinstance(tags, list):
         raise ManifestError("tags must be a list")
+    if not isinstance(optional_vars, list) or not all(
+        isinstance(x, str) and x.strip() for x in optional_vars
+    ):
+        raise ManifestError("optional_vars must be a list of non-empty strings")
 
     return TemplateManifest(
         name=name,
@@ -60,4 +68,5 @@ def load_manifest(path: Path) -> TemplateManifest:
         required_vars=required_vars,
         tags=tags,
         content_policy=content_policy,
+        optional_vars=list(optional_vars),
     )
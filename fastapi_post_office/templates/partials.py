@@ -0,0 +1,152 @@
+from __future__ import annotations
+
+import hashlib
+import threading
+from collections.abc import Callable, Iterable, Mapping
+from dataclasses import dataclass
+from pathlib import Path
+
+from jinja2 import BaseLoader, Environment, TemplateNotFound, meta
+
+# Shared layouts and partials live next to the templates, in a directory that
+# load_templates() skips.
+PARTIALS_DIR = "_partials"
+
+
+@dataclass(frozen=True)
+class PartialSource:
+    name: str
+    source: str
+    source_hash: str
+
+
+class PartialError(ValueError):
+    pass
+
+
+def make_partial(name: str, source: str) -> PartialSource:
+    digest = hashlib.sha256()
+    digest.update(name.encode("utf-8"))
+    digest.update(source.encode("utf-8"))
+    return PartialSource(name=name, source=source, source_hash=digest.hexdigest())
+
+
+def load_partials(root: Path, max_bytes: int) -> list[PartialSource]:
+    """
+    Load every `*.j2` file below `<root>/_partials`.
+
+    Partials are named by their path relative to that directory, e.g.
+    `{% extends "layouts/base.j2" %}` or `{% include "footer.j2" %}`.
+    """
+    base = root / PARTIALS_DIR
+    if not base.is_dir():
+        return []
+    partials: list[PartialSource] = []
+    for path in sorted(base.rglob("*.j2")):
+        source = path.read_text(encoding="utf-8")
+        if len(source.encode("utf-8")) > max_bytes:
+            raise PartialError(f"Partial size exceeds limit ({max_bytes} bytes): {path}")
+        partials.append(make_partial(path.relative_to(base).as_posix(), source))
+    return partials
+
+
+_parse_env = Environment(autoescape=False)
+
+
+def _referenced(template_source: str) -> set[str]:
+    ast = _parse_env.parse(template_source)
+    # Dynamic names (`{% include var %}`) cannot be resolved statically.
+    return {name for name in meta.find_referenced_templates(ast) if name is not None}
+
+
+def find_dependencies(
+    template_sources: Iterable[str | None], partials: Mapping[str, PartialSource]
+) -> dict[str, str]:
+    """
+    Return the partials (transitively) referenced by the sources, as name -> hash.
+
+    Raises PartialError for a reference to an unknown partial and
+    `jinja2.TemplateSyntaxError` for invalid sources.
+    """
+    pending: set[str] = set()
+    for template_source in template_sources:
+        if template_source is not None:
+            pending |= _referenced(template_source)
+
+    dependencies: dict[str, str] = {}
+    while pending:
+        name = pending.pop()
+        if name in dependencies:
+            continue
+        partial = partials.get(name)
+        if partial is None:
+            raise PartialError(f"Unknown partial: {name}")
+        dependencies[name] = partial.source_hash
+        pending |= _referenced(partial.source) - dependencies.keys()
+    return dependencies
+
+
+class PartialRegistry(BaseLoader):
+    """
+    In-process Jinja loader for shared layouts and partials.
+
+    The services fill it from the `email_template_partials` table. Jinja caches the
+    compiled partials in each environment; `uptodate` compares hashes, so updating
+    a partial here recompiles it on next use, and with it every template that
+    extends or includes it.
+    """
+
+    def __init__(self) -> None:
+        self._partials: dict[str, PartialSource] = {}
+        self._lock = threading.Lock()
+
+    def update(self, partials: Iterable[PartialSource]) -> None:
+        with self._lock:
+            for partial in partials:
+                self._partials[partial.name] = partial
+
+    def clear(self) -> None:
+        with self._lock:
+            self._partials.clear()
+
+    def get(self, name: str) -> PartialSource | None:
+        return self._partials.get(name)
+
+    def resolve(self, dependencies: Mapping[str, str] | None) -> list[PartialSource]:
+        if not dependencies:
+            return []
+        return [p for name in dependencies if (p := self._partials.get(name)) is not None]
+
+    def stale(self, dependencies: Mapping[str, str] | None) -> list[str]:
+        """Names that are missing or whose hash differs from the given dependencies."""
+        if not dependencies:
+            return []
+        stale = []
+        for name, source_hash in dependencies.items():
+            partial = self._partials.get(name)
+            if partial is None or partial.source_hash != source_hash:
+                stale.append(name)
+        return sorted(stale)
+
+    def names(self) -> list[str]:
+        return sorted(self._partials)
+
+    def get_source(
+        self, environment: Environment, template: str
+    ) -> tuple[str, str | None, Callable[[], bool] | None]:
+        partial = self._partials.get(template)
+        if partial is None:
+            raise TemplateNotFound(template)
+        loaded_hash = partial.source_hash
+
+        def uptodate() -> bool:
+            current = self._partials.get(template)
+            return current is not None and current.source_hash == loaded_hash
+
+        return partial.source, None, uptodate
+
+    def list_templates(self) -> list[str]:
+        return self.names()
+
+
+partial_registry = PartialRegistry()
@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import base64
+import importlib.util
+import marshal
+from typing import Any
+
+import jinja2
+from jinja2 import Environment, Template
+
+# Bump when the payload layout changes; older payloads are then ignored.
+PRECOMPILED_FORMAT = 1
+
+_PYTHON_MAGIC = importlib.util.MAGIC_NUMBER.hex()
+_FILENAME = "<template>"
+
+
+def mode_key(trusted: bool) -> str:
+    # Jinja generates different code for sandboxed environments, so each mode
+    # needs its own compiled output. Strictness only affects runtime behaviour.
+    return "trusted" if trusted else "sandboxed"
+
+
+def precompile_parts(envs: dict[str, Environment], parts: dict[str, str | None]) -> dict[str, Any]:
+    """
+    Compile template parts ahead of time for every environment mode.
+
+    Each part keeps the Jinja-generated Python source (portable across Python
+    versions) and a marshalled code object (only valid for the same bytecode magic).
+    """
+    modes: dict[str, dict[str, Any]] = {}
+    for mode, env in envs.items():
+        compiled: dict[str, Any] = {}
+        for part, template_source in parts.items():
+            if template_source is None:
+                compiled[part] = None
+                continue
+            code = env.compile(template_source, raw=True)
+            bytecode = marshal.dumps(compile(code, _FILENAME, "exec"))
+            compiled[part] = {
+                "source": code,
+                "bytecode": base64.b64encode(bytecode).decode("ascii"),
+            }
+        modes[mode] = compiled
+    return {
+        "format": PRECOMPILED_FORMAT,
+        "jinja": jinja2.__version__,
+        "python_magic": _PYTHON_MAGIC,
+        "modes": modes,
+    }
+
+
+def load_precompiled_parts(
+    env: Environment, mode: str, payload: dict[str, Any] | None
+) -> dict[str, Template | None] | None:
+    """
+    Build templates from a precompiled payload without parsing the Jinja source.
+
+    Returns None when the payload is missing or was produced by an incompatible
+    Jinja version, format or mode; callers then compile from source.
+    """
+    if not payload or payload.get("format") != PRECOMPILED_FORMAT:
+        return None
+    if payload.get("jinja") != jinja2.__version__:
+        return None
+    parts = (payload.get("modes") or {}).get(mode)
+    if not parts:
+        return None
+
+    same_python = payload.get("python_magic") == _PYTHON_MAGIC
+    templates: dict[str, Template | None] = {}
+    for part, entry in parts.items():
+        if entry is None:
+            templates[part] = None
+            continue
+        if same_python:
+            code = marshal.loads(base64.b64decode(entry["bytecode"]))
+        else:
+            code = compile(entry["source"], _FILENAME, "exec")
+        templates[part] = env.template_class.from_code(env, code, env.make_globals(None), None)
+    return templates
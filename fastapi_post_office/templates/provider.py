@@ -0,0 +1,25 @@
+from __future__ import annotations
+
+from collections.abc import Iterable
+from typing import Protocol
+
+from .bundle import get_template_bundle
+from .loader import TemplateSource
+from .partials import PartialSource
+from .watcher import get_template_watcher
+
+
+class TemplateProvider(Protocol):
+    """Local source of templates consulted by the services before the database."""
+
+    def get(self, name: str) -> TemplateSource | None: ...
+
+    def get_partials(self, names: Iterable[str] | None = None) -> list[PartialSource]: ...
+
+
+def get_template_provider() -> TemplateProvider | None:
+    """The watcher (FAPO_TEMPLATE_WATCH_PATH) if configured, else the bundle, else None."""
+    watcher = get_template_watcher()
+    if watcher is not None:
+        return watcher
+    return get_template_bundle()
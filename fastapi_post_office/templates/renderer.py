@@ -1,13 +1,22 @@
 from __future__ import annotations
 
+from collections.abc import Callable, Iterable, Iterator
 from dataclasses import dataclass
-from typing import Any
+from time import perf_counter
+from typing import Any, TypeVar
 
-from jinja2 import StrictUndefined
-from jinja2.exceptions import TemplateError
-from jinja2.sandbox import SandboxedEnvironment
+from jinja2 import Environment, StrictUndefined, Template, Undefined
+from jinja2.exceptions import SecurityError, TemplateError
+from jinja2.sandbox import SandboxedEnvironment, SandboxedFormatter, is_internal_attribute
 
+from fastapi_post_office.config import settings
+
+from .analysis import find_unsafe_access, is_unsafe_attribute
+from .cache import TemplateCache
+from .instrumentation import RenderEvent, render_hooks
 from .loader import TemplateSource
+from .partials import PartialSource, partial_registry
+from .precompiled import load_precompiled_parts, mode_key, precompile_parts
 
 
 class RenderError(ValueError):
@@ -21,42 +30,442 @@ class RenderedTemplate:
     text: str | None
 
 
+@dataclass(frozen=True)
+class CompiledTemplate:
+    subject: Template
+    html: Template | None
+    text: Template | None
+
+
+template_cache = TemplateCache(maxsize=settings.template_cache_size)
+
+
+class TrustedEnvironment(Environment):
+    """
+    Unsandboxed environment for templates that passed `vet_template`.
+
+    Calls are not intercepted, which is where the sandbox spends its time, but
+    attribute lookups still refuse what the sandbox refuses: vetting can only see
+    names written in the source, not keys computed at render time. `str.format`
+    and `str.format_map` resolve fields through the same checks.
+    """
+
+    def _attribute(self, obj: Any, attribute: str) -> Any:
+        # Raises AttributeError when there is no such attribute, like getattr().
+        value = getattr(obj, attribute)
+        if is_unsafe_attribute(attribute) or is_internal_attribute(obj, attribute):
+            raise SecurityError(
+                f"access to attribute {attribute!r} of {type(obj).__name__!r} object is unsafe"
+            )
+        if isinstance(obj, str) and attribute in ("format", "format_map"):
+            return self._safe_format(obj, attribute)
+        return value
+
+    def getattr(self, obj: Any, attribute: str) -> Any:
+        try:
+            return self._attribute(obj, attribute)
+        except AttributeError:
+            pass
+        try:
+            return obj[attribute]
+        except (TypeError, LookupError, AttributeError):
+            return self.undefined(obj=obj, name=attribute)
+
+    def getitem(self, obj: Any, argument: str | Any) -> Any:
+        try:
+            return obj[argument]
+        except (AttributeError, TypeError, LookupError):
+            if isinstance(argument, str):
+                try:
+                    return self._attribute(obj, argument)
+                except AttributeError:
+                    pass
+            return self.undefined(obj=obj, name=argument)
+
+    def _safe_format(self, value: str, method: str) -> Callable[..., str]:
+        formatter = SandboxedFormatter(self)
+        if method == "format_map":
+            return lambda mapping: formatter.vformat(value, (), mapping)
+        return lambda *args, **kwargs: formatter.vformat(value, args, kwargs)
+
+
+_environments: dict[tuple[bool, bool], Environment] = {}
+
+
+def get_environment(strict: bool, trusted: bool = False) -> Environment:
+    """
+    Return the shared Jinja environment for a strictness/trust mode.
+
+    Environments are built once per process so Jinja's internal caches survive
+    across renders. Trusted mode skips the sandbox and must only be used for
+    templates that passed `vet_template` (`fapo sync-templates` and
+    `fapo build-templates` run it).
+    """
+    key = (strict, trusted)
+    env = _environments.get(key)
+    if env is None:
+        env_cls = TrustedEnvironment if trusted else SandboxedEnvironment
+        env = env_cls(
+            undefined=StrictUndefined if strict else Undefined,
+            autoescape=False,
+            loader=partial_registry,
+        )
+        env = _environments.setdefault(key, env)
+    return env
+
+
 def _check_header_injection(value: str, field: str) -> None:
     if "\n" in value or "\r" in value:
         raise RenderError(f"Header injection detected in {field}")
 
 
-def render_template(
-    source: TemplateSource,
-    context: dict[str, Any],
-    strict: bool,
-    max_bytes: int,
-) -> RenderedTemplate:
-    missing = [key for key in source.manifest.required_vars if key not in context]
+def _template_parts(source: TemplateSource) -> dict[str, str | None]:
+    return {
+        "subject": source.subject_template,
+        "html": source.html_template,
+        "text": source.text_template,
+    }
+
+
+def precompile_template(source: TemplateSource) -> dict[str, Any]:
+    """Produce the precompiled payload stored next to a template revision."""
+    envs = {mode_key(trusted): get_environment(True, trusted) for trusted in (False, True)}
+    try:
+        return precompile_parts(envs, _template_parts(source))
+    except TemplateError as exc:
+        raise RenderError(f"Template compilation failed: {exc}") from exc
+
+
+def _load_precompiled(
+    source: TemplateSource, env: Environment, trusted: bool
+) -> CompiledTemplate | None:
+    parts = load_precompiled_parts(env, mode_key(trusted), source.compiled)
+    subject = parts.get("subject") if parts is not None else None
+    if parts is None or subject is None:
+        return None
+    return CompiledTemplate(subject=subject, html=parts.get("html"), text=parts.get("text"))
+
+
+def _compile(source: TemplateSource, strict: bool, trusted: bool) -> CompiledTemplate:
+    env = get_environment(strict, trusted)
+    if settings.load_precompiled_templates and source.compiled is not None:
+        precompiled = _load_precompiled(source, env, trusted)
+        if precompiled is not None:
+            return precompiled
+    try:
+        return CompiledTemplate(
+            subject=env.from_string(source.subject_template),
+            html=(
+                env.from_string(source.html_template) if source.html_template is not None else None
+            ),
+            text=(
+                env.from_string(source.text_template) if source.text_template is not None else None
+            ),
+        )
+    except TemplateError as exc:
+        raise RenderError(f"Template compilation failed: {exc}") from exc
+
+
+def _lookup(source: TemplateSource, strict: bool, trusted: bool) -> tuple[CompiledTemplate, bool]:
+    key = (source.manifest.name, source.manifest.revision, source.source_hash, strict, trusted)
+    return template_cache.lookup(key, lambda: _compile(source, strict, trusted))
+
+
+def compile_template(
+    source: TemplateSource, strict: bool, trusted: bool = False
+) -> CompiledTemplate:
+    return _lookup(source, strict, trusted)[0]
+
+
+def vet_template(source: TemplateSource) -> None:
+    """
+    Check that a template may be rendered outside the sandbox.
+
+    The template must compile under the sandbox and may not reach attributes the
+    sandbox would refuse (see `analysis.find_unsafe_access`). Raises `RenderError`.
+    """
+    compile_template(source, strict=True)
+    _reject_unsafe(*_template_parts(source).values())
+
+
+def vet_partial(partial: PartialSource) -> None:
+    """Apply the `vet_template` check to a layout/partial."""
+    try:
+        _reject_unsafe(partial.source)
+    except TemplateError as exc:
+        raise RenderError(f"Template compilation failed: {exc}") from exc
+
+
+def _reject_unsafe(*template_sources: str | None) -> None:
+    problems = find_unsafe_access(*template_sources)
+    if problems:
+        raise RenderError(f"Unsafe attribute access: {', '.join(problems)}")
+
+
+def invalidate_compiled(source_hash: str) -> int:
+    """Drop every cached compilation of the template revision with this source hash."""
+    return template_cache.invalidate(lambda key: isinstance(key, tuple) and key[2] == source_hash)
+
+
+def _expected_vars(source: TemplateSource, strict: bool) -> frozenset[str]:
+    names = set(source.manifest.required_vars)
+    # Discovered variables are only mandatory under StrictUndefined; lenient
+    # rendering treats missing ones as empty.
+    if strict and source.template_vars is not None:
+        names.update(source.template_vars)
+    return frozenset(names)
+
+
+def _check_vars(expected: frozenset[str], context: dict[str, Any]) -> None:
+    missing = expected.difference(context)
     if missing:
         raise RenderError(f"Missing required vars: {sorted(missing)}")
 
-    env = SandboxedEnvironment(undefined=StrictUndefined if strict else None, autoescape=False)
 
+def validate_context(source: TemplateSource, context: dict[str, Any], strict: bool) -> None:
+    """Reject a context that lacks a variable the template needs, without rendering."""
+    _check_vars(_expected_vars(source, strict), context)
+
+
+class _ByteBudget:
+    """Running UTF-8 byte count shared by all parts of one render."""
+
+    __slots__ = ("max_bytes", "remaining")
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self.remaining = max_bytes
+
+    def render(self, template: Template, context: dict[str, Any], part: str) -> str:
+        # Consume the output chunk by chunk so a runaway template is rejected as
+        # soon as it crosses the limit instead of after it has been fully built.
+        # The size check is inlined because it runs once per output chunk.
+        remaining = self.remaining
+        chunks: list[str] = []
+        append = chunks.append
+        for chunk in template.generate(**context):
+            remaining -= len(chunk) if chunk.isascii() else len(chunk.encode("utf-8"))
+            if remaining < 0:
+                raise RenderError(f"Rendered template exceeds size limit ({self.max_bytes} bytes)")
+            append(chunk)
+        self.remaining = remaining
+        return "".join(chunks)
+
+
+class _ObservedBudget(_ByteBudget):
+    """Byte budget that also records per-part timings and sizes for render hooks."""
+
+    __slots__ = ("durations", "output_bytes")
+
+    def __init__(self, max_bytes: int) -> None:
+        super().__init__(max_bytes)
+        self.durations: dict[str, float] = {}
+        self.output_bytes: dict[str, int] = {}
+
+    def render(self, template: Template, context: dict[str, Any], part: str) -> str:
+        before = self.remaining
+        start = perf_counter()
+        try:
+            return super().render(template, context, part)
+        finally:
+            self.durations[part] = perf_counter() - start
+            self.output_bytes[part] = before - self.remaining
+
+
+def _render_compiled(
+    compiled: CompiledTemplate, context: dict[str, Any], budget: _ByteBudget
+) -> RenderedTemplate:
     try:
-        subject = env.from_string(source.subject_template).render(**context)
+        subject = budget.render(compiled.subject, context, "subject")
+        _check_header_injection(subject, "subject")
         html = None
-        if source.html_template is not None:
-            html = env.from_string(source.html_template).render(**context)
+        if compiled.html is not None:
+            html = budget.render(compiled.html, context, "html")
         text = None
-        if source.text_template is not None:
-            text = env.from_string(source.text_template).render(**context)
+        if compiled.text is not None:
+            text = budget.render(compiled.text, context, "text")
     except TemplateError as exc:
         raise RenderError(f"Template rendering failed: {exc}") from exc
 
+    return RenderedTemplate(subject=subject, html=html, text=text)
+
+
+def _render_subject(
+    compiled: CompiledTemplate, context: dict[str, Any], budget: _ByteBudget
+) -> str:
+    try:
+        subject = budget.render(compiled.subject, context, "subject")
+    except TemplateError as exc:
+        raise RenderError(f"Template rendering failed: {exc}") from exc
     _check_header_injection(subject, "subject")
+    return subject
 
-    size = len(subject.encode("utf-8"))
-    if html:
-        size += len(html.encode("utf-8"))
-    if text:
-        size += len(text.encode("utf-8"))
-    if size > max_bytes:
-        raise RenderError(f"Rendered template exceeds size limit ({max_bytes} bytes)")
 
-    return RenderedTemplate(subject=subject, html=html, text=text)
+_T = TypeVar("_T")
+
+
+def _event(
+    source: TemplateSource,
+    cache_hit: bool,
+    compile_seconds: float,
+    budget: _ObservedBudget,
+    error: BaseException | None,
+) -> RenderEvent:
+    return RenderEvent(
+        template_name=source.manifest.name,
+        revision=source.manifest.revision,
+        cache_hit=cache_hit,
+        compile_seconds=compile_seconds,
+        durations=budget.durations,
+        output_bytes=budget.output_bytes,
+        error=None if error is None else str(error),
+    )
+
+
+def _observed(
+    source: TemplateSource,
+    strict: bool,
+    trusted: bool,
+    max_bytes: int,
+    render: Callable[[CompiledTemplate, _ByteBudget], _T],
+) -> _T:
+    budget = _ObservedBudget(max_bytes)
+    cache_hit = False
+    start = perf_counter()
+    compile_seconds = 0.0
+    error: BaseException | None = None
+    try:
+        try:
+            compiled, cache_hit = _lookup(source, strict, trusted)
+        finally:
+            compile_seconds = perf_counter() - start
+        return render(compiled, budget)
+    except Exception as exc:
+        error = exc
+        raise
+    finally:
+        render_hooks.emit(_event(source, cache_hit, compile_seconds, budget, error))
+
+
+def render_template(
+    source: TemplateSource,
+    context: dict[str, Any],
+    strict: bool,
+    max_bytes: int,
+    trusted: bool = False,
+) -> RenderedTemplate:
+    validate_context(source, context, strict)
+    if render_hooks:
+        return _observed(
+            source,
+            strict,
+            trusted,
+            max_bytes,
+            lambda compiled, budget: _render_compiled(compiled, context, budget),
+        )
+    compiled = compile_template(source, strict, trusted)
+    return _render_compiled(compiled, context, _ByteBudget(max_bytes))
+
+
+def render_subject(
+    source: TemplateSource,
+    context: dict[str, Any],
+    strict: bool,
+    max_bytes: int,
+    trusted: bool = False,
+) -> str:
+    """Render only the subject, e.g. when the bodies are rendered later by a worker."""
+    validate_context(source, context, strict)
+    if render_hooks:
+        return _observed(
+            source,
+            strict,
+            trusted,
+            max_bytes,
+            lambda compiled, budget: _render_subject(compiled, context, budget),
+        )
+    compiled = compile_template(source, strict, trusted)
+    return _render_subject(compiled, context, _ByteBudget(max_bytes))
+
+
+@dataclass(frozen=True)
+class BatchRenderResult:
+    index: int
+    rendered: RenderedTemplate | None = None
+    error: RenderError | None = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def render_many(
+    source: TemplateSource,
+    contexts: Iterable[dict[str, Any]],
+    strict: bool,
+    max_bytes: int,
+    trusted: bool = False,
+) -> Iterator[BatchRenderResult]:
+    """
+    Render one template against many contexts.
+
+    The template is compiled up front (compile errors raise immediately); results
+    are yielded lazily in input order and a failing context only fails its own item.
+    """
+    start = perf_counter()
+    compiled, cache_hit = _lookup(source, strict, trusted)
+    compile_seconds = perf_counter() - start
+    expected_vars = _expected_vars(source, strict)
+    if render_hooks:
+        return _render_many_observed(
+            source, compiled, cache_hit, compile_seconds, expected_vars, contexts, max_bytes
+        )
+    return _render_many(compiled, expected_vars, contexts, max_bytes)
+
+
+def _render_one_of_many(
+    compiled: CompiledTemplate,
+    expected_vars: frozenset[str],
+    index: int,
+    context: dict[str, Any],
+    budget: _ByteBudget,
+) -> BatchRenderResult:
+    try:
+        _check_vars(expected_vars, context)
+        rendered = _render_compiled(compiled, context, budget)
+    except RenderError as exc:
+        return BatchRenderResult(index=index, error=exc)
+    except Exception as exc:
+        error = RenderError(f"Template rendering failed: {exc}")
+        error.__cause__ = exc
+        return BatchRenderResult(index=index, error=error)
+    return BatchRenderResult(index=index, rendered=rendered)
+
+
+def _render_many(
+    compiled: CompiledTemplate,
+    expected_vars: frozenset[str],
+    contexts: Iterable[dict[str, Any]],
+    max_bytes: int,
+) -> Iterator[BatchRenderResult]:
+    for index, context in enumerate(contexts):
+        yield _render_one_of_many(compiled, expected_vars, index, context, _ByteBudget(max_bytes))
+
+
+def _render_many_observed(
+    source: TemplateSource,
+    compiled: CompiledTemplate,
+    cache_hit: bool,
+    compile_seconds: float,
+    expected_vars: frozenset[str],
+    contexts: Iterable[dict[str, Any]],
+    max_bytes: int,
+) -> Iterator[BatchRenderResult]:
+    # The batch compiles once: only the first item reports the real cache lookup,
+    # the others reuse the compiled template.
+    for index, context in enumerate(contexts):
+        budget = _ObservedBudget(max_bytes)
+        result = _render_one_of_many(compiled, expected_vars, index, context, budget)
+        render_hooks.emit(_event(source, cache_hit, compile_seconds, budget, result.error))
+        cache_hit, compile_seconds = True, 0.0
+        yield result
@@ -0,0 +1,216 @@
+from __future__ import annotations
+
+import logging
+import threading
+from collections.abc import Iterable
+from pathlib import Path
+
+from fastapi_post_office.config import settings
+
+from .loader import (
+    TEMPLATE_FILES,
+    TemplateLoadError,
+    TemplateSource,
+    load_template_dir,
+    template_dirs,
+)
+from .partials import PARTIALS_DIR, PartialError, PartialSource, load_partials, partial_registry
+from .renderer import RenderError, invalidate_compiled, vet_partial, vet_template
+
+logger = logging.getLogger(__name__)
+
+_Signature = tuple[tuple[str, int, int], ...]
+
+
+def _signature(paths: Iterable[Path], base: Path) -> _Signature:
+    entries = []
+    for path in paths:
+        try:
+            st = path.stat()
+        except FileNotFoundError:
+            continue
+        entries.append((path.relative_to(base).as_posix(), st.st_size, st.st_mtime_ns))
+    return tuple(sorted(entries))
+
+
+class TemplateWatcher:
+    """
+    Serve templates straight from a templates root and reload them when files change.
+
+    Meant for development and staging. Each scan compares file sizes and mtimes,
+    reloads only the directories that changed (plus templates whose partials
+    changed) and drops the compiled-cache entries of the replaced revisions.
+    `start()` scans in a background thread, woken by `watchfiles` (inotify and
+    friends) when installed and by polling every `interval` seconds otherwise.
+
+    A directory that fails to load keeps serving its last good version; the error
+    is logged and kept in `errors` until the files change again.
+    """
+
+    def __init__(self, root: Path, max_bytes: int | None = None, interval: float = 0.5) -> None:
+        self.root = root
+        self.max_bytes = max_bytes or settings.max_template_bytes
+        self.interval = interval
+        self.errors: dict[Path, str] = {}
+        self._sources: dict[str, TemplateSource] = {}
+        self._names_by_dir: dict[Path, str] = {}
+        self._signatures: dict[Path, _Signature] = {}
+        self._partials: dict[str, PartialSource] = {}
+        self._partials_signature: _Signature | None = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self.scan()
+
+    def get(self, name: str) -> TemplateSource | None:
+        return self._sources.get(name)
+
+    def get_partials(self, names: Iterable[str] | None = None) -> list[PartialSource]:
+        partials = self._partials
+        if names is None:
+            return list(partials.values())
+        return [partial for name in names if (partial := partials.get(name)) is not None]
+
+    def names(self) -> list[str]:
+        return sorted(self._sources)
+
+    def scan(self) -> list[str]:
+        """Reload whatever changed since the last scan; returns the reloaded template names."""
+        with self._lock:
+            changed_partials = self._scan_partials()
+            dirs = template_dirs(self.root)
+            for path in self._signatures.keys() - set(dirs):
+                self._drop(path)
+
+            reloaded = []
+            for path in dirs:
+                signature = _signature((path / name for name in TEMPLATE_FILES), path)
+                if signature == self._signatures.get(path) and not self._affected(
+                    path, changed_partials
+                ):
+                    continue
+                self._signatures[path] = signature
+                try:
+                    source = load_template_dir(
+                        path, max_bytes=self.max_bytes, partials=self._partials
+                    )
+                    # Watched templates get the same vetting as synced ones.
+                    vet_template(source)
+                except (TemplateLoadError, RenderError) as exc:
+                    self.errors[path] = str(exc)
+                    logger.warning("Template reload failed: %s", exc)
+                    continue
+                self.errors.pop(path, None)
+                self._replace(path, source)
+                reloaded.append(source.manifest.name)
+            return reloaded
+
+    def _affected(self, path: Path, changed_partials: set[str]) -> bool:
+        if not changed_partials:
+            return False
+        if path in self.errors:
+            return True
+        source = self._sources.get(self._names_by_dir.get(path, ""))
+        return bool(
+            source and source.dependencies and changed_partials & source.dependencies.keys()
+        )
+
+    def _scan_partials(self) -> set[str]:
+        base = self.root / PARTIALS_DIR
+        signature = _signature(sorted(base.rglob("*.j2")), base) if base.is_dir() else ()
+        if signature == self._partials_signature:
+            return set()
+        self._partials_signature = signature
+        try:
+            partials = {p.name: p for p in load_partials(self.root, max_bytes=self.max_bytes)}
+            for partial in partials.values():
+                try:
+                    vet_partial(partial)
+                except RenderError as exc:
+                    raise PartialError(f"Partial {partial.name} is invalid: {exc}") from exc
+        except PartialError as exc:
+            self.errors[base] = str(exc)
+            logger.warning("Partial reload failed: %s", exc)
+            return set()
+        self.errors.pop(base, None)
+
+        old = self._partials
+        changed = {
+            name
+            for name in old.keys() | partials.keys()
+            if name not in old
+            or name not in partials
+            or old[name].source_hash != partials[name].source_hash
+        }
+        self._partials = partials
+        # Jinja notices the new hashes through the loader's uptodate check.
+        partial_registry.update(partials.values())
+        return changed
+
+    def _replace(self, path: Path, source: TemplateSource) -> None:
+        previous = self._sources.pop(self._names_by_dir.get(path, ""), None)
+        if previous is not None and previous.source_hash != source.source_hash:
+            invalidate_compiled(previous.source_hash)
+        self._sources[source.manifest.name] = source
+        self._names_by_dir[path] = source.manifest.name
+
+    def _drop(self, path: Path) -> None:
+        self._signatures.pop(path, None)
+        self.errors.pop(path, None)
+        previous = self._sources.pop(self._names_by_dir.pop(path, ""), None)
+        if previous is not None:
+            invalidate_compiled(previous.source_hash)
+
+    def _scan_safely(self) -> None:
+        try:
+            self.scan()
+        except Exception:
+            logger.exception("Template watcher scan failed")
+
+    def _run(self) -> None:
+        try:
+            from watchfiles import watch
+        except ImportError:
+            while not self._stop.wait(self.interval):
+                self._scan_safely()
+            return
+        debounce = int(self.interval * 1000)
+        for _changes in watch(self.root, stop_event=self._stop, debounce=debounce, step=50):
+            self._scan_safely()
+
+    def start(self) -> TemplateWatcher:
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._run, name="fapo-template-watcher", daemon=True
+            )
+            self._thread.start()
+        return self
+
+    def stop(self, timeout: float | None = None) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def __enter__(self) -> TemplateWatcher:
+        return self.start()
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.stop()
+
+
+_shared_watcher: TemplateWatcher | None = None
+
+
+def get_template_watcher() -> TemplateWatcher | None:
+    """Return the running watcher for FAPO_TEMPLATE_WATCH_PATH, started on first use."""
+    global _shared_watcher
+    if not settings.template_watch_path:
+        return None
+    root = Path(settings.template_watch_path)
+    if _shared_watcher is None or _shared_watcher.root != root:
+        if _shared_watcher is not None:
+            _shared_watcher.stop()
+        _shared_watcher = TemplateWatcher(root, interval=settings.template_watch_interval).start()
+    return _shared_watcher
@@ -1,8 +1,10 @@
 from __future__ import annotations
 
+from collections.abc import Iterator
 from pathlib import Path
 
 import pytest
+from sqlalchemy import event
 
 from fastapi_post_office.config import settings
 from fastapi_post_office.db import (
@@ -38,6 +40,19 @@ def repo(db_session):
     return EmailRepository(db_session)
 
 
+@pytest.fixture()
+def sql_statements(repo) -> Iterator[list[str]]:
+    statements: list[str] = []
+    engine = repo.session.get_bind()
+
+    def record(conn, cursor, statement, *args) -> None:
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    yield statements
+    event.remove(engine, "before_cursor_execute", record)
+
+
 @pytest.fixture()
 def template_dir(tmp_path: Path) -> Path:
     root = tmp_path / "templates"
@@ -0,0 +1,191 @@
+from __future__ import annotations
+
+import asyncio
+
+from sqlalchemy import func, select
+
+from fastapi_post_office.backends.base import SendResult
+from fastapi_post_office.config import settings
+from fastapi_post_office.db import (
+    AsyncEmailRepository,
+    Base,
+    EmailBody,
+    EmailStatus,
+    EmailTemplate,
+    SuppressionReason,
+    create_async_engine_from_url,
+    create_async_session_factory,
+)
+from fastapi_post_office.service import (
+    AsyncEmailService,
+    EmailRequest,
+    EnqueueOutcome,
+    TemplateEmailRequest,
+)
+
+
+async def _with_repo(tmp_path, body):
+    engine = create_async_engine_from_url(f"sqlite+aiosqlite:///{tmp_path / 'async.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    try:
+        async with create_async_session_factory(engine)() as session:
+            return await body(AsyncEmailRepository(session))
+    finally:
+        await engine.dispose()
+
+
+def test_async_enqueue_many(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "block_suppressed", True)
+
+    async def body(repo):
+        await repo.add_suppression("blocked@example.com", SuppressionReason.BOUNCE)
+        await repo.commit()
+        service = AsyncEmailService(repo)
+        return await service.enqueue_many(
+            [
+                EmailRequest(to=["a@example.com"], subject="Hi", text="x", idempotency_key="k1"),
+                EmailRequest(to=["a@example.com"], subject="Hi", text="x", idempotency_key="k1"),
+                EmailRequest(
+                    to=["blocked@example.com"], subject="Hi", text="x", idempotency_key="k2"
+                ),
+            ]
+        )
+
+    results = asyncio.run(_with_repo(tmp_path, body))
+    assert [r.outcome for r in results] == [
+        EnqueueOutcome.CREATED,
+        EnqueueOutcome.DUPLICATE,
+        EnqueueOutcome.REJECTED,
+    ]
+
+
+def test_async_enqueue_template_many(tmp_path, monkeypatch):
+    # Rendered and built one chunk at a time.
+    monkeypatch.setattr(settings, "render_chunk_size", 2)
+
+    async def body(repo):
+        await repo.upsert_template(
+            EmailTemplate(
+                name="welcome_user",
+                revision=1,
+                subject_template="Hi {{ first_name }}",
+                html_template=None,
+                text_template="Hello {{ first_name }}",
+                required_vars_json=["first_name"],
+                content_policy_json=None,
+                tags_json=[],
+                source_hash="async-batch-hash",
+                is_active=True,
+            )
+        )
+        await repo.commit()
+        service = AsyncEmailService(repo)
+        return await service.enqueue_template_many(
+            "welcome_user",
+            [
+                TemplateEmailRequest(
+                    to=["a@example.com"], context={"first_name": "Ana"}, idempotency_key="k1"
+                ),
+                TemplateEmailRequest(to=["b@example.com"], context={}, idempotency_key="k2"),
+                TemplateEmailRequest(
+                    to=["c@example.com"], context={"first_name": "Bo"}, idempotency_key="k3"
+                ),
+            ],
+        )
+
+    results = asyncio.run(_with_repo(tmp_path, body))
+    assert [r.outcome for r in results] == [
+        EnqueueOutcome.CREATED,
+        EnqueueOutcome.REJECTED,
+        EnqueueOutcome.CREATED,
+    ]
+    assert results[0].message.subject == "Hi Ana"
+    assert results[2].message.subject == "Hi Bo"
+
+
+def test_async_enqueue_joins_callers_transaction(tmp_path):
+    dispatched: list = []
+
+    async def body(repo):
+        service = AsyncEmailService(repo, dispatcher=dispatched.extend, autocommit=False)
+        rolled_back = await service.enqueue(
+            to=["a@example.com"], subject="Hi", html=None, text="x", idempotency_key="k1"
+        )
+        rolled_back_id = rolled_back.id
+        await repo.rollback()
+        results = await service.enqueue_many(
+            [EmailRequest(to=["b@example.com"], subject="Hi", text="x", idempotency_key="k2")]
+        )
+        assert dispatched == []
+        await repo.commit()
+        await asyncio.sleep(0.05)  # the dispatcher runs in the default executor
+        assert await repo.get_message(rolled_back_id) is None
+        return results[0].message.id
+
+    committed_id = asyncio.run(_with_repo(tmp_path, body))
+
+    assert dispatched == [committed_id]
+
+
+def test_async_shared_bodies(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "dedupe_bodies", True)
+    monkeypatch.setattr(settings, "dedupe_body_min_length", 10)
+    monkeypatch.setattr(settings, "body_cache_size", 0)
+
+    async def body(repo):
+        results = await AsyncEmailService(repo).enqueue_many(
+            [
+                EmailRequest(
+                    to=[f"user{i}@example.com"],
+                    subject="News",
+                    html="<p>Announcement</p>",
+                    idempotency_key=f"news:{i}",
+                )
+                for i in range(2)
+            ]
+        )
+        message_id = results[0].message.id
+        repo.session.expunge_all()
+        message = await repo.get_message(message_id)
+        bodies = await repo.session.scalar(select(func.count()).select_from(EmailBody))
+        return message.html_body, message.html_body_hash, bodies
+
+    html, digest, bodies = asyncio.run(_with_repo(tmp_path, body))
+
+    assert html == "<p>Announcement</p>"
+    assert digest is not None
+    assert bodies == 1
+
+
+def test_async_send_after_due_scan(tmp_path):
+    # The due scan defers the bodies; sending from the same session must still
+    # load them instead of lazy-loading inside the backend call.
+    sent = []
+
+    class Backend:
+        name = "capture"
+
+        def send(self, message):
+            sent.append((message.text_body, message.html_body))
+            return SendResult(ok=True, provider_message_id="p-1")
+
+    async def body(repo):
+        service = AsyncEmailService(repo)
+        service.backend = Backend()
+        await service.enqueue(
+            to=["a@example.com"],
+            subject="Hi",
+            text="plain",
+            html="<p>rich</p>",
+            idempotency_key="due:1",
+        )
+        repo.session.expunge_all()
+        due = await repo.list_due_messages()
+        result = await service.send_now(due[0].id)
+        return result.status
+
+    status = asyncio.run(_with_repo(tmp_path, body))
+
+    assert status == EmailStatus.SENT
+    assert sent == [("plain", "<p>rich</p>")]
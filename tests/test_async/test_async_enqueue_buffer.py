@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+import asyncio
+from typing import ClassVar
+
+import pytest
+from sqlalchemy import func, select
+
+from fastapi_post_office.db import (
+    AsyncEmailRepository,
+    Base,
+    EmailMessage,
+    EmailTemplate,
+    create_async_engine_from_url,
+    create_async_session_factory,
+)
+from fastapi_post_office.service import AsyncEmailService, AsyncEnqueueBuffer
+
+
+async def _with_factory(tmp_path, body):
+    engine = create_async_engine_from_url(f"sqlite+aiosqlite:///{tmp_path / 'async.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    try:
+        return await body(create_async_session_factory(engine))
+    finally:
+        await engine.dispose()
+
+
+class CountingService(AsyncEmailService):
+    batches: ClassVar[list[int]] = []
+
+    async def enqueue_mixed(self, requests):
+        self.batches.append(len(requests))
+        return await super().enqueue_mixed(requests)
+
+
+def _counting(session):
+    return CountingService(AsyncEmailRepository(session))
+
+
+def test_buffer_commits_concurrent_enqueues_together(tmp_path):
+    CountingService.batches = []
+
+    async def body(factory):
+        buffer = AsyncEnqueueBuffer(factory, max_latency=0.05, service_factory=_counting)
+        messages = await asyncio.gather(
+            *(
+                buffer.enqueue(
+                    to=[f"user{i}@example.com"],
+                    subject="Hi",
+                    html=None,
+                    text="Hello",
+                    idempotency_key=f"k{i}",
+                )
+                for i in range(20)
+            )
+        )
+        await buffer.close()
+        async with factory() as session:
+            count = await session.scalar(select(func.count()).select_from(EmailMessage))
+        return messages, count
+
+    messages, count = asyncio.run(_with_factory(tmp_path, body))
+
+    assert CountingService.batches == [20]
+    assert count == 20
+    assert [m.to_json for m in messages] == [[f"user{i}@example.com"] for i in range(20)]
+    assert len({m.id for m in messages}) == 20
+
+
+def test_buffer_flushes_when_batch_is_full(tmp_path):
+    CountingService.batches = []
+
+    async def body(factory):
+        buffer = AsyncEnqueueBuffer(
+            factory, max_latency=60, max_batch_size=2, service_factory=_counting
+        )
+        await asyncio.wait_for(
+            asyncio.gather(
+                buffer.enqueue(["a@example.com"], "Hi", None, "x", idempotency_key="k1"),
+                buffer.enqueue(["b@example.com"], "Hi", None, "x", idempotency_key="k2"),
+            ),
+            timeout=5,
+        )
+        await buffer.close()
+
+    asyncio.run(_with_factory(tmp_path, body))
+
+    assert CountingService.batches == [2]
+
+
+def test_buffer_reports_errors_per_item(tmp_path):
+    async def body(factory):
+        async with factory() as session:
+            repo = AsyncEmailRepository(session)
+            await repo.upsert_template(
+                EmailTemplate(
+                    name="welcome_user",
+                    revision=1,
+                    subject_template="Hi {{ first_name }}",
+                    html_template=None,
+                    text_template="Hello {{ first_name }}",
+                    required_vars_json=["first_name"],
+                    content_policy_json=None,
+                    tags_json=[],
+                    source_hash="enqueue-buffer-hash",
+                    is_active=True,
+                )
+            )
+            await repo.commit()
+
+        buffer = AsyncEnqueueBuffer(factory, max_latency=0.05)
+        results = await asyncio.gather(
+            buffer.enqueue_template(
+                "welcome_user", ["a@example.com"], {"first_name": "Ana"}, idempotency_key="t1"
+            ),
+            buffer.enqueue_template("welcome_user", ["b@example.com"], {}, idempotency_key="t2"),
+            buffer.enqueue_template("missing", ["c@example.com"], {}, idempotency_key="t3"),
+            buffer.enqueue([], "Hi", None, "x", idempotency_key="r1"),
+            buffer.enqueue(["d@example.com"], "Hi", None, "x", idempotency_key="t1"),
+            return_exceptions=True,
+        )
+        await buffer.close()
+        return results
+
+    created, missing_var, missing_template, no_recipient, duplicate = asyncio.run(
+        _with_factory(tmp_path, body)
+    )
+
+    assert created.subject == "Hi Ana"
+    assert isinstance(missing_var, ValueError)
+    assert "Template not found" in str(missing_template)
+    assert isinstance(no_recipient, ValueError)
+    assert duplicate.id == created.id
+
+
+def test_buffer_failure_fails_every_caller_of_the_batch(tmp_path):
+    class BrokenService(AsyncEmailService):
+        async def enqueue_mixed(self, requests):
+            raise ConnectionError("database down")
+
+    async def body(factory):
+        buffer = AsyncEnqueueBuffer(
+            factory,
+            max_latency=0.01,
+            service_factory=lambda session: BrokenService(AsyncEmailRepository(session)),
+        )
+        results = await asyncio.gather(
+            buffer.enqueue(["a@example.com"], "Hi", None, "x", idempotency_key="k1"),
+            buffer.enqueue(["b@example.com"], "Hi", None, "x", idempotency_key="k2"),
+            return_exceptions=True,
+        )
+        await buffer.close()
+        with pytest.raises(RuntimeError):
+            await buffer.enqueue(["c@example.com"], "Hi", None, "x", idempotency_key="k3")
+        return results
+
+    results = asyncio.run(_with_factory(tmp_path, body))
+
+    assert all(isinstance(r, ConnectionError) for r in results)
@@ -29,12 +29,24 @@ class FakeAsyncRepo:
         self.messages[message.id] = message
         return message
 
+    async def insert_message_if_absent(self, message: EmailMessage):
+        if message.idempotency_key in self.messages:
+            return None
+        self.messages[message.idempotency_key] = message
+        return message
+
     async def commit(self):
         return None
 
     async def flush(self):
         return None
 
+    async def claim_message(self, message):
+        if message.status not in {EmailStatus.QUEUED, EmailStatus.RETRYING}:
+            return False
+        message.status = EmailStatus.SENDING
+        return True
+
     async def set_status(self, message, status, **kwargs):
         message.status = status
         return message
@@ -46,6 +58,9 @@ class FakeAsyncRepo:
     async def is_suppressed(self, email: str) -> bool:
         return email in self.suppressed
 
+    async def find_suppressed(self, emails) -> set[str]:
+        return {email.lower() for email in emails} & self.suppressed
+
 
 class DummyBackend:
     name = "dummy"
@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from fastapi_post_office.config import settings
+from fastapi_post_office.db import (
+    AsyncEmailRepository,
+    Base,
+    SuppressionReason,
+    create_async_engine_from_url,
+    create_async_session_factory,
+)
+from fastapi_post_office.service import AsyncEmailService
+from fastapi_post_office.service.suppression_index import SuppressionIndex
+from fastapi_post_office.service.validator import SuppressedRecipientError
+
+
+def test_async_service_uses_suppression_index(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "block_suppressed", True)
+    index = SuppressionIndex(60, capacity=1000)
+
+    async def body():
+        engine = create_async_engine_from_url(f"sqlite+aiosqlite:///{tmp_path / 'async.db'}")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        try:
+            async with create_async_session_factory(engine)() as session:
+                repo = AsyncEmailRepository(session)
+                await repo.add_suppression("blocked@example.com", SuppressionReason.BOUNCE)
+                await repo.commit()
+                service = AsyncEmailService(repo, suppression_index=index)
+                await service.enqueue(
+                    to=["ok@example.com"], subject="Hi", html=None, text="Hi", idempotency_key="k1"
+                )
+                with pytest.raises(SuppressedRecipientError):
+                    await service.enqueue(
+                        to=["blocked@example.com"],
+                        subject="Hi",
+                        html=None,
+                        text="Hi",
+                        idempotency_key="k2",
+                    )
+        finally:
+            await engine.dispose()
+
+    asyncio.run(body())
+    assert index.ready
+    assert index.candidates(["ok@example.com", "blocked@example.com"]) == ["blocked@example.com"]
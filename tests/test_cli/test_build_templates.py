@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+import pytest
+
+from fastapi_post_office.cli.build_templates import BuildError, build_templates_command
+from fastapi_post_office.config import settings
+from fastapi_post_office.service import EmailService
+from fastapi_post_office.templates.bundle import TemplateBundle
+from fastapi_post_office.templates.partials import partial_registry
+
+
+def test_build_templates_bundle_serves_service_without_db_rows(
+    template_dir, tmp_path, repo, capsys
+):
+    (template_dir / "_partials").mkdir()
+    (template_dir / "_partials" / "base.j2").write_text(
+        "<div>{% block body %}{% endblock %}</div>", encoding="utf-8"
+    )
+    (template_dir / "welcome_user" / "html.j2").write_text(
+        "{% extends 'base.j2' %}{% block body %}Hi {{ first_name }}{% endblock %}",
+        encoding="utf-8",
+    )
+    output = tmp_path / "templates.fapo"
+
+    build_templates_command(path=str(template_dir), output=str(output))
+    assert "1 templates, 1 partials" in capsys.readouterr().out
+
+    partial_registry.clear()
+    with TemplateBundle(output) as bundle:
+        source = bundle.get("welcome_user")
+        assert source is not None and source.compiled is not None
+        message = EmailService(repo, template_provider=bundle).enqueue_template(
+            template_name="welcome_user",
+            to=["user@example.com"],
+            context={"first_name": "Ana"},
+            idempotency_key="bundle-1",
+        )
+    partial_registry.clear()
+    assert message.html_body == "<div>Hi Ana</div>"
+    assert message.template_revision_used == 1
+
+
+def test_build_templates_without_compiled_code(template_dir, tmp_path):
+    output = tmp_path / "templates.fapo"
+    build_templates_command(path=str(template_dir), output=str(output), compiled=False)
+    with TemplateBundle(output) as bundle:
+        source = bundle.get("welcome_user")
+        assert source is not None and source.compiled is None
+
+
+def test_build_templates_rejects_invalid_templates(template_dir, tmp_path):
+    (template_dir / "welcome_user" / "subject.j2").write_text("Hi {{ x ", encoding="utf-8")
+    with pytest.raises(BuildError):
+        build_templates_command(path=str(template_dir), output=str(tmp_path / "t.fapo"))
+    assert not (tmp_path / "t.fapo").exists()
+
+
+def test_service_uses_configured_bundle(template_dir, tmp_path, repo, monkeypatch):
+    output = tmp_path / "templates.fapo"
+    build_templates_command(path=str(template_dir), output=str(output))
+    monkeypatch.setattr(settings, "template_bundle_path", str(output))
+
+    service = EmailService(repo)
+    assert service.template_provider is not None
+    message = service.enqueue_template(
+        template_name="welcome_user",
+        to=["user@example.com"],
+        context={"first_name": "Bo"},
+        idempotency_key="bundle-2",
+    )
+    assert message.subject == "Hi Bo"
@@ -6,7 +6,7 @@ from fastapi_post_office.cli import main
 def test_cli_sync_templates_calls(monkeypatch):
     called = {"ok": False}
 
-    def fake_sync(path: str, upsert: bool):
+    def fake_sync(path: str, upsert: bool, workers=None, hash_cache=True, hash_cache_path=None):
         called["ok"] = True
         assert path == "./templates"
         assert upsert is True
@@ -14,3 +14,14 @@ def test_cli_sync_templates_calls(monkeypatch):
     monkeypatch.setattr(main, "sync_templates_command", fake_sync)
     main.sync_templates(path="./templates", upsert=True)
     assert called["ok"] is True
+
+
+def test_cli_build_templates_calls(monkeypatch):
+    calls = []
+    monkeypatch.setattr(
+        main,
+        "build_templates_command",
+        lambda path, output, compiled: calls.append((path, output, compiled)),
+    )
+    main.build_templates(path="./templates", output="out.fapo", compiled=False)
+    assert calls == [("./templates", "out.fapo", False)]
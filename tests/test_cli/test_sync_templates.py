@@ -1,13 +1,19 @@
 from __future__ import annotations
 
-from fastapi_post_office.cli.sync_templates import sync_templates_command
+import pytest
+from sqlalchemy import update
+
+from fastapi_post_office.cli.sync_templates import SyncError, sync_templates_command
 from fastapi_post_office.config import settings
 from fastapi_post_office.db import (
     Base,
     EmailRepository,
+    EmailTemplate,
     create_engine_from_url,
     create_session_factory,
 )
+from fastapi_post_office.service import EmailService
+from fastapi_post_office.templates.partials import partial_registry
 
 
 def test_sync_templates_command(template_dir, tmp_path):
@@ -22,5 +28,123 @@ def test_sync_templates_command(template_dir, tmp_path):
     repo = EmailRepository(session)
     template = repo.get_template("welcome_user", active_only=False)
     assert template is not None
+    assert template.template_vars_json == ["first_name"]
+    assert template.compiled_json is not None
+    assert template.compiled_json["modes"]["sandboxed"]["subject"]["source"]
+    session.close()
+    engine.dispose()
+
+
+def test_sync_templates_partials_render_through_service(template_dir, tmp_path):
+    db_url = f"sqlite+pysqlite:///{tmp_path / 'cli_partials.db'}"
+    settings.database_url = db_url
+    engine = create_engine_from_url(db_url)
+    Base.metadata.create_all(engine)
+    (template_dir / "_partials").mkdir()
+    (template_dir / "_partials" / "base.j2").write_text(
+        "<div>{% block body %}{% endblock %}</div>", encoding="utf-8"
+    )
+    (template_dir / "welcome_user" / "html.j2").write_text(
+        "{% extends 'base.j2' %}{% block body %}Hi {{ first_name }}{% endblock %}",
+        encoding="utf-8",
+    )
+
+    sync_templates_command(path=str(template_dir), upsert=True)
+    partial_registry.clear()
+
+    session = create_session_factory(engine)()
+    repo = EmailRepository(session)
+    assert [p.name for p in repo.get_partials()] == ["base.j2"]
+    message = EmailService(repo).enqueue_template(
+        template_name="welcome_user",
+        to=["user@example.com"],
+        context={"first_name": "Ana"},
+        idempotency_key="partials-1",
+    )
+    assert message.html_body == "<div>Hi Ana</div>"
+    session.close()
+    engine.dispose()
+    partial_registry.clear()
+
+
+def test_sync_templates_skips_unchanged_and_reports_summary(template_dir, tmp_path, capsys):
+    db_url = f"sqlite+pysqlite:///{tmp_path / 'cli_incremental.db'}"
+    settings.database_url = db_url
+    engine = create_engine_from_url(db_url)
+    Base.metadata.create_all(engine)
+    (template_dir / "_partials").mkdir()
+    (template_dir / "_partials" / "footer.j2").write_text("Bye", encoding="utf-8")
+    (template_dir / "welcome_user" / "text.j2").write_text(
+        "Hello {{ first_name }} {% include 'footer.j2' %}", encoding="utf-8"
+    )
+
+    sync_templates_command(path=str(template_dir), upsert=True)
+    assert "1 templates: 1 new, 0 updated, 0 unchanged" in capsys.readouterr().out
+
+    sync_templates_command(path=str(template_dir), upsert=True)
+    assert "1 templates: 0 new, 0 updated, 1 unchanged" in capsys.readouterr().out
+    assert (template_dir / ".fapo-cache").exists()
+
+    # A deactivated template is reactivated even though its files did not change.
+    with engine.begin() as conn:
+        conn.execute(update(EmailTemplate).values(is_active=False))
+    sync_templates_command(path=str(template_dir), upsert=True)
+    assert "0 new, 1 updated, 0 unchanged" in capsys.readouterr().out
+
+    # A changed partial re-syncs the templates that depend on it.
+    (template_dir / "_partials" / "footer.j2").write_text("Cheers", encoding="utf-8")
+    sync_templates_command(path=str(template_dir), upsert=True)
+    assert "0 new, 1 updated, 0 unchanged" in capsys.readouterr().out
+
+    # A revision bump goes through the bulk upsert.
+    (template_dir / "welcome_user" / "manifest.json").write_text(
+        '{"name":"welcome_user","revision":2,"description":"Welcome","required_vars":["first_name"]}',
+        encoding="utf-8",
+    )
+    sync_templates_command(path=str(template_dir), upsert=True)
+
+    session = create_session_factory(engine)()
+    template = EmailRepository(session).get_template("welcome_user", active_only=False)
+    assert template is not None
+    assert template.revision == 2
+    assert template.is_active
+    assert template.dependencies_json is not None
+    assert list(template.dependencies_json) == ["footer.j2"]
+    session.close()
+    engine.dispose()
+
+
+def test_sync_templates_rejects_duplicate_names(template_dir, tmp_path):
+    settings.database_url = f"sqlite+pysqlite:///{tmp_path / 'cli_dupes.db'}"
+    copy = template_dir / "welcome_copy"
+    copy.mkdir()
+    for path in (template_dir / "welcome_user").iterdir():
+        (copy / path.name).write_text(path.read_text(encoding="utf-8"), encoding="utf-8")
+
+    with pytest.raises(SyncError, match="welcome_user"):
+        sync_templates_command(path=str(template_dir), upsert=True)
+
+
+def test_sync_templates_loads_changed_templates_in_parallel(template_dir, tmp_path, capsys):
+    db_url = f"sqlite+pysqlite:///{tmp_path / 'cli_parallel.db'}"
+    settings.database_url = db_url
+    engine = create_engine_from_url(db_url)
+    Base.metadata.create_all(engine)
+    for i in range(3):
+        tdir = template_dir / f"notice_{i}"
+        tdir.mkdir()
+        (tdir / "manifest.json").write_text(
+            f'{{"name":"notice_{i}","revision":1,"description":"Notice","required_vars":[]}}',
+            encoding="utf-8",
+        )
+        (tdir / "subject.j2").write_text(f"Notice {i}", encoding="utf-8")
+        (tdir / "text.j2").write_text("{{ body }}", encoding="utf-8")
+
+    sync_templates_command(path=str(template_dir), upsert=True, workers=2)
+    assert "4 templates: 4 new" in capsys.readouterr().out
+
+    session = create_session_factory(engine)()
+    template = EmailRepository(session).get_template("notice_2", active_only=False)
+    assert template is not None and template.template_vars_json == ["body"]
     session.close()
     engine.dispose()
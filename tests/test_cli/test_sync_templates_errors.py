@@ -51,3 +51,27 @@ def test_sync_templates_hash_changed_without_revision(template_dir, tmp_path):
             sync_templates_command(path=str(template_dir), upsert=True)
     finally:
         engine.dispose()
+
+
+def test_sync_templates_rejects_invalid_syntax(template_dir, tmp_path):
+    db_url = f"sqlite+pysqlite:///{tmp_path / 'cli_err3.db'}"
+    settings.database_url = db_url
+    engine = create_engine_from_url(db_url)
+    Base.metadata.create_all(engine)
+    engine.dispose()
+    _make_template(template_dir, revision=1, subject="Hi {{ first_name ")
+    with pytest.raises(SyncError):
+        sync_templates_command(path=str(template_dir), upsert=True)
+
+
+def test_sync_templates_rejects_unsafe_attribute_access(template_dir, tmp_path):
+    db_url = f"sqlite+pysqlite:///{tmp_path / 'cli_err4.db'}"
+    settings.database_url = db_url
+    engine = create_engine_from_url(db_url)
+    Base.metadata.create_all(engine)
+    engine.dispose()
+    _make_template(
+        template_dir, revision=1, subject="{{ cycler.__init__.__globals__.os.getcwd() }}"
+    )
+    with pytest.raises(SyncError, match="Unsafe attribute access"):
+        sync_templates_command(path=str(template_dir), upsert=True)
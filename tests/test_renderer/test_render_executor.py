@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import asyncio
+from dataclasses import replace
+
+import pytest
+
+from fastapi_post_office.config import settings
+from fastapi_post_office.service.composer import (
+    compose_from_template,
+    compose_from_template_async,
+    compose_many,
+)
+from fastapi_post_office.templates.executor import RenderExecutor, get_render_executor
+from fastapi_post_office.templates.loader import load_templates
+from fastapi_post_office.templates.renderer import RenderError
+
+
+@pytest.fixture(scope="module")
+def executor():
+    with RenderExecutor(max_workers=2, chunk_size=3) as pool:
+        yield pool
+
+
+def test_executor_render_and_errors(template_dir, executor):
+    source = load_templates(template_dir, max_bytes=10_000)[0]
+    rendered = executor.render(source, {"first_name": "Ana"}, strict=True, max_bytes=10_000)
+    assert rendered.subject == "Hi Ana"
+    with pytest.raises(RenderError):
+        executor.render(source, {}, strict=True, max_bytes=10_000)
+
+
+def test_executor_render_many_keeps_order(template_dir, executor):
+    source = load_templates(template_dir, max_bytes=10_000)[0]
+    contexts = [{"first_name": f"u{i}"} if i != 4 else {} for i in range(20)]
+
+    results = list(executor.render_many(source, contexts, strict=True, max_bytes=10_000))
+
+    assert [r.index for r in results] == list(range(20))
+    assert [r.ok for r in results].count(False) == 1
+    assert results[4].error is not None
+    assert results[7].rendered is not None and results[7].rendered.subject == "Hi u7"
+
+
+def test_compose_with_executor(template_dir, executor):
+    source = load_templates(template_dir, max_bytes=10_000)[0]
+    composed = compose_from_template(
+        source, {"first_name": "Ana"}, strict=True, max_bytes=10_000, executor=executor
+    )
+    assert composed.subject == "Hi Ana"
+
+    composed = asyncio.run(
+        compose_from_template_async(
+            source, {"first_name": "Bo"}, strict=True, max_bytes=10_000, executor=executor
+        )
+    )
+    assert composed.text_body == "Hello Bo"
+
+    results = list(
+        compose_many(
+            source, [{"first_name": "Cy"}], strict=True, max_bytes=10_000, executor=executor
+        )
+    )
+    assert results[0].composed is not None and results[0].composed.subject == "Hi Cy"
+
+
+def test_executor_preload_and_validation(template_dir):
+    source = load_templates(template_dir, max_bytes=10_000)[0]
+    with RenderExecutor(max_workers=1, preload=[source]) as pool:
+        assert pool.render(source, {"first_name": "A"}, strict=True, max_bytes=100).subject
+    with pytest.raises(ValueError):
+        RenderExecutor(chunk_size=0)
+
+
+def _count_shipments(pool, monkeypatch) -> list[str]:
+    shipped: list[str] = []
+    ship = pool._shipment
+
+    def counting(source):
+        shipped.append(source.manifest.name)
+        return ship(source)
+
+    monkeypatch.setattr(pool, "_shipment", counting)
+    return shipped
+
+
+def test_executor_sends_preloaded_templates_by_key(template_dir, monkeypatch):
+    source = load_templates(template_dir, max_bytes=10_000)[0]
+    with RenderExecutor(max_workers=1, preload=[source], chunk_size=2) as pool:
+        shipped = _count_shipments(pool, monkeypatch)
+        assert pool.render(source, {"first_name": "A"}, strict=True, max_bytes=100).subject
+        results = list(
+            pool.render_many(source, [{"first_name": "B"}] * 5, strict=True, max_bytes=100)
+        )
+        assert all(r.ok for r in results)
+        assert shipped == []
+
+
+def test_executor_ships_other_templates_once_per_revision(template_dir, monkeypatch):
+    source = load_templates(template_dir, max_bytes=10_000)[0]
+    with RenderExecutor(max_workers=1) as pool:
+        shipped = _count_shipments(pool, monkeypatch)
+        for name in ("A", "B"):
+            pool.render(source, {"first_name": name}, strict=True, max_bytes=100)
+        assert len(shipped) == 1
+
+        edited = replace(
+            source,
+            manifest=replace(source.manifest, revision=source.manifest.revision + 1),
+            subject_template="Hey {{ first_name }}",
+            source_hash="executor-edited",
+        )
+        rendered = pool.render(edited, {"first_name": "C"}, strict=True, max_bytes=100)
+        assert rendered.subject == "Hey C"
+        assert len(shipped) == 2
+
+
+def test_executor_ships_changed_templates_with_each_batch(template_dir, monkeypatch):
+    source = load_templates(template_dir, max_bytes=10_000)[0]
+    with RenderExecutor(max_workers=2, preload=[source], chunk_size=2) as pool:
+        shipped = _count_shipments(pool, monkeypatch)
+        edited = replace(
+            source,
+            manifest=replace(source.manifest, revision=source.manifest.revision + 1),
+            subject_template="Hey {{ first_name }}",
+            source_hash="executor-batch-edited",
+        )
+        results = list(
+            pool.render_many(edited, [{"first_name": "D"}] * 7, strict=True, max_bytes=100)
+        )
+        assert all(r.rendered is not None and r.rendered.subject == "Hey D" for r in results)
+        # Shipped once with the batch, never resent after a worker missed it.
+        assert shipped == ["welcome_user"]
+
+
+def test_shared_executor_disabled_by_default():
+    assert settings.render_workers == 0
+    assert get_render_executor() is None
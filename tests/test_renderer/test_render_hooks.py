@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import pytest
+
+from fastapi_post_office.templates import (
+    RenderEvent,
+    RenderExecutor,
+    RenderHistogram,
+    add_render_hook,
+    remove_render_hook,
+    render_hooks,
+)
+from fastapi_post_office.templates.loader import load_templates
+from fastapi_post_office.templates.renderer import (
+    RenderError,
+    render_many,
+    render_subject,
+    render_template,
+    template_cache,
+)
+
+
+@pytest.fixture()
+def events():
+    collected: list[RenderEvent] = []
+    add_render_hook(collected.append)
+    try:
+        yield collected
+    finally:
+        remove_render_hook(collected.append)
+
+
+def test_render_reports_parts_bytes_and_cache_hits(template_dir, events):
+    template_cache.clear()
+    source = load_templates(template_dir, max_bytes=10_000)[0]
+
+    render_template(source, {"first_name": "Ana"}, strict=True, max_bytes=10_000)
+    render_template(source, {"first_name": "Ana"}, strict=True, max_bytes=10_000)
+
+    first, second = events
+    assert (first.template_name, first.revision) == ("welcome_user", 1)
+    assert first.cache_hit is False and second.cache_hit is True
+    assert set(first.durations) == {"subject", "html", "text"}
+    assert first.output_bytes == {"subject": 6, "html": 16, "text": 9}
+    assert first.total_bytes == 31 and first.ok
+
+
+def test_failed_render_is_reported(template_dir, events):
+    source = load_templates(template_dir, max_bytes=10_000)[0]
+
+    with pytest.raises(RenderError):
+        render_template(source, {"first_name": "x" * 100}, strict=True, max_bytes=50)
+
+    assert len(events) == 1
+    assert not events[0].ok and "size limit" in (events[0].error or "")
+
+
+def test_subject_only_and_batch_renders_are_reported(template_dir, events):
+    source = load_templates(template_dir, max_bytes=10_000)[0]
+
+    render_subject(source, {"first_name": "Ana"}, strict=True, max_bytes=10_000)
+    results = list(render_many(source, [{"first_name": "A"}, {}], strict=True, max_bytes=10_000))
+
+    assert set(events[0].durations) == {"subject"}
+    assert [e.ok for e in events[1:]] == [r.ok for r in results] == [True, False]
+    assert events[2].cache_hit is True
+
+
+def test_failing_hook_does_not_fail_render(template_dir, events):
+    def broken(event: RenderEvent) -> None:
+        raise RuntimeError("boom")
+
+    add_render_hook(broken)
+    try:
+        source = load_templates(template_dir, max_bytes=10_000)[0]
+        rendered = render_template(source, {"first_name": "Ana"}, strict=True, max_bytes=10_000)
+    finally:
+        remove_render_hook(broken)
+    assert rendered.subject == "Hi Ana"
+    assert len(events) == 1
+
+
+def test_no_hooks_means_no_events(template_dir):
+    assert not render_hooks
+    source = load_templates(template_dir, max_bytes=10_000)[0]
+    render_template(source, {"first_name": "Ana"}, strict=True, max_bytes=10_000)
+
+
+def test_histogram_aggregates_per_template_and_part(template_dir):
+    template_cache.clear()
+    histogram = RenderHistogram(duration_buckets=(10.0,), size_buckets=(8, 1024))
+    add_render_hook(histogram)
+    try:
+        source = load_templates(template_dir, max_bytes=10_000)[0]
+        for name in ("Ana", "Bob", "Cy"):
+            render_template(source, {"first_name": name}, strict=True, max_bytes=10_000)
+    finally:
+        remove_render_hook(histogram)
+
+    stats = histogram.get("welcome_user", 1)
+    assert stats is not None
+    assert (stats.renders, stats.errors, stats.cache_hits, stats.cache_misses) == (3, 0, 2, 1)
+    assert stats.durations["html"].counts == [3, 0]
+    assert stats.output_bytes["subject"].counts == [3, 0, 0]
+    assert stats.output_bytes["html"].counts == [0, 3, 0]
+    assert histogram.get("missing", 1) is None
+
+
+def test_executor_replays_child_events(template_dir, events):
+    source = load_templates(template_dir, max_bytes=10_000)[0]
+    with RenderExecutor(max_workers=1, chunk_size=2) as pool:
+        pool.render(source, {"first_name": "Ana"}, strict=True, max_bytes=10_000)
+        with pytest.raises(RenderError):
+            pool.render(source, {"first_name": "x" * 100}, strict=True, max_bytes=50)
+        list(pool.render_many(source, [{"first_name": "A"}] * 3, strict=True, max_bytes=10_000))
+
+    assert [e.ok for e in events] == [True, False, True, True, True]
@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+from dataclasses import replace
+
+import pytest
+
+from fastapi_post_office.service.composer import compose_many
+from fastapi_post_office.templates.loader import load_templates
+from fastapi_post_office.templates.renderer import RenderError, render_many, template_cache
+
+
+def test_render_many_reports_per_item_errors(template_dir):
+    source = load_templates(template_dir, max_bytes=10_000)[0]
+    contexts = [{"first_name": "Ana"}, {}, {"first_name": "Bob\nBcc: x"}, {"first_name": "Cy"}]
+
+    results = list(render_many(source, contexts, strict=True, max_bytes=10_000))
+
+    assert [r.index for r in results] == [0, 1, 2, 3]
+    assert [r.ok for r in results] == [True, False, False, True]
+    assert results[0].rendered is not None and results[0].rendered.subject == "Hi Ana"
+    assert isinstance(results[1].error, RenderError)
+    assert results[3].rendered is not None and results[3].rendered.text == "Hello Cy"
+
+
+def test_render_many_compiles_once_and_is_lazy(template_dir):
+    template_cache.clear()
+    source = load_templates(template_dir, max_bytes=10_000)[0]
+
+    def contexts():
+        for i in range(1_000):
+            yield {"first_name": f"user-{i}"}
+
+    results = render_many(source, contexts(), strict=True, max_bytes=10_000)
+    first = next(results)
+    assert first.rendered is not None and first.rendered.subject == "Hi user-0"
+    assert sum(1 for r in results if r.ok) == 999
+    assert template_cache.stats().misses == 1
+
+
+def test_render_many_wraps_unexpected_errors(template_dir):
+    source = load_templates(template_dir, max_bytes=10_000)[0]
+    source = replace(source, subject_template="{{ 1 // n }}", source_hash="div")
+    results = list(
+        render_many(source, [{"first_name": "a", "n": 0}], strict=True, max_bytes=10_000)
+    )
+    assert isinstance(results[0].error, RenderError)
+
+
+def test_compose_many(template_dir):
+    source = load_templates(template_dir, max_bytes=10_000)[0]
+    results = list(compose_many(source, [{"first_name": "Ana"}, {}], strict=True, max_bytes=10_000))
+    assert results[0].composed is not None
+    assert results[0].composed.template_name == "welcome_user"
+    assert results[1].composed is None and results[1].error is not None
+
+
+def test_compose_many_raises_on_compile_error(template_dir):
+    source = load_templates(template_dir, max_bytes=10_000)[0]
+    source = replace(source, subject_template="{{ broken", source_hash="broken")
+    with pytest.raises(RenderError):
+        compose_many(source, [{"first_name": "Ana"}], strict=True, max_bytes=10_000)
@@ -1,9 +1,17 @@
 from __future__ import annotations
 
+from dataclasses import replace
+
 import pytest
+from jinja2.sandbox import SandboxedEnvironment
 
 from fastapi_post_office.templates.loader import load_templates
-from fastapi_post_office.templates.renderer import RenderError, render_template
+from fastapi_post_office.templates.renderer import (
+    RenderError,
+    get_environment,
+    render_template,
+    validate_context,
+)
 
 
 def test_render_ok(template_dir):
@@ -17,3 +25,69 @@ def test_render_missing_var(template_dir):
     source = load_templates(template_dir, max_bytes=10_000)[0]
     with pytest.raises(RenderError):
         render_template(source, {}, strict=True, max_bytes=10_000)
+
+
+def test_render_non_strict_allows_undefined(template_dir):
+    source = load_templates(template_dir, max_bytes=10_000)[0]
+    source = replace(source, subject_template="Hi {{ nickname }}!", source_hash="lenient")
+    rendered = render_template(source, {"first_name": "Ana"}, strict=False, max_bytes=10_000)
+    assert rendered.subject == "Hi !"
+
+
+def test_render_trusted_matches_sandboxed(template_dir):
+    source = load_templates(template_dir, max_bytes=10_000)[0]
+    sandboxed = render_template(source, {"first_name": "Ana"}, strict=True, max_bytes=10_000)
+    trusted = render_template(
+        source, {"first_name": "Ana"}, strict=True, max_bytes=10_000, trusted=True
+    )
+    assert trusted == sandboxed
+
+
+def test_environments_are_shared():
+    assert get_environment(strict=True) is get_environment(strict=True)
+    assert isinstance(get_environment(strict=True), SandboxedEnvironment)
+    assert not isinstance(get_environment(strict=True, trusted=True), SandboxedEnvironment)
+    assert get_environment(strict=False) is not get_environment(strict=True)
+
+
+def test_discovered_vars_are_checked_before_rendering(template_dir):
+    source = load_templates(template_dir, max_bytes=10_000)[0]
+    source = replace(
+        source,
+        text_template="{{ first_name }} {{ last_name }}",
+        template_vars=("first_name", "last_name"),
+        source_hash="discovered",
+    )
+    with pytest.raises(RenderError, match="last_name"):
+        validate_context(source, {"first_name": "Ana"}, strict=True)
+    with pytest.raises(RenderError, match="last_name"):
+        render_template(source, {"first_name": "Ana"}, strict=True, max_bytes=10_000)
+
+    validate_context(source, {"first_name": "Ana"}, strict=False)
+    rendered = render_template(source, {"first_name": "Ana"}, strict=False, max_bytes=10_000)
+    assert rendered.text == "Ana "
+
+
+@pytest.mark.parametrize(
+    "text, missing",
+    [
+        ("{% if vip %}!{% endif %}", "vip"),
+        ('{{ promo | default("") }}{{ promo.upper() }}', "promo"),
+    ],
+)
+def test_strict_mode_requires_branched_and_partly_guarded_vars(template_dir, text, missing):
+    (template_dir / "welcome_user" / "text.j2").write_text(text, encoding="utf-8")
+    source = load_templates(template_dir, max_bytes=10_000)[0]
+    with pytest.raises(RenderError, match=missing):
+        validate_context(source, {"first_name": "Ana"}, strict=True)
+    with pytest.raises(RenderError, match=missing):
+        render_template(source, {"first_name": "Ana"}, strict=True, max_bytes=10_000)
+
+
+def test_defaulted_vars_render_without_context_keys(template_dir):
+    (template_dir / "welcome_user" / "text.j2").write_text(
+        'Hello {{ first_name }}{{ promo | default("") }}', encoding="utf-8"
+    )
+    source = load_templates(template_dir, max_bytes=10_000)[0]
+    rendered = render_template(source, {"first_name": "Ana"}, strict=True, max_bytes=10_000)
+    assert rendered.text == "Hello Ana"
@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+from dataclasses import replace
+
+import pytest
+
+from fastapi_post_office.templates.cache import TemplateCache
+from fastapi_post_office.templates.loader import load_templates
+from fastapi_post_office.templates.renderer import compile_template, render_template, template_cache
+
+
+@pytest.fixture(autouse=True)
+def _clear_cache():
+    template_cache.clear()
+    yield
+    template_cache.clear()
+
+
+def test_render_reuses_compiled_template(template_dir):
+    source = load_templates(template_dir, max_bytes=10_000)[0]
+    render_template(source, {"first_name": "Ana"}, strict=True, max_bytes=10_000)
+    rendered = render_template(source, {"first_name": "Bob"}, strict=True, max_bytes=10_000)
+    assert rendered.subject == "Hi Bob"
+
+    stats = template_cache.stats()
+    assert stats.misses == 1
+    assert stats.hits == 1
+    assert compile_template(source, strict=True) is compile_template(source, strict=True)
+
+
+def test_new_source_hash_compiles_again(template_dir):
+    source = load_templates(template_dir, max_bytes=10_000)[0]
+    changed = replace(source, subject_template="Hey {{ first_name }}", source_hash="other")
+    render_template(source, {"first_name": "Ana"}, strict=True, max_bytes=10_000)
+    rendered = render_template(changed, {"first_name": "Ana"}, strict=True, max_bytes=10_000)
+    assert rendered.subject == "Hey Ana"
+    assert template_cache.stats().misses == 2
+
+
+def test_cache_evicts_least_recently_used():
+    cache = TemplateCache(maxsize=2)
+    cache.get_or_compile("a", lambda: 1)
+    cache.get_or_compile("b", lambda: 2)
+    cache.get_or_compile("a", lambda: 1)
+    cache.get_or_compile("c", lambda: 3)
+
+    stats = cache.stats()
+    assert stats.evictions == 1
+    assert stats.size == 2
+    assert cache.get_or_compile("a", lambda: 99) == 1
+    assert cache.get_or_compile("b", lambda: 99) == 99
+
+
+def test_cache_disabled_and_resize():
+    cache = TemplateCache(maxsize=0)
+    assert cache.get_or_compile("a", lambda: 1) == 1
+    assert len(cache) == 0
+
+    cache.resize(1)
+    cache.get_or_compile("a", lambda: 1)
+    cache.get_or_compile("b", lambda: 2)
+    assert len(cache) == 1
+    with pytest.raises(ValueError):
+        cache.resize(-1)
+    with pytest.raises(ValueError):
+        TemplateCache(maxsize=-1)
@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+from dataclasses import replace
+
+import pytest
+
+from fastapi_post_office.config import settings
+from fastapi_post_office.templates.loader import load_templates
+from fastapi_post_office.templates.renderer import (
+    get_environment,
+    precompile_template,
+    render_template,
+    template_cache,
+)
+
+
+@pytest.fixture()
+def precompiled_enabled():
+    template_cache.clear()
+    settings.load_precompiled_templates = True
+    yield
+    settings.load_precompiled_templates = False
+    template_cache.clear()
+
+
+def _no_parsing(monkeypatch):
+    for trusted in (False, True):
+        env = get_environment(True, trusted)
+
+        def _fail(*args, **kwargs):
+            raise AssertionError("template source was parsed")
+
+        monkeypatch.setattr(env, "from_string", _fail)
+
+
+@pytest.mark.parametrize("trusted", [False, True])
+def test_render_from_precompiled_payload(template_dir, monkeypatch, precompiled_enabled, trusted):
+    source = load_templates(template_dir, max_bytes=10_000)[0]
+    source = replace(source, compiled=precompile_template(source))
+    _no_parsing(monkeypatch)
+
+    rendered = render_template(
+        source, {"first_name": "Ana"}, strict=True, max_bytes=10_000, trusted=trusted
+    )
+    assert rendered.subject == "Hi Ana"
+    assert rendered.html == "<b>Hello Ana</b>"
+
+
+def test_precompiled_source_used_on_other_python(template_dir, monkeypatch, precompiled_enabled):
+    source = load_templates(template_dir, max_bytes=10_000)[0]
+    payload = precompile_template(source)
+    payload["python_magic"] = "00000000"
+    source = replace(source, compiled=payload)
+    _no_parsing(monkeypatch)
+
+    rendered = render_template(source, {"first_name": "Ana"}, strict=True, max_bytes=10_000)
+    assert rendered.text == "Hello Ana"
+
+
+def test_incompatible_payload_falls_back_to_source(template_dir, precompiled_enabled):
+    source = load_templates(template_dir, max_bytes=10_000)[0]
+    payload = precompile_template(source)
+    payload["jinja"] = "0.0"
+    source = replace(source, compiled=payload)
+
+    rendered = render_template(source, {"first_name": "Ana"}, strict=True, max_bytes=10_000)
+    assert rendered.subject == "Hi Ana"
+
+
+def test_precompiled_ignored_when_disabled(template_dir, monkeypatch):
+    template_cache.clear()
+    source = load_templates(template_dir, max_bytes=10_000)[0]
+    payload = precompile_template(source)
+    payload["modes"]["sandboxed"]["subject"]["bytecode"] = "not-used"
+    source = replace(source, compiled=payload)
+
+    rendered = render_template(source, {"first_name": "Ana"}, strict=True, max_bytes=10_000)
+    assert rendered.subject == "Hi Ana"
+    template_cache.clear()
@@ -1,12 +1,98 @@
 from __future__ import annotations
 
+from dataclasses import replace
+
 import pytest
 
 from fastapi_post_office.templates.loader import load_templates
-from fastapi_post_office.templates.renderer import RenderError, render_template
+from fastapi_post_office.templates.renderer import RenderError, render_template, vet_template
 
 
 def test_render_header_injection(template_dir):
     source = load_templates(template_dir, max_bytes=10_000)[0]
     with pytest.raises(RenderError):
         render_template(source, {"first_name": "Ana\nBcc: x"}, strict=True, max_bytes=10_000)
+
+
+def test_render_aborts_runaway_output_early(template_dir):
+    source = load_templates(template_dir, max_bytes=10_000)[0]
+    runaway = (
+        "{% for i in range(100000) %}{% for j in range(100000) %}xxxxxxxx{% endfor %}{% endfor %}"
+    )
+    source = replace(source, html_template=runaway, source_hash="runaway")
+    with pytest.raises(RenderError):
+        render_template(source, {"first_name": "Ana"}, strict=True, max_bytes=10_000)
+
+
+def test_render_size_limit_counts_utf8_bytes_across_parts(template_dir):
+    source = load_templates(template_dir, max_bytes=10_000)[0]
+    source = replace(
+        source,
+        subject_template="é",
+        html_template="éé",
+        text_template="{{ first_name }}",
+        source_hash="utf8",
+    )
+    # 2 + 4 + 3 bytes
+    rendered = render_template(source, {"first_name": "abc"}, strict=True, max_bytes=9)
+    assert rendered.html == "éé"
+    with pytest.raises(RenderError):
+        render_template(source, {"first_name": "abcd"}, strict=True, max_bytes=9)
+
+
+ESCAPE = "{{ cycler.__init__.__globals__.os.getcwd() }}"
+
+
+@pytest.mark.parametrize(
+    "html",
+    [
+        ESCAPE,
+        "{{ first_name['__class__'] }}",
+        "{{ first_name | attr('__class__') }}",
+        "{{ first_name | attr(name) }}",
+        "{{ users | map(attribute='name.__class__') | list }}",
+        "{{ gen.gi_frame }}",
+    ],
+)
+def test_vet_template_rejects_attributes_the_sandbox_forbids(template_dir, html):
+    source = load_templates(template_dir, max_bytes=10_000)[0]
+    source = replace(source, html_template=html, source_hash=f"unsafe-{html}")
+    with pytest.raises(RenderError, match="Unsafe attribute access"):
+        vet_template(source)
+
+
+def test_vet_template_accepts_plain_templates(template_dir):
+    source = load_templates(template_dir, max_bytes=10_000)[0]
+    source = replace(
+        source,
+        html_template="{{ user.name }} {{ items[0] }} {{ users | map(attribute='name') | join }}",
+        source_hash="plain",
+    )
+    vet_template(source)
+
+
+def test_trusted_render_refuses_computed_internal_attributes(template_dir):
+    source = load_templates(template_dir, max_bytes=10_000)[0]
+    source = replace(
+        source,
+        html_template="{{ first_name[key] }} {{ '{0.__class__}'.format(first_name) }}",
+        source_hash="computed",
+    )
+    vet_template(source)
+    with pytest.raises(RenderError, match="unsafe"):
+        render_template(
+            source,
+            {"first_name": "Ana", "key": "__class__"},
+            strict=False,
+            max_bytes=10_000,
+            trusted=True,
+        )
+    source = replace(source, html_template="{{ '{0}'.format(data) }}", source_hash="format")
+    rendered = render_template(
+        source,
+        {"first_name": "Ana", "data": {"_id": 1}},
+        strict=False,
+        max_bytes=10_000,
+        trusted=True,
+    )
+    assert rendered.html == "{'_id': 1}"
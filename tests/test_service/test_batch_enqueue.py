@@ -0,0 +1,190 @@
+from __future__ import annotations
+
+import pytest
+from sqlalchemy import func, select
+
+from fastapi_post_office.config import settings
+from fastapi_post_office.db.models import EmailMessage, EmailTemplate, SuppressionReason
+from fastapi_post_office.service import (
+    EmailRequest,
+    EmailService,
+    EnqueueOutcome,
+    TemplateEmailRequest,
+)
+
+
+def _request(key: str, to: str = "user@example.com", **kwargs) -> EmailRequest:
+    return EmailRequest(to=[to], subject="Hi", text="Hello", idempotency_key=key, **kwargs)
+
+
+def _template() -> EmailTemplate:
+    return EmailTemplate(
+        name="welcome_user",
+        revision=1,
+        subject_template="Hi {{ first_name }}",
+        html_template=None,
+        text_template="Hello {{ first_name }}",
+        required_vars_json=["first_name"],
+        content_policy_json=None,
+        tags_json=[],
+        source_hash="batch-hash",
+        is_active=True,
+    )
+
+
+def _count(repo) -> int:
+    return repo.session.execute(select(func.count(EmailMessage.id))).scalar_one()
+
+
+def test_enqueue_many_creates_all_messages(repo):
+    results = EmailService(repo).enqueue_many([_request(f"k{i}") for i in range(3)])
+
+    assert [r.outcome for r in results] == [EnqueueOutcome.CREATED] * 3
+    assert [r.index for r in results] == [0, 1, 2]
+    assert all(r.message is not None and r.message.idempotency_key for r in results)
+    assert _count(repo) == 3
+
+
+def test_enqueue_many_reports_duplicates_and_rejections(repo):
+    service = EmailService(repo)
+    existing = service.enqueue(
+        to=["user@example.com"], subject="Hi", html=None, text="Hello", idempotency_key="k0"
+    )
+
+    results = service.enqueue_many(
+        [
+            _request("k0"),
+            _request("k1"),
+            _request("k1"),
+            _request(""),
+            EmailRequest(to=["user@example.com"], subject="Hi", idempotency_key="k2"),
+            _request("k3", to="bad\nheader@example.com"),
+        ]
+    )
+
+    assert [r.outcome for r in results] == [
+        EnqueueOutcome.DUPLICATE,
+        EnqueueOutcome.CREATED,
+        EnqueueOutcome.DUPLICATE,
+        EnqueueOutcome.REJECTED,
+        EnqueueOutcome.REJECTED,
+        EnqueueOutcome.REJECTED,
+    ]
+    assert results[0].message is existing
+    assert results[2].message is results[1].message
+    assert "idempotency_key" in str(results[3].error)
+    assert "html or text" in str(results[4].error)
+    assert _count(repo) == 2
+
+
+def test_enqueue_many_rejects_suppressed_recipients(repo, monkeypatch):
+    monkeypatch.setattr(settings, "block_suppressed", True)
+    repo.add_suppression("blocked@example.com", SuppressionReason.BOUNCE)
+    repo.commit()
+
+    results = EmailService(repo).enqueue_many(
+        [_request("k1"), _request("k2", to="user@example.com", cc=["Blocked@example.com"])]
+    )
+
+    assert results[0].outcome is EnqueueOutcome.CREATED
+    assert results[1].outcome is EnqueueOutcome.REJECTED
+    assert "Blocked@example.com" in str(results[1].error)
+
+
+def test_enqueue_many_treats_concurrent_insert_as_duplicate(repo, monkeypatch):
+    service = EmailService(repo)
+    concurrent = service.enqueue(
+        to=["user@example.com"], subject="Hi", html=None, text="Hello", idempotency_key="k1"
+    )
+    lookup = repo.get_messages_by_idempotency
+    calls = []
+
+    def stale_lookup(keys):
+        # The first lookup misses "k1", as if it was committed right after.
+        calls.append(list(keys))
+        return {} if len(calls) == 1 else lookup(keys)
+
+    monkeypatch.setattr(repo, "get_messages_by_idempotency", stale_lookup)
+    results = service.enqueue_many([_request("k1"), _request("k2")])
+
+    assert [r.outcome for r in results] == [EnqueueOutcome.DUPLICATE, EnqueueOutcome.CREATED]
+    assert results[0].message.id == concurrent.id
+    assert len(calls) == 2
+    assert _count(repo) == 2
+
+
+def test_enqueue_many_conflict_keeps_unrelated_session_work(repo, monkeypatch):
+    service = EmailService(repo)
+    service.enqueue(
+        to=["user@example.com"], subject="Hi", html=None, text="Hello", idempotency_key="k1"
+    )
+    repo.add_suppression("blocked@example.com", SuppressionReason.MANUAL)
+    lookup = repo.get_messages_by_idempotency
+    calls = []
+
+    def stale_lookup(keys):
+        calls.append(list(keys))
+        return {} if len(calls) == 1 else lookup(keys)
+
+    monkeypatch.setattr(repo, "get_messages_by_idempotency", stale_lookup)
+    results = service.enqueue_many([_request("k1"), _request("k2")])
+    repo.session.rollback()
+
+    assert [r.outcome for r in results] == [EnqueueOutcome.DUPLICATE, EnqueueOutcome.CREATED]
+    assert repo.is_suppressed("blocked@example.com")
+    assert _count(repo) == 2
+
+
+def test_enqueue_template_many_renders_each_context(repo):
+    repo.upsert_template(_template())
+    repo.commit()
+
+    results = EmailService(repo).enqueue_template_many(
+        "welcome_user",
+        [
+            TemplateEmailRequest(
+                to=["ana@example.com"], context={"first_name": "Ana"}, idempotency_key="k1"
+            ),
+            TemplateEmailRequest(to=["bo@example.com"], context={}, idempotency_key="k2"),
+            TemplateEmailRequest(
+                to=["cy@example.com"], context={"first_name": "Cy"}, idempotency_key="k3"
+            ),
+        ],
+    )
+
+    assert [r.outcome for r in results] == [
+        EnqueueOutcome.CREATED,
+        EnqueueOutcome.REJECTED,
+        EnqueueOutcome.CREATED,
+    ]
+    assert results[0].message.subject == "Hi Ana"
+    assert results[2].message.text_body == "Hello Cy"
+    assert results[2].message.template_revision_used == 1
+    assert "first_name" in str(results[1].error)
+
+
+def test_enqueue_template_many_deferred(repo, monkeypatch):
+    monkeypatch.setattr(settings, "defer_render", True)
+    monkeypatch.setattr(settings, "persist_context", True)
+    repo.upsert_template(_template())
+    repo.commit()
+
+    (result,) = EmailService(repo).enqueue_template_many(
+        "welcome_user",
+        [
+            TemplateEmailRequest(
+                to=["a@example.com"], context={"first_name": "A"}, idempotency_key="k"
+            )
+        ],
+    )
+
+    assert result.message.subject == "Hi A"
+    assert result.message.text_body is None
+    assert result.message.context_json == {"first_name": "A"}
+
+
+def test_enqueue_template_many_missing_template_raises(repo):
+    with pytest.raises(ValueError):
+        EmailService(repo).enqueue_template_many(
+            "missing", [TemplateEmailRequest(to=["a@example.com"], context={}, idempotency_key="k")]
+        )
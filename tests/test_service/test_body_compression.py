@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import sys
+
+import pytest
+from sqlalchemy import text
+
+from fastapi_post_office.config import Settings, settings
+from fastapi_post_office.db import EmailRepository, compression, create_session_factory
+from fastapi_post_office.db.compression import (
+    MARKER,
+    ZLIB,
+    CompressionError,
+    compress_text,
+    decompress_text,
+    resolve_codec,
+)
+from fastapi_post_office.service import EmailService
+
+HTML = "<tr><td style='padding:12px'>Your order has shipped</td></tr>" * 40
+
+
+@pytest.fixture()
+def compressed(monkeypatch):
+    monkeypatch.setattr(settings, "compress_bodies", True)
+    monkeypatch.setattr(settings, "compress_bodies_codec", "zlib")
+    monkeypatch.setattr(settings, "compress_body_min_length", 512)
+
+
+def _enqueue(repo, key: str, html: str = HTML, text_body: str | None = "Shipped"):
+    return EmailService(repo).enqueue(
+        to=["user@example.com"], subject="Hi", html=html, text=text_body, idempotency_key=key
+    )
+
+
+def _stored(repo, key: str):
+    return repo.session.execute(
+        text("SELECT html_body, text_body FROM email_messages WHERE idempotency_key = :key"),
+        {"key": key},
+    ).one()
+
+
+def _reload(repo, message_id):
+    session = create_session_factory(repo.session.get_bind())()
+    try:
+        message = EmailRepository(session).get_message(message_id)
+        return message.html_body, message.text_body
+    finally:
+        session.close()
+
+
+def test_roundtrip_and_plain_values():
+    stored = compress_text(HTML, ZLIB)
+
+    assert stored.startswith(MARKER + ZLIB)
+    assert len(stored) < len(HTML) / 3
+    assert decompress_text(stored) == HTML
+    assert decompress_text("plain body") == "plain body"
+    with pytest.raises(CompressionError):
+        decompress_text(MARKER + "?abc")
+
+
+def test_long_bodies_are_stored_compressed(repo, compressed):
+    message = _enqueue(repo, "k1")
+
+    html, plain = _stored(repo, "k1")
+    assert html.startswith(MARKER + ZLIB)
+    assert plain == "Shipped"
+    assert _reload(repo, message.id) == (HTML, "Shipped")
+
+
+def test_plain_rows_stay_readable(repo, monkeypatch):
+    legacy = _enqueue(repo, "legacy")
+    monkeypatch.setattr(settings, "compress_bodies", True)
+    fresh = _enqueue(repo, "fresh")
+
+    assert _stored(repo, "legacy")[0] == HTML
+    assert _stored(repo, "fresh")[0].startswith(MARKER)
+    assert _reload(repo, legacy.id)[0] == HTML
+    assert _reload(repo, fresh.id)[0] == HTML
+
+
+def test_plain_value_starting_with_marker_roundtrips(repo):
+    body = MARKER + "z not compressed"
+    message = _enqueue(repo, "k1", html=None, text_body=body)
+
+    assert _reload(repo, message.id)[1] == body
+
+
+def test_shared_bodies_are_compressed(repo, compressed, monkeypatch):
+    monkeypatch.setattr(settings, "dedupe_bodies", True)
+    message = _enqueue(repo, "k1")
+
+    content = repo.session.execute(text("SELECT content FROM email_bodies")).scalar_one()
+    assert content.startswith(MARKER + ZLIB)
+    assert _reload(repo, message.id)[0] == HTML
+
+
+def test_codec_selection(monkeypatch):
+    monkeypatch.setattr(compression, "_zstd", lambda: None)
+
+    assert resolve_codec("auto") == ZLIB
+    with pytest.raises(CompressionError):
+        resolve_codec("zstd")
+    with pytest.raises(ValueError):
+        Settings(compress_bodies_codec="lz4")
+
+
+def test_missing_zstd_is_looked_up_once(monkeypatch):
+    compression._zstd.cache_clear()
+    monkeypatch.setitem(sys.modules, "zstandard", None)
+    try:
+        for _ in range(3):
+            assert resolve_codec("auto") == ZLIB
+        assert compression._zstd.cache_info().misses == 1
+    finally:
+        compression._zstd.cache_clear()
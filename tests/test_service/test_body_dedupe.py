@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import delete, func, select, text, update
+
+from fastapi_post_office.backends.base import SendResult
+from fastapi_post_office.config import settings
+from fastapi_post_office.db import EmailRepository, create_session_factory
+from fastapi_post_office.db.bodies import BodyCache
+from fastapi_post_office.db.models import EmailBody, EmailMessage, EmailStatus
+from fastapi_post_office.service import EmailRequest, EmailService
+
+HTML = "<p>Big announcement</p>" * 50
+
+
+@pytest.fixture(autouse=True)
+def dedupe(monkeypatch):
+    monkeypatch.setattr(settings, "dedupe_bodies", True)
+    monkeypatch.setattr(settings, "dedupe_body_min_length", 256)
+
+
+class CapturingBackend:
+    name = "capturing"
+
+    def __init__(self) -> None:
+        self.bodies: list = []
+
+    def send(self, message):
+        self.bodies.append((message.html_body, message.text_body))
+        return SendResult(ok=True, provider_message_id="p1")
+
+
+def _broadcast(repo, count: int = 3):
+    return EmailService(repo).enqueue_many(
+        [
+            EmailRequest(
+                to=[f"user{i}@example.com"],
+                subject="News",
+                html=HTML,
+                text="Short text",
+                idempotency_key=f"news:{i}",
+            )
+            for i in range(count)
+        ]
+    )
+
+
+def _fresh_repo(repo, body_cache: BodyCache | None = None) -> EmailRepository:
+    session = create_session_factory(repo.session.get_bind())()
+    return EmailRepository(session, body_cache=body_cache)
+
+
+def test_broadcast_stores_each_body_once(repo):
+    results = _broadcast(repo)
+
+    rows = repo.session.execute(
+        text("SELECT html_body, html_body_hash, text_body, text_body_hash FROM email_messages")
+    ).all()
+    assert repo.session.scalar(select(func.count()).select_from(EmailBody)) == 1
+    assert {(row[0], row[2], row[3]) for row in rows} == {(None, "Short text", None)}
+    assert len({row[1] for row in rows}) == 1
+    assert all(r.message.html_body == HTML for r in results)
+
+
+def test_get_message_reads_shared_body(repo, monkeypatch, sql_statements):
+    monkeypatch.setattr(settings, "body_cache_size", 0)
+    message_id = _broadcast(repo, count=1)[0].message.id
+    other = _fresh_repo(repo, body_cache=BodyCache(10))
+    sql_statements.clear()
+    try:
+        message = other.get_message(message_id)
+        assert message.html_body == HTML
+        assert message.text_body == "Short text"
+        assert sum("email_bodies" in s for s in sql_statements) == 1
+
+        other.session.expire_all()
+        assert other.get_message(message_id).html_body == HTML
+        assert sum("email_bodies" in s for s in sql_statements) == 1
+    finally:
+        other.session.close()
+
+
+def test_send_now_passes_shared_body_to_backend(repo):
+    message_id = _broadcast(repo, count=1)[0].message.id
+    other = _fresh_repo(repo)
+    try:
+        service = EmailService(other)
+        service.backend = CapturingBackend()
+        assert service.send_now(message_id).status == EmailStatus.SENT
+    finally:
+        other.session.close()
+
+    assert service.backend.bodies == [(HTML, "Short text")]
+
+
+def test_inline_rows_are_still_readable(repo, monkeypatch):
+    monkeypatch.setattr(settings, "dedupe_bodies", False)
+    message = EmailService(repo).enqueue(
+        to=["a@example.com"], subject="Hi", html=HTML, text=None, idempotency_key="inline"
+    )
+    monkeypatch.setattr(settings, "dedupe_bodies", True)
+    other = _fresh_repo(repo)
+    try:
+        loaded = other.get_message(message.id)
+        assert loaded.html_body == HTML
+        assert loaded.html_body_hash is None
+    finally:
+        other.session.close()
+
+
+def test_cleanup_removes_only_orphaned_bodies(repo):
+    _broadcast(repo, count=2)
+    EmailService(repo).enqueue(
+        to=["a@example.com"],
+        subject="Hi",
+        html="<p>Other</p>" * 50,
+        text=None,
+        idempotency_key="other",
+    )
+    repo.session.execute(delete(EmailMessage).where(EmailMessage.idempotency_key == "news:0"))
+    repo.session.execute(delete(EmailMessage).where(EmailMessage.idempotency_key == "other"))
+
+    assert repo.cleanup_bodies(min_age_seconds=-60) == 1
+    contents = repo.session.scalars(select(EmailBody.content)).all()
+    assert contents == [HTML]
+
+
+def test_reusing_a_body_protects_it_from_cleanup(repo):
+    _broadcast(repo, count=1)
+    repo.session.execute(delete(EmailMessage))
+    repo.session.execute(
+        update(EmailBody).values(last_used_at=datetime.now(timezone.utc) - timedelta(days=1))
+    )
+    repo.commit()
+
+    # An old, orphaned body that a new enqueue reuses counts as recently used.
+    EmailService(repo, autocommit=False).enqueue(
+        to=["a@example.com"], subject="Hi", html=HTML, text=None, idempotency_key="again"
+    )
+    repo.session.execute(delete(EmailMessage))
+
+    assert repo.cleanup_bodies(min_age_seconds=3600) == 0
+    assert repo.cleanup_bodies(min_age_seconds=-60) == 1
+
+
+def test_replaced_body_is_written_inline_when_dedupe_is_off(repo, monkeypatch):
+    message_id = _broadcast(repo, count=1)[0].message.id
+    monkeypatch.setattr(settings, "dedupe_bodies", False)
+    other = _fresh_repo(repo)
+    try:
+        message = other.get_message(message_id)
+        assert message.html_body_hash is not None
+        other.set_bodies(message, "<p>Replaced</p>", "Short text")
+        other.commit()
+    finally:
+        other.session.close()
+
+    reader = _fresh_repo(repo)
+    try:
+        stored = reader.get_message(message_id)
+        assert stored.html_body == "<p>Replaced</p>"
+        assert stored.html_body_hash is None
+    finally:
+        reader.session.close()
@@ -0,0 +1,172 @@
+from __future__ import annotations
+
+import pytest
+
+from fastapi_post_office.backends.base import SendResult
+from fastapi_post_office.config import Settings, settings
+from fastapi_post_office.db.models import EmailStatus, EmailTemplate
+from fastapi_post_office.service import EmailService
+
+
+@pytest.fixture()
+def deferred(monkeypatch):
+    monkeypatch.setattr(settings, "defer_render", True)
+    monkeypatch.setattr(settings, "persist_context", True)
+
+
+class FlakyBackend:
+    """Fails the first send, then records the text bodies it delivers."""
+
+    name = "flaky"
+
+    def __init__(self) -> None:
+        self.failures = 1
+        self.sent: list[str | None] = []
+
+    def send(self, message):
+        if self.failures:
+            self.failures -= 1
+            return SendResult(ok=False, error_message="boom")
+        self.sent.append(message.text_body)
+        return SendResult(ok=True, provider_message_id="p-1")
+
+
+def _template(revision: int = 1) -> EmailTemplate:
+    return EmailTemplate(
+        name="welcome_user",
+        revision=revision,
+        subject_template="Hi {{ first_name }}",
+        html_template="<b>Hello {{ first_name }}</b>",
+        text_template="Hello {{ first_name }}",
+        required_vars_json=["first_name"],
+        content_policy_json=None,
+        tags_json=[],
+        source_hash=f"hash-{revision}",
+        is_active=True,
+    )
+
+
+def _enqueue(service: EmailService, key: str = "k1"):
+    return service.enqueue_template(
+        template_name="welcome_user",
+        to=["user@example.com"],
+        context={"first_name": "Ana"},
+        idempotency_key=key,
+    )
+
+
+def test_deferred_enqueue_stores_context_without_bodies(repo, deferred):
+    repo.upsert_template(_template())
+    repo.commit()
+
+    msg = _enqueue(EmailService(repo))
+    assert msg.subject == "Hi Ana"
+    assert msg.html_body is None
+    assert msg.text_body is None
+    assert msg.context_json == {"first_name": "Ana"}
+
+
+def test_deferred_send_renders_without_persisting_bodies(repo, deferred):
+    repo.upsert_template(_template())
+    repo.commit()
+    service = EmailService(repo)
+    msg = _enqueue(service)
+
+    sent = service.send_now(msg.id)
+    assert sent.status == EmailStatus.SENT
+
+    repo.session.expire_all()
+    stored = repo.get_message(msg.id)
+    assert stored is not None
+    assert stored.html_body is None
+    assert stored.text_body is None
+
+
+def test_deferred_send_can_persist_bodies(repo, deferred, monkeypatch):
+    monkeypatch.setattr(settings, "persist_deferred_bodies", True)
+    repo.upsert_template(_template())
+    repo.commit()
+    service = EmailService(repo)
+    msg = _enqueue(service)
+
+    service.send_now(msg.id)
+    repo.session.expire_all()
+    stored = repo.get_message(msg.id)
+    assert stored is not None
+    assert stored.html_body == "<b>Hello Ana</b>"
+    assert stored.text_body == "Hello Ana"
+
+
+def test_deferred_retry_renders_the_revision_active_after_a_sync(repo, deferred):
+    repo.upsert_template(_template())
+    repo.commit()
+    service = EmailService(repo)
+    service.backend = backend = FlakyBackend()
+    msg = _enqueue(service)
+
+    retrying = service.send_now(msg.id)
+    assert retrying.status == EmailStatus.RETRYING
+
+    updated = _template(revision=2)
+    updated.subject_template = "Welcome, {{ first_name }}"
+    updated.text_template = "Welcome {{ first_name }}"
+    updated.source_hash = "hash-2-welcome"
+    repo.upsert_template(updated)
+    repo.commit()
+
+    assert service.send_now(msg.id).status == EmailStatus.SENT
+    assert backend.sent == ["Welcome Ana"]
+
+    # Subject, bodies and the recorded revision all match what was sent.
+    repo.session.expunge_all()
+    stored = repo.get_message(msg.id)
+    assert stored.template_revision_used == 2
+    assert stored.subject == "Welcome, Ana"
+
+
+def test_revision_needing_new_variables_is_retried(repo, deferred):
+    repo.upsert_template(_template())
+    repo.commit()
+    service = EmailService(repo)
+    msg = _enqueue(service)
+
+    updated = _template(revision=2)
+    updated.text_template = "Hello {{ first_name }} {{ last_name }}"
+    updated.required_vars_json = ["first_name", "last_name"]
+    updated.source_hash = "hash-2-last-name"
+    repo.upsert_template(updated)
+    repo.commit()
+
+    retrying = service.send_now(msg.id)
+    assert retrying.status == EmailStatus.RETRYING
+    assert retrying.attempt_count == 1
+    assert retrying.next_attempt_at is not None
+    # Nothing was sent, so the revision the request was accepted with is kept.
+    assert retrying.template_revision_used == 1
+
+
+def test_eager_message_without_bodies_is_not_rendered_again(repo, monkeypatch):
+    monkeypatch.setattr(settings, "persist_context", True)
+    subject_only = _template()
+    subject_only.html_template = None
+    subject_only.text_template = None
+    subject_only.source_hash = "hash-1-subject-only"
+    repo.upsert_template(subject_only)
+    repo.commit()
+    service = EmailService(repo)
+    msg = _enqueue(service)
+    assert not msg.render_deferred
+
+    repo.upsert_template(_template(revision=2))
+    repo.commit()
+
+    sent = service.send_now(msg.id)
+    assert sent.status == EmailStatus.SENT
+    assert sent.template_revision_used == 1
+    assert sent.text_body is None
+
+
+def test_defer_render_requires_persist_context():
+    config = Settings(defer_render=True, persist_context=False)
+    with pytest.raises(RuntimeError, match="PERSIST_CONTEXT"):
+        config.validate_runtime_safety()
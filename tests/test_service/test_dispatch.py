@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from fastapi_post_office.backends.base import SendResult
+from fastapi_post_office.config import Settings, settings
+from fastapi_post_office.db import EmailRepository, create_session_factory
+from fastapi_post_office.db.models import EmailStatus
+from fastapi_post_office.service import EmailRequest, EmailService
+from fastapi_post_office.service.dispatch import (
+    InProcessDispatcher,
+    celery_dispatcher,
+    get_dispatcher,
+)
+
+
+class CountingBackend:
+    name = "counting"
+
+    def __init__(self) -> None:
+        self.sent: list = []
+
+    def send(self, message):
+        self.sent.append(message.id)
+        return SendResult(ok=True, provider_message_id="p1")
+
+
+def _enqueue(service: EmailService, key: str = "k1"):
+    return service.enqueue(
+        to=["user@example.com"], subject="Hi", html=None, text="Hello", idempotency_key=key
+    )
+
+
+def test_dispatcher_receives_new_message_after_commit(repo):
+    dispatched: list = []
+    service = EmailService(repo, dispatcher=dispatched.extend)
+
+    message = _enqueue(service)
+    _enqueue(service)  # duplicate: nothing new to send
+
+    assert dispatched == [message.id]
+    due = message.next_attempt_at.replace(tzinfo=message.next_attempt_at.tzinfo or timezone.utc)
+    assert due > datetime.now(timezone.utc) + timedelta(seconds=settings.dispatch_grace_seconds - 5)
+
+
+def test_batch_dispatches_created_messages_once(repo):
+    calls: list = []
+    service = EmailService(repo, dispatcher=lambda ids: calls.append(list(ids)))
+
+    results = service.enqueue_many(
+        [
+            EmailRequest(to=["a@example.com"], subject="Hi", text="x", idempotency_key="k1"),
+            EmailRequest(to=["b@example.com"], subject="Hi", text="x", idempotency_key="k2"),
+        ]
+    )
+
+    assert calls == [[r.message.id for r in results]]
+
+
+def test_dispatch_failure_does_not_fail_enqueue(repo):
+    def broken(ids):
+        raise ConnectionError("broker down")
+
+    message = _enqueue(EmailService(repo, dispatcher=broken))
+
+    assert message.status == EmailStatus.QUEUED
+
+
+def test_send_now_skips_message_claimed_by_another_worker(repo):
+    service = EmailService(repo)
+    service.backend = CountingBackend()
+    message = _enqueue(service)
+    stale = repo.get_message(message.id)
+    assert stale.status == EmailStatus.QUEUED
+
+    other = create_session_factory(repo.session.get_bind())()
+    try:
+        other_service = EmailService(EmailRepository(other))
+        other_service.backend = CountingBackend()
+        other_service.send_now(message.id)
+    finally:
+        other.close()
+
+    result = service.send_now(message.id)
+
+    assert service.backend.sent == []
+    assert result.status == EmailStatus.SENT
+
+
+def test_in_process_dispatcher_sends(repo, monkeypatch):
+    monkeypatch.setattr(settings, "email_backend", "console")
+    dispatcher = InProcessDispatcher(create_session_factory(repo.session.get_bind()))
+    message = _enqueue(EmailService(repo, dispatcher=dispatcher))
+    message_id = message.id
+    dispatcher.shutdown()
+
+    repo.session.expire_all()
+    assert repo.get_message(message_id).status == EmailStatus.SENT
+
+
+def test_get_dispatcher(monkeypatch):
+    monkeypatch.setattr(settings, "dispatch_after_commit", "none")
+    assert get_dispatcher() is None
+    monkeypatch.setattr(settings, "dispatch_after_commit", "celery")
+    assert get_dispatcher() is celery_dispatcher
+    with pytest.raises(ValueError):
+        Settings(dispatch_after_commit="kafka")
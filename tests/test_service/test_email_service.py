@@ -5,6 +5,7 @@ import pytest
 from fastapi_post_office.db.models import EmailTemplate
 from fastapi_post_office.service import EmailService
 from fastapi_post_office.service.idempotency import IdempotencyError
+from fastapi_post_office.templates.renderer import RenderError
 
 
 def test_enqueue_raw_requires_body(repo):
@@ -68,3 +69,31 @@ def test_send_now_success(repo):
 
     sent = service.send_now(msg.id)
     assert sent.status.name == "SENT"
+
+
+def test_enqueue_template_rejects_context_missing_discovered_vars(repo):
+    template = EmailTemplate(
+        name="receipt",
+        revision=1,
+        subject_template="Receipt for {{ first_name }}",
+        html_template=None,
+        text_template="Total {{ total }}",
+        required_vars_json=[],
+        content_policy_json=None,
+        tags_json=[],
+        source_hash="hash",
+        template_vars_json=["first_name", "total"],
+        is_active=True,
+    )
+    repo.upsert_template(template)
+    repo.commit()
+
+    service = EmailService(repo)
+    with pytest.raises(RenderError, match="total"):
+        service.enqueue_template(
+            template_name="receipt",
+            to=["user@example.com"],
+            context={"first_name": "Ana"},
+            idempotency_key="receipt-1",
+        )
+    assert repo.get_message_by_idempotency("receipt-1") is None
@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+from fastapi_post_office.config import settings
+from fastapi_post_office.db import EmailRepository, create_session_factory
+from fastapi_post_office.db.models import EmailTemplate
+from fastapi_post_office.service import EmailService
+
+
+def _enqueue(service: EmailService, key: str = "k1", to: str = "user@example.com"):
+    return service.enqueue(to=[to], subject="Hi", html=None, text="Hello", idempotency_key=key)
+
+
+def _verbs(statements: list[str]) -> list[str]:
+    return [statement.split()[0] for statement in statements]
+
+
+def test_new_message_is_inserted_without_a_lookup(repo, monkeypatch, sql_statements):
+    monkeypatch.setattr(settings, "block_suppressed", False)
+
+    message = _enqueue(EmailService(repo))
+
+    assert _verbs(sql_statements) == ["INSERT"]
+    assert message.id is not None
+
+
+def test_retried_key_is_looked_up_on_conflict(repo, monkeypatch, sql_statements):
+    monkeypatch.setattr(settings, "block_suppressed", False)
+    service = EmailService(repo)
+    original_id = _enqueue(service).id
+    sql_statements.clear()
+
+    retry = _enqueue(service)
+
+    assert retry.id == original_id
+    assert _verbs(sql_statements) == ["INSERT", "SELECT"]
+
+
+def test_retried_key_that_no_longer_renders_returns_original(repo):
+    repo.upsert_template(
+        EmailTemplate(
+            name="welcome_user",
+            revision=1,
+            subject_template="Hi {{ first_name }}",
+            html_template=None,
+            text_template="Hello {{ first_name }}",
+            required_vars_json=["first_name"],
+            content_policy_json=None,
+            tags_json=[],
+            source_hash="hash-1",
+            is_active=True,
+        )
+    )
+    repo.commit()
+    service = EmailService(repo)
+    original_id = service.enqueue_template(
+        template_name="welcome_user",
+        to=["user@example.com"],
+        context={"first_name": "Ana"},
+        idempotency_key="k1",
+    ).id
+
+    retry = service.enqueue_template(
+        template_name="welcome_user", to=["user@example.com"], context={}, idempotency_key="k1"
+    )
+
+    assert retry.id == original_id
+
+
+def test_concurrent_insert_returns_winner(repo):
+    # Another worker committed the same key after this request started.
+    other = create_session_factory(repo.session.get_bind())()
+    try:
+        winner = _enqueue(EmailService(EmailRepository(other)))
+        winner_id = winner.id
+    finally:
+        other.close()
+
+    message = _enqueue(EmailService(repo))
+
+    assert message.id == winner_id
+
+
+def test_retry_of_accepted_request_returns_original_even_if_now_invalid(repo):
+    service = EmailService(repo)
+    original = _enqueue(service)
+
+    retry = _enqueue(service, to="")
+
+    assert retry.id == original.id
+
+
+def test_savepoint_fallback_without_returning(repo, monkeypatch):
+    monkeypatch.setattr(repo.session.get_bind().dialect, "insert_returning", False)
+    service = EmailService(repo)
+
+    first = _enqueue(service)
+    second = _enqueue(service)
+
+    assert second.id == first.id
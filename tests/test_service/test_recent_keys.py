@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+import uuid
+
+import pytest
+
+from fastapi_post_office.config import settings
+from fastapi_post_office.db.models import EmailMessage, EmailStatus
+from fastapi_post_office.service import EmailRequest, EmailService
+from fastapi_post_office.service.recent_keys import RecentKeyCache, get_recent_key_cache
+
+
+class _Clock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _enqueue(service: EmailService, key: str = "k1"):
+    return service.enqueue(
+        to=["user@example.com"], subject="Hi", html=None, text="Hello", idempotency_key=key
+    )
+
+
+def test_retry_is_answered_without_database(repo, sql_statements):
+    clock = _Clock()
+    service = EmailService(repo, recent_keys=RecentKeyCache(10, 30, clock=clock))
+    original = _enqueue(service)
+    original_id = original.id
+    sql_statements.clear()
+
+    retry = _enqueue(service)
+
+    assert sql_statements == []
+    assert retry.id == original_id
+    assert retry.idempotency_key == "k1"
+    assert retry.status == EmailStatus.QUEUED
+    assert retry is not original
+    assert retry.text_body is None  # bodies are not kept per key
+
+
+def test_batch_keys_are_remembered(repo, sql_statements):
+    service = EmailService(repo, recent_keys=RecentKeyCache(10, 30))
+    results = service.enqueue_many(
+        [
+            EmailRequest(to=["user@example.com"], subject="Hi", text="Hello", idempotency_key=key)
+            for key in ("k1", "k2")
+        ]
+    )
+    sql_statements.clear()
+
+    retry = _enqueue(service, "k2")
+
+    assert sql_statements == []
+    assert retry.id == results[1].message.id
+
+
+def test_expired_entry_falls_back_to_database(repo, sql_statements):
+    clock = _Clock()
+    cache = RecentKeyCache(10, 30, clock=clock)
+    service = EmailService(repo, recent_keys=cache)
+    original_id = _enqueue(service).id
+
+    clock.now = 30
+    sql_statements.clear()
+    retry = _enqueue(service)
+
+    assert retry.id == original_id
+    assert sql_statements
+    assert len(cache) == 1  # re-remembered from the database
+
+
+def test_cache_is_bounded(repo):
+    cache = RecentKeyCache(2, 30)
+    service = EmailService(repo, recent_keys=cache)
+    for key in ("k1", "k2", "k3"):
+        _enqueue(service, key)
+
+    assert len(cache) == 2
+    assert cache.get("k1") is None
+    assert cache.get("k3") is not None
+
+
+def test_cached_snapshots_are_independent_copies():
+    cache = RecentKeyCache(2, 30)
+    cache.put(EmailMessage(to_json=["a@example.com"], idempotency_key="k"))
+    assert cache.get("k") is None  # never stored without an id
+
+    cache.put(EmailMessage(id=uuid.uuid4(), to_json=["a@example.com"], idempotency_key="k"))
+    cache.get("k").to_json.append("b@example.com")
+    assert cache.get("k").to_json == ["a@example.com"]
+
+
+def test_shared_cache_is_disabled_by_default(monkeypatch):
+    monkeypatch.setattr(settings, "idempotency_cache_size", 0)
+    assert get_recent_key_cache() is None
+
+    monkeypatch.setattr(settings, "idempotency_cache_size", 100)
+    cache = get_recent_key_cache()
+    assert cache is not None and cache.maxsize == 100
+    assert get_recent_key_cache() is cache
+
+
+def test_invalid_sizes():
+    with pytest.raises(ValueError):
+        RecentKeyCache(0, 30)
+    with pytest.raises(ValueError):
+        RecentKeyCache(10, 0)
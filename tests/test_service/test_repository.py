@@ -1,6 +1,11 @@
 from __future__ import annotations
 
-from fastapi_post_office.db.models import EmailMessage, EmailStatus, EmailTemplate
+from fastapi_post_office.db.models import (
+    EmailMessage,
+    EmailStatus,
+    EmailTemplate,
+    SuppressionReason,
+)
 
 
 def test_repository_upsert_template(repo):
@@ -96,3 +101,15 @@ def test_repository_due_and_cleanup(repo):
 
     deleted = repo.cleanup_sent(retention_days=30)
     assert deleted >= 1
+
+
+def test_repository_find_suppressed(repo):
+    repo.add_suppression("a@example.com", SuppressionReason.BOUNCE)
+    repo.add_suppression("b@example.com", SuppressionReason.COMPLAINT)
+    repo.commit()
+
+    found = repo.find_suppressed(
+        ["A@Example.com", "a@example.com", "c@example.com", "b@example.com"]
+    )
+    assert found == {"a@example.com", "b@example.com"}
+    assert repo.find_suppressed([]) == set()
@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+import pytest
+
+from fastapi_post_office.config import settings
+from fastapi_post_office.db.models import EmailTemplate
+from fastapi_post_office.service import EmailService
+from fastapi_post_office.service.source_cache import (
+    TemplateSourceCache,
+    get_template_source_cache,
+)
+
+
+class _Clock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _template(revision: int = 1, subject: str = "Hi {{ first_name }}") -> EmailTemplate:
+    return EmailTemplate(
+        name="welcome_user",
+        revision=revision,
+        subject_template=subject,
+        html_template=None,
+        text_template="Hello {{ first_name }}",
+        required_vars_json=["first_name"],
+        content_policy_json=None,
+        tags_json=[],
+        source_hash=f"hash-{revision}",
+        is_active=True,
+    )
+
+
+def _counting(repo, monkeypatch) -> dict[str, int]:
+    calls = {"get_template": 0, "get_template_version": 0}
+    for name in calls:
+        original = getattr(repo, name)
+
+        def wrapper(*args, _name=name, _original=original, **kwargs):
+            calls[_name] += 1
+            return _original(*args, **kwargs)
+
+        monkeypatch.setattr(repo, name, wrapper)
+    return calls
+
+
+def _enqueue(service: EmailService, key: str):
+    return service.enqueue_template(
+        template_name="welcome_user",
+        to=["user@example.com"],
+        context={"first_name": "Ana"},
+        idempotency_key=key,
+    )
+
+
+def test_cached_template_skips_db_lookup(repo, monkeypatch):
+    repo.upsert_template(_template())
+    repo.commit()
+    clock = _Clock()
+    service = EmailService(repo, source_cache=TemplateSourceCache(30, clock=clock))
+    calls = _counting(repo, monkeypatch)
+
+    _enqueue(service, "k1")
+    _enqueue(service, "k2")
+    clock.now = 10
+    _enqueue(service, "k3")
+
+    assert calls == {"get_template": 1, "get_template_version": 1}
+
+
+def test_template_change_is_seen_after_ttl(repo):
+    repo.upsert_template(_template())
+    repo.commit()
+    clock = _Clock()
+    service = EmailService(repo, source_cache=TemplateSourceCache(30, clock=clock))
+    assert _enqueue(service, "k1").subject == "Hi Ana"
+
+    repo.upsert_template(_template(revision=2, subject="Welcome {{ first_name }}"))
+    repo.commit()
+    assert _enqueue(service, "k2").subject == "Hi Ana"
+
+    clock.now = 30
+    assert _enqueue(service, "k3").subject == "Welcome Ana"
+
+
+def test_deactivated_template_is_not_served_from_cache(repo):
+    repo.upsert_template(_template())
+    repo.commit()
+    service = EmailService(repo, source_cache=TemplateSourceCache(30, clock=_Clock()))
+    assert _enqueue(service, "k1").subject == "Hi Ana"
+
+    inactive = _template()
+    inactive.is_active = False
+    repo.upsert_template(inactive)
+    repo.commit()
+
+    with pytest.raises(ValueError, match="Template not found"):
+        _enqueue(service, "k2")
+
+
+def test_unchanged_version_keeps_entries():
+    clock = _Clock()
+    cache = TemplateSourceCache(5, clock=clock)
+    assert cache.needs_probe()
+    cache.validate((1, None, 1))
+    cache.put("welcome_user", object(), cache.generation)  # type: ignore[arg-type]
+
+    clock.now = 5
+    assert cache.needs_probe()
+    cache.validate((1, None, 1))
+    assert cache.get("welcome_user") is not None
+    assert not cache.needs_probe()
+
+    cache.validate((1, None, 2))
+    assert cache.get("welcome_user") is None
+
+
+def test_row_read_before_a_drop_is_not_cached(repo, monkeypatch):
+    repo.upsert_template(_template())
+    repo.commit()
+    cache = TemplateSourceCache(30, clock=_Clock())
+    service = EmailService(repo, source_cache=cache)
+    original = repo.get_template
+
+    def racing_get_template(*args, **kwargs):
+        # Revision 1 is read, then another worker's probe sees revision 2
+        # and drops the cache before this worker stores what it read.
+        template = original(*args, **kwargs)
+        cache.validate(("changed",))
+        return template
+
+    monkeypatch.setattr(repo, "get_template", racing_get_template)
+    assert _enqueue(service, "k1").subject == "Hi Ana"
+
+    assert cache.get("welcome_user") is None
+
+
+def test_put_is_ignored_after_discard_or_clear():
+    cache = TemplateSourceCache(5, clock=_Clock())
+    source = object()
+    for drop in (lambda: cache.discard("welcome_user"), cache.clear):
+        generation = cache.generation
+        drop()
+        cache.put("welcome_user", source, generation)  # type: ignore[arg-type]
+        assert cache.get("welcome_user") is None
+
+    cache.put("welcome_user", source, cache.generation)  # type: ignore[arg-type]
+    assert cache.get("welcome_user") is source
+
+
+def test_shared_cache_is_disabled_by_default(monkeypatch):
+    monkeypatch.setattr(settings, "template_source_cache_ttl", 0)
+    assert get_template_source_cache() is None
+
+    monkeypatch.setattr(settings, "template_source_cache_ttl", 15)
+    cache = get_template_source_cache()
+    assert cache is not None and cache.ttl_seconds == 15
+    assert get_template_source_cache() is cache
+
+
+def test_ttl_must_be_positive():
+    with pytest.raises(ValueError):
+        TemplateSourceCache(0)
@@ -5,6 +5,7 @@ import pytest
 from fastapi_post_office.config import settings
 from fastapi_post_office.db.models import EmailTemplate, SuppressionReason
 from fastapi_post_office.service import EmailService
+from fastapi_post_office.service.validator import SuppressedRecipientError
 
 
 def test_suppression_blocks_enqueue(repo):
@@ -35,3 +36,29 @@ def test_suppression_blocks_enqueue(repo):
             context={},
             idempotency_key="k1",
         )
+
+
+def test_suppression_reports_every_blocked_recipient(repo, monkeypatch):
+    monkeypatch.setattr(settings, "block_suppressed", True)
+    repo.add_suppression("blocked@example.com", SuppressionReason.BOUNCE)
+    repo.add_suppression("gone@example.com", SuppressionReason.MANUAL)
+    repo.commit()
+    queries = []
+    find_suppressed = repo.find_suppressed
+    monkeypatch.setattr(
+        repo, "find_suppressed", lambda emails: queries.append(emails) or find_suppressed(emails)
+    )
+
+    with pytest.raises(SuppressedRecipientError) as exc_info:
+        EmailService(repo).enqueue(
+            to=["ok@example.com", "Blocked@example.com"],
+            cc=["gone@example.com"],
+            subject="Hi",
+            html=None,
+            text="Hi",
+            idempotency_key="k1",
+        )
+
+    assert exc_info.value.emails == ["Blocked@example.com", "gone@example.com"]
+    assert str(exc_info.value) == "Recipients suppressed: Blocked@example.com, gone@example.com"
+    assert len(queries) == 1
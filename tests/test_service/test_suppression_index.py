@@ -0,0 +1,171 @@
+from __future__ import annotations
+
+import uuid
+from datetime import datetime
+
+import pytest
+from sqlalchemy import insert
+
+from fastapi_post_office.config import settings
+from fastapi_post_office.db.models import EmailSuppression, SuppressionReason
+from fastapi_post_office.service import EmailService
+from fastapi_post_office.service.suppression_index import (
+    BloomFilter,
+    SuppressionIndex,
+    get_suppression_index,
+)
+from fastapi_post_office.service.validator import SuppressedRecipientError
+
+_CREATED = datetime(2024, 1, 1)
+
+
+class _Clock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_bloom_filter_memory_per_million_addresses():
+    bloom = BloomFilter(1_000_000, error_rate=0.01)
+    assert bloom.hash_count == 7
+    # ~9.6 bits per address: about 1.14 MiB per million at a 1% false-positive rate.
+    assert 1.1 * 2**20 < bloom.nbytes < 1.2 * 2**20
+    assert BloomFilter(1_000_000, error_rate=0.001).nbytes < 1.8 * 2**20
+
+
+def test_bloom_filter_has_no_false_negatives_and_bounded_false_positives():
+    bloom = BloomFilter(20_000, error_rate=0.01)
+    for i in range(20_000):
+        bloom.add(f"user{i}@example.com")
+
+    assert all(f"user{i}@example.com" in bloom for i in range(20_000))
+    false_positives = sum(f"other{i}@example.com" in bloom for i in range(20_000))
+    assert false_positives / 20_000 < 0.02
+    assert not bloom.add("user1@example.com")
+    assert len(bloom) <= 20_000
+
+
+def _service(repo, monkeypatch, clock):
+    monkeypatch.setattr(settings, "block_suppressed", True)
+    index = SuppressionIndex(60, capacity=1000, clock=clock)
+    calls = []
+    find_suppressed = repo.find_suppressed
+
+    def counting(emails):
+        emails = list(emails)
+        calls.append(emails)
+        return find_suppressed(emails)
+
+    monkeypatch.setattr(repo, "find_suppressed", counting)
+    return EmailService(repo, suppression_index=index), index, calls
+
+
+def _enqueue(service: EmailService, to: str, key: str):
+    return service.enqueue(to=[to], subject="Hi", html=None, text="Hi", idempotency_key=key)
+
+
+def test_index_answers_clean_recipients_locally(repo, monkeypatch):
+    repo.add_suppression("blocked@example.com", SuppressionReason.BOUNCE)
+    repo.commit()
+    service, index, calls = _service(repo, monkeypatch, _Clock())
+
+    _enqueue(service, "ok@example.com", "k1")
+    assert index.ready
+    assert calls == []
+
+    with pytest.raises(SuppressedRecipientError):
+        _enqueue(service, "Blocked@example.com", "k2")
+    assert calls == [["Blocked@example.com"]]
+
+
+def test_index_picks_up_new_suppressions_after_refresh_interval(repo, monkeypatch):
+    clock = _Clock()
+    service, index, _ = _service(repo, monkeypatch, clock)
+    _enqueue(service, "late@example.com", "k1")
+
+    # Written by another process: only the next refresh sees it.
+    repo.session.execute(
+        insert(EmailSuppression).values(
+            id=uuid.uuid4(), email="late@example.com", reason=SuppressionReason.COMPLAINT
+        )
+    )
+    repo.commit()
+    refresh = index.begin_refresh()
+    assert refresh is None  # not due yet
+
+    clock.now = 60
+    with pytest.raises(SuppressedRecipientError):
+        _enqueue(service, "late@example.com", "k2")
+
+
+def test_index_sees_suppressions_written_by_this_process_at_once(repo, monkeypatch):
+    service, index, _ = _service(repo, monkeypatch, _Clock())
+    _enqueue(service, "late@example.com", "k1")
+
+    repo.add_suppression("Late@example.com", SuppressionReason.COMPLAINT)
+    repo.commit()
+
+    assert index.begin_refresh() is None  # not due yet
+    with pytest.raises(SuppressedRecipientError):
+        _enqueue(service, "late@example.com", "k2")
+
+
+def test_full_reload_keeps_suppressions_noted_while_it_ran():
+    index = SuppressionIndex(10, capacity=1000, clock=_Clock())
+    refresh = index.begin_refresh()
+    assert refresh is not None
+    index.add("new@example.com")  # flushed after the reload read its rows
+    refresh.add([("old@example.com", _CREATED)])
+    refresh.commit()
+
+    assert index.candidates(["old@example.com", "new@example.com"]) == [
+        "old@example.com",
+        "new@example.com",
+    ]
+
+
+def test_index_delta_refresh_reads_since_watermark(repo):
+    repo.add_suppression("a@example.com", SuppressionReason.BOUNCE)
+    repo.commit()
+    clock = _Clock()
+    index = SuppressionIndex(10, capacity=1000, clock=clock)
+
+    refresh = index.begin_refresh()
+    assert refresh is not None and refresh.since is None
+    for rows in repo.iter_suppressions(refresh.since):
+        refresh.add(rows)
+    refresh.commit()
+
+    clock.now = 10
+    refresh = index.begin_refresh()
+    assert refresh is not None and refresh.since is not None
+    assert index.candidates(["a@example.com", "b@example.com"]) == ["a@example.com"]
+
+
+def test_index_reloads_everything_when_over_capacity():
+    clock = _Clock()
+    index = SuppressionIndex(10, capacity=10, clock=clock)
+    refresh = index.begin_refresh()
+    assert refresh is not None
+    refresh.add((f"user{i}@example.com", _CREATED) for i in range(50))
+    refresh.commit()
+
+    clock.now = 10
+    refresh = index.begin_refresh()
+    assert refresh is not None and refresh.since is None
+    refresh.add((f"user{i}@example.com", _CREATED) for i in range(50))
+    refresh.commit()
+    assert index.candidates([f"user{i}@example.com" for i in range(50)]) == [
+        f"user{i}@example.com" for i in range(50)
+    ]
+
+
+def test_shared_index_is_disabled_by_default(monkeypatch):
+    monkeypatch.setattr(settings, "suppression_index_refresh_seconds", 0)
+    assert get_suppression_index() is None
+
+    monkeypatch.setattr(settings, "suppression_index_refresh_seconds", 30)
+    index = get_suppression_index()
+    assert index is not None and get_suppression_index() is index
@@ -0,0 +1,148 @@
+from __future__ import annotations
+
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError
+
+from fastapi_post_office.db import EmailRepository, create_session_factory
+from fastapi_post_office.db.models import EmailMessage, EmailSuppression, SuppressionReason
+from fastapi_post_office.service import EmailRequest, EmailService, EnqueueOutcome
+from fastapi_post_office.service.recent_keys import RecentKeyCache
+
+
+def _enqueue(service: EmailService, key: str = "k1"):
+    return service.enqueue(
+        to=["user@example.com"], subject="Hi", html=None, text="Hello", idempotency_key=key
+    )
+
+
+def _committed_messages(repo) -> int:
+    other = create_session_factory(repo.session.get_bind())()
+    try:
+        return other.scalar(select(func.count()).select_from(EmailMessage))
+    finally:
+        other.close()
+
+
+def test_enqueue_is_committed_by_the_caller(repo):
+    dispatched: list = []
+    service = EmailService(repo, dispatcher=dispatched.extend, autocommit=False)
+
+    message = _enqueue(service)
+
+    assert _committed_messages(repo) == 0
+    assert dispatched == []
+
+    repo.session.commit()
+
+    assert _committed_messages(repo) == 1
+    assert dispatched == [message.id]
+
+
+def test_rollback_discards_message_and_dispatch(repo):
+    dispatched: list = []
+    cache = RecentKeyCache(10, 30)
+    service = EmailService(repo, dispatcher=dispatched.extend, recent_keys=cache, autocommit=False)
+
+    _enqueue(service)
+    assert cache.get("k1") is None  # published on commit only
+    repo.session.rollback()
+    repo.session.commit()
+
+    assert _committed_messages(repo) == 0
+    assert dispatched == []
+    assert cache.get("k1") is None
+
+
+def test_rolled_back_key_is_not_answered_from_the_cache(repo):
+    cache = RecentKeyCache(10, 30)
+    phantom = _enqueue(EmailService(repo, recent_keys=cache, autocommit=False))
+    phantom_id = phantom.id
+    # Until the caller commits, other sessions must go to the database.
+    assert cache.get("k1") is None
+    repo.session.rollback()
+
+    other = create_session_factory(repo.session.get_bind())()
+    try:
+        retry = _enqueue(EmailService(EmailRepository(other), recent_keys=cache))
+        retry_id = retry.id
+    finally:
+        other.close()
+
+    assert retry_id != phantom_id
+    assert _committed_messages(repo) == 1
+    assert cache.get("k1").id == retry_id
+
+
+def test_batch_conflict_keeps_the_callers_work(repo, monkeypatch):
+    EmailService(repo).enqueue(
+        to=["a@example.com"], subject="Hi", html=None, text="x", idempotency_key="k1"
+    )
+    repo.add_suppression("blocked@example.com", SuppressionReason.MANUAL)
+    # Simulate another request committing "k1" between the lookup and the insert.
+    lookup = repo.get_messages_by_idempotency
+    calls: list = []
+
+    def late_lookup(keys):
+        calls.append(keys)
+        return lookup(keys) if len(calls) > 1 else {}
+
+    monkeypatch.setattr(repo, "get_messages_by_idempotency", late_lookup)
+    service = EmailService(repo, autocommit=False)
+
+    results = service.enqueue_many(
+        [
+            EmailRequest(to=["a@example.com"], subject="Hi", text="x", idempotency_key="k1"),
+            EmailRequest(to=["b@example.com"], subject="Hi", text="x", idempotency_key="k2"),
+        ]
+    )
+    monkeypatch.undo()
+    repo.session.commit()
+
+    assert [r.outcome for r in results] == [EnqueueOutcome.DUPLICATE, EnqueueOutcome.CREATED]
+    assert _committed_messages(repo) == 2
+    assert repo.session.scalar(select(func.count()).select_from(EmailSuppression)) == 1
+
+
+def test_repeated_batch_conflict_leaves_the_callers_transaction_usable(repo, monkeypatch):
+    EmailService(repo).enqueue(
+        to=["a@example.com"], subject="Hi", html=None, text="x", idempotency_key="k1"
+    )
+    repo.add_suppression("blocked@example.com", SuppressionReason.MANUAL)
+    # Every lookup misses "k1", so the retry conflicts as well.
+    monkeypatch.setattr(repo, "get_messages_by_idempotency", lambda keys: {})
+    service = EmailService(repo, autocommit=False)
+
+    with pytest.raises(IntegrityError):
+        service.enqueue_many(
+            [EmailRequest(to=["a@example.com"], subject="Hi", text="x", idempotency_key="k1")]
+        )
+    repo.session.commit()
+
+    assert _committed_messages(repo) == 1
+    assert repo.session.scalar(select(func.count()).select_from(EmailSuppression)) == 1
+
+
+def test_after_commit_ignores_savepoints(repo):
+    events: list[str] = []
+    repo.after_commit(lambda: events.append("commit"), lambda: events.append("rollback"))
+
+    with repo.session.begin_nested():
+        pass
+    assert events == []
+
+    repo.commit()
+    repo.commit()
+    assert events == ["commit"]
+
+
+def test_other_sessions_are_not_affected(repo):
+    events: list[str] = []
+    repo.after_commit(lambda: events.append("commit"))
+    other = EmailRepository(create_session_factory(repo.session.get_bind())())
+    try:
+        other.commit()
+    finally:
+        other.session.close()
+
+    assert events == []
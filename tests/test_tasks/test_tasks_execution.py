@@ -4,6 +4,8 @@ import importlib
 import sys
 from datetime import datetime, timedelta, timezone
 
+import pytest
+
 from fastapi_post_office.config import settings
 from fastapi_post_office.db import (
     Base,
@@ -11,7 +13,7 @@ from fastapi_post_office.db import (
     create_engine_from_url,
     create_session_factory,
 )
-from fastapi_post_office.db.models import EmailMessage, EmailStatus
+from fastapi_post_office.db.models import EmailBody, EmailMessage, EmailStatus
 
 
 def _install_fake_celery():
@@ -91,3 +93,31 @@ def test_send_and_retry_tasks(tmp_path):
     settings.retention_days = 0
     deleted = periodic_module.cleanup_sent_messages()
     assert deleted >= 0
+
+
+@pytest.mark.parametrize("dedupe_bodies", [False, True])
+def test_cleanup_prunes_bodies_only_with_dedupe(tmp_path, monkeypatch, dedupe_bodies):
+    _install_fake_celery()
+    db_url = f"sqlite+pysqlite:///{tmp_path / 'cleanup.db'}"
+    monkeypatch.setattr(settings, "database_url", db_url)
+    monkeypatch.setattr(settings, "dedupe_bodies", dedupe_bodies)
+    engine = create_engine_from_url(db_url)
+    Base.metadata.create_all(engine)
+    if not dedupe_bodies:
+        # A database upgraded without the optional email_bodies table.
+        EmailBody.__table__.drop(engine)
+    engine.dispose()
+    calls = []
+    original = EmailRepository.cleanup_bodies
+
+    def cleanup_bodies(self, *args, **kwargs):
+        calls.append(args)
+        return original(self, *args, **kwargs)
+
+    monkeypatch.setattr(EmailRepository, "cleanup_bodies", cleanup_bodies)
+    periodic_module = importlib.reload(
+        importlib.import_module("fastapi_post_office.tasks.periodic")
+    )
+
+    assert periodic_module.cleanup_sent_messages() == 0
+    assert len(calls) == int(dedupe_bodies)
@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import json
+from dataclasses import replace
+
+import pytest
+
+from fastapi_post_office.config import settings
+from fastapi_post_office.templates.bundle import (
+    BundleError,
+    TemplateBundle,
+    write_bundle,
+)
+from fastapi_post_office.templates.loader import load_templates
+from fastapi_post_office.templates.partials import make_partial
+
+
+def test_bundle_round_trip(template_dir, tmp_path):
+    source = load_templates(template_dir, max_bytes=10_000)[0]
+    footer = make_partial("footer.j2", "Bye")
+    path = tmp_path / "templates.fapo"
+
+    size = write_bundle(path, [source], [footer])
+
+    assert path.stat().st_size == size
+    with TemplateBundle(path) as bundle:
+        assert bundle.names() == ["welcome_user"] and len(bundle) == 1
+        assert "welcome_user" in bundle
+        loaded = bundle.get("welcome_user")
+        assert loaded == source
+        assert loaded is bundle.get("welcome_user")
+        assert bundle.get("missing") is None
+        assert bundle.get_partials(["footer.j2", "missing.j2"]) == [footer]
+        assert bundle.get_partials() == [footer]
+
+
+def test_bundle_decodes_entries_lazily(template_dir, tmp_path, monkeypatch):
+    source = load_templates(template_dir, max_bytes=10_000)[0]
+    path = tmp_path / "templates.fapo"
+    write_bundle(path, [source])
+    decoded = []
+    real_loads = json.loads
+    monkeypatch.setattr(
+        "fastapi_post_office.templates.bundle.json.loads",
+        lambda data: decoded.append(len(data)) or real_loads(data),
+    )
+
+    bundle = TemplateBundle(path)
+    assert len(decoded) == 1  # index only
+    bundle.get("welcome_user")
+    bundle.get("welcome_user")
+    assert len(decoded) == 2
+    bundle.close()
+
+
+def test_bundle_rejects_foreign_or_newer_files(tmp_path):
+    path = tmp_path / "templates.fapo"
+    path.write_bytes(b"not a bundle at all")
+    with pytest.raises(BundleError, match="Not a template bundle"):
+        TemplateBundle(path)
+
+    write_bundle(path, [])
+    data = bytearray(path.read_bytes())
+    data[8] = 99
+    path.write_bytes(bytes(data))
+    with pytest.raises(BundleError, match="version 99"):
+        TemplateBundle(path)
+
+    with pytest.raises(BundleError):
+        TemplateBundle(tmp_path / "missing.fapo")
+
+
+def test_bundle_vets_templates_in_trusted_mode(template_dir, tmp_path, monkeypatch):
+    source = load_templates(template_dir, max_bytes=10_000)[0]
+    unsafe = replace(
+        source, html_template="{{ cycler.__init__.__globals__ }}", source_hash="unsafe"
+    )
+    path = tmp_path / "templates.fapo"
+    write_bundle(path, [unsafe], [make_partial("footer.j2", "{{ x.__class__ }}")])
+
+    with TemplateBundle(path) as bundle:
+        assert bundle.get("welcome_user") is not None
+    monkeypatch.setattr(settings, "trusted_templates", True)
+    with TemplateBundle(path) as bundle:
+        with pytest.raises(BundleError, match="Unsafe attribute access"):
+            bundle.get("welcome_user")
+        with pytest.raises(BundleError, match="Unsafe attribute access"):
+            bundle.get_partials()
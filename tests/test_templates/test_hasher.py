@@ -1,6 +1,10 @@
 from __future__ import annotations
 
-from fastapi_post_office.templates.hasher import compute_source_hash
+import hashlib
+import os
+
+from fastapi_post_office.templates import hasher
+from fastapi_post_office.templates.hasher import HashCache, compute_source_hash
 
 
 def test_hasher_changes(tmp_path):
@@ -12,3 +16,86 @@ def test_hasher_changes(tmp_path):
     b.write_text("three", encoding="utf-8")
     h2 = compute_source_hash(a, b)
     assert h1 != h2
+
+
+def _age(*paths, seconds: int = 60) -> None:
+    # Entries for files modified within the last couple of seconds are not cached.
+    for path in paths:
+        stat = path.stat()
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns - seconds * 1_000_000_000))
+
+
+def test_chunked_hash_matches_whole_file_hash(tmp_path, monkeypatch):
+    monkeypatch.setattr(hasher, "_CHUNK_SIZE", 4)
+    a = tmp_path / "a.txt"
+    a.write_text("0123456789", encoding="utf-8")
+    expected = hashlib.sha256(b"a.txt" + b"0123456789").hexdigest()
+    assert compute_source_hash(a, tmp_path / "missing.txt") == expected
+
+
+def test_hash_cache_skips_reading_unchanged_files(tmp_path, monkeypatch):
+    a = tmp_path / "a.txt"
+    a.write_text("one", encoding="utf-8")
+    _age(a)
+    cache = HashCache.for_root(tmp_path)
+    first = compute_source_hash(a, cache=cache)
+    cache.save()
+
+    def fail(paths):
+        raise AssertionError("file was re-read")
+
+    monkeypatch.setattr(hasher, "_hash_paths", fail)
+    reloaded = HashCache.for_root(tmp_path)
+    assert compute_source_hash(a, cache=reloaded) == first
+
+
+def test_hash_cache_detects_changes_and_racy_files(tmp_path):
+    a = tmp_path / "a.txt"
+    a.write_text("one", encoding="utf-8")
+    _age(a)
+    cache = HashCache.for_root(tmp_path)
+    first = compute_source_hash(a, cache=cache)
+    assert len(cache) == 1
+
+    a.write_text("two", encoding="utf-8")
+    second = compute_source_hash(a, cache=cache)
+    assert second != first
+    # Just modified: hashed, but not cached until its mtime is safely in the past.
+    assert len(cache) == 0
+
+
+def test_hash_cache_ignores_corrupt_file_and_prunes_unused_entries(tmp_path):
+    (tmp_path / ".fapo-cache").write_text("not json", encoding="utf-8")
+    a = tmp_path / "a.txt"
+    b = tmp_path / "b.txt"
+    a.write_text("one", encoding="utf-8")
+    b.write_text("two", encoding="utf-8")
+    _age(a, b)
+
+    cache = HashCache.for_root(tmp_path)
+    compute_source_hash(a, cache=cache)
+    compute_source_hash(b, cache=cache)
+    cache.save()
+
+    cache = HashCache.for_root(tmp_path)
+    assert len(cache) == 2
+    compute_source_hash(a, cache=cache)
+    cache.save()
+    assert len(HashCache.for_root(tmp_path)) == 1
+
+
+def test_hash_cache_can_live_outside_the_root(tmp_path):
+    root = tmp_path / "templates"
+    root.mkdir()
+    a = root / "a.txt"
+    a.write_text("one", encoding="utf-8")
+    _age(a)
+    cache_file = tmp_path / "cache" / "hashes.json"
+    cache_file.parent.mkdir()
+
+    cache = HashCache.for_root(root, cache_file)
+    compute_source_hash(a, cache=cache)
+    cache.save()
+
+    assert not (root / ".fapo-cache").exists()
+    assert len(HashCache.for_root(root, cache_file)) == 1
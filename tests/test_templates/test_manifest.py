@@ -10,3 +10,13 @@ def test_manifest_missing_fields(tmp_path):
     path.write_text("{}", encoding="utf-8")
     with pytest.raises(ManifestError):
         load_manifest(path)
+
+
+def test_manifest_optional_vars_must_be_strings(tmp_path):
+    path = tmp_path / "manifest.json"
+    path.write_text(
+        '{"name":"x","revision":1,"description":"x","required_vars":[],"optional_vars":[1]}',
+        encoding="utf-8",
+    )
+    with pytest.raises(ManifestError):
+        load_manifest(path)
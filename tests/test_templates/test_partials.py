@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+import pytest
+
+from fastapi_post_office.templates.loader import TemplateLoadError, load_templates, template_dirs
+from fastapi_post_office.templates.partials import (
+    PartialError,
+    PartialRegistry,
+    find_dependencies,
+    load_partials,
+    make_partial,
+    partial_registry,
+)
+from fastapi_post_office.templates.renderer import render_template
+
+
+@pytest.fixture()
+def layout_root(template_dir):
+    partials = template_dir / "_partials" / "layouts"
+    partials.mkdir(parents=True)
+    (partials / "base.j2").write_text(
+        "<html>{% block body %}{% endblock %}{% include 'footer.j2' %}</html>", encoding="utf-8"
+    )
+    (template_dir / "_partials" / "footer.j2").write_text(
+        "<footer>{{ company }}</footer>", encoding="utf-8"
+    )
+    (template_dir / "welcome_user" / "html.j2").write_text(
+        "{% extends 'layouts/base.j2' %}{% block body %}Hello {{ first_name }}{% endblock %}",
+        encoding="utf-8",
+    )
+    yield template_dir
+    partial_registry.clear()
+
+
+def test_load_templates_tracks_partial_dependencies(layout_root):
+    partials = {p.name: p for p in load_partials(layout_root, max_bytes=10_000)}
+    assert sorted(partials) == ["footer.j2", "layouts/base.j2"]
+
+    source = load_templates(layout_root, max_bytes=10_000)[0]
+    assert source.dependencies == {
+        "layouts/base.j2": partials["layouts/base.j2"].source_hash,
+        "footer.j2": partials["footer.j2"].source_hash,
+    }
+    assert source.template_vars is not None and "company" in source.template_vars
+
+
+def test_render_with_layout_and_partial_update(layout_root):
+    partial_registry.update(load_partials(layout_root, max_bytes=10_000))
+    source = load_templates(layout_root, max_bytes=10_000)[0]
+    context = {"first_name": "Ana", "company": "ACME"}
+
+    rendered = render_template(source, context, strict=True, max_bytes=10_000)
+    assert rendered.html == "<html>Hello Ana<footer>ACME</footer></html>"
+
+    partial_registry.update([make_partial("footer.j2", "<p>{{ company }}</p>")])
+    assert partial_registry.stale(source.dependencies) == ["footer.j2"]
+    rendered = render_template(source, context, strict=True, max_bytes=10_000)
+    assert rendered.html == "<html>Hello Ana<p>ACME</p></html>"
+
+
+def test_only_the_partials_directory_is_skipped(layout_root):
+    (layout_root / "_legacy").mkdir()
+
+    assert [d.name for d in template_dirs(layout_root)] == ["_legacy", "welcome_user"]
+
+
+def test_unknown_partial_fails_load(template_dir):
+    (template_dir / "welcome_user" / "html.j2").write_text(
+        "{% include 'missing.j2' %}", encoding="utf-8"
+    )
+    with pytest.raises(TemplateLoadError):
+        load_templates(template_dir, max_bytes=10_000)
+
+
+def test_find_dependencies_and_registry_helpers():
+    a = make_partial("a.j2", "{% include 'b.j2' %}{% include name %}")
+    b = make_partial("b.j2", "{% include 'a.j2' %}")
+    deps = find_dependencies(["{% include 'a.j2' %}", None], {"a.j2": a, "b.j2": b})
+    assert deps == {"a.j2": a.source_hash, "b.j2": b.source_hash}
+    with pytest.raises(PartialError):
+        find_dependencies(["{% include 'c.j2' %}"], {})
+
+    registry = PartialRegistry()
+    registry.update([a])
+    assert registry.stale(deps) == ["b.j2"]
+    assert registry.resolve(deps) == [a]
+    assert registry.list_templates() == ["a.j2"]
+    assert registry.get("a.j2") == a
+
+
+def test_partial_size_limit(layout_root):
+    with pytest.raises(PartialError):
+        load_partials(layout_root, max_bytes=10)
@@ -21,3 +21,50 @@ def test_load_template_missing_subject(tmp_path):
     )
     with pytest.raises(TemplateLoadError):
         load_template_dir(tdir, max_bytes=10_000)
+
+
+def test_load_template_discovers_vars(tmp_path):
+    tdir = tmp_path / "promo"
+    tdir.mkdir()
+    (tdir / "manifest.json").write_text(
+        '{"name":"promo","revision":1,"description":"x","required_vars":[],'
+        '"optional_vars":["coupon"]}',
+        encoding="utf-8",
+    )
+    (tdir / "subject.j2").write_text("Hi {{ user.first_name }}", encoding="utf-8")
+    (tdir / "text.j2").write_text(
+        "{% set n = items|length %}{{ n }}{% for i in items %}{{ loop.index }}{% endfor %}"
+        "{% if coupon is defined %}{{ coupon }}{% endif %}{{ range(2)|list }}",
+        encoding="utf-8",
+    )
+    source = load_template_dir(tdir, max_bytes=10_000)
+    assert source.template_vars == ("items", "user")
+
+
+def test_load_template_invalid_syntax(template_dir):
+    tdir = template_dir / "welcome_user"
+    (tdir / "html.j2").write_text("{% if %}", encoding="utf-8")
+    with pytest.raises(TemplateLoadError):
+        load_template_dir(tdir, max_bytes=10_000)
+
+
+def test_load_template_leaves_guarded_vars_optional(template_dir):
+    tdir = template_dir / "welcome_user"
+    (tdir / "text.j2").write_text(
+        "Hi {{ first_name }}{{ promo | default('') }}{% if nick is defined %}{{ nick }}{% endif %}"
+        "{{ '!' if vip is defined else '' }}{{ alias | d(first_name) }}",
+        encoding="utf-8",
+    )
+    source = load_template_dir(tdir, max_bytes=10_000)
+    assert source.template_vars == ("first_name",)
+
+
+def test_load_template_requires_branched_and_partly_guarded_vars(template_dir):
+    tdir = template_dir / "welcome_user"
+    (tdir / "text.j2").write_text(
+        "Hi {{ first_name }}{% if vip %}!{% endif %}{{ 'a' if beta else 'b' }}"
+        "{{ promo | default('') }}{{ promo.upper() }}",
+        encoding="utf-8",
+    )
+    source = load_template_dir(tdir, max_bytes=10_000)
+    assert source.template_vars == ("beta", "first_name", "promo", "vip")
@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import os
+import shutil
+import time
+
+import pytest
+
+from fastapi_post_office.config import Settings
+from fastapi_post_office.service import EmailService
+from fastapi_post_office.templates.partials import partial_registry
+from fastapi_post_office.templates.renderer import compile_template, template_cache
+from fastapi_post_office.templates.watcher import TemplateWatcher
+
+
+def _write(path, text: str) -> None:
+    # Bump the mtime explicitly: two writes within one filesystem tick could
+    # otherwise leave it unchanged.
+    previous = path.stat().st_mtime_ns if path.exists() else 0
+    path.write_text(text, encoding="utf-8")
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, max(stat.st_mtime_ns, previous + 1_000_000)))
+
+
+@pytest.fixture()
+def watcher(template_dir):
+    watcher = TemplateWatcher(template_dir, max_bytes=10_000)
+    yield watcher
+    watcher.stop()
+    partial_registry.clear()
+
+
+def test_watcher_reloads_only_changed_templates(template_dir, watcher):
+    assert watcher.names() == ["welcome_user"]
+    assert watcher.scan() == []
+
+    old = watcher.get("welcome_user")
+    assert old is not None
+    template_cache.clear()
+    compile_template(old, strict=True)
+    assert len(template_cache) == 1
+
+    _write(template_dir / "welcome_user" / "subject.j2", "Welcome {{ first_name }}")
+    assert watcher.scan() == ["welcome_user"]
+
+    new = watcher.get("welcome_user")
+    assert new is not None and new.subject_template == "Welcome {{ first_name }}"
+    assert new.source_hash != old.source_hash
+    # Only the vetting compile of the new revision is left.
+    assert template_cache.invalidate(lambda key: key[2] == old.source_hash) == 0
+    assert len(template_cache) == 1
+
+
+def test_watcher_keeps_last_good_version_on_errors(template_dir, watcher):
+    good = watcher.get("welcome_user")
+    _write(template_dir / "welcome_user" / "subject.j2", "Hi {{ first_name ")
+
+    assert watcher.scan() == []
+    assert watcher.get("welcome_user") == good
+    assert template_dir / "welcome_user" in watcher.errors
+
+    _write(template_dir / "welcome_user" / "subject.j2", "Hey {{ first_name }}")
+    assert watcher.scan() == ["welcome_user"]
+    assert not watcher.errors
+
+
+def test_watcher_rejects_templates_that_fail_vetting(template_dir, watcher):
+    good = watcher.get("welcome_user")
+    _write(
+        template_dir / "welcome_user" / "html.j2", "{{ cycler.__init__.__globals__.os.getcwd() }}"
+    )
+
+    assert watcher.scan() == []
+    assert watcher.get("welcome_user") == good
+    assert "Unsafe attribute access" in watcher.errors[template_dir / "welcome_user"]
+
+
+def test_watcher_reloads_dependents_of_changed_partials(template_dir):
+    (template_dir / "_partials").mkdir()
+    _write(template_dir / "_partials" / "footer.j2", "Bye")
+    _write(template_dir / "welcome_user" / "text.j2", "Hi {% include 'footer.j2' %}")
+    watcher = TemplateWatcher(template_dir, max_bytes=10_000)
+    try:
+        before = watcher.get("welcome_user")
+        assert before is not None and before.dependencies is not None
+
+        _write(template_dir / "_partials" / "footer.j2", "Cheers {{ signature }}")
+        assert watcher.scan() == ["welcome_user"]
+
+        after = watcher.get("welcome_user")
+        assert after is not None and after.dependencies is not None
+        assert after.dependencies["footer.j2"] != before.dependencies["footer.j2"]
+        assert after.template_vars is not None and "signature" in after.template_vars
+        assert partial_registry.stale(after.dependencies) == []
+        assert [p.name for p in watcher.get_partials(["footer.j2"])] == ["footer.j2"]
+    finally:
+        partial_registry.clear()
+
+
+def test_watcher_drops_removed_templates(template_dir, watcher):
+    shutil.rmtree(template_dir / "welcome_user")
+    assert watcher.scan() == []
+    assert watcher.get("welcome_user") is None
+
+
+def test_background_watcher_reloads_within_a_second(template_dir):
+    with TemplateWatcher(template_dir, max_bytes=10_000, interval=0.05) as watcher:
+        _write(template_dir / "welcome_user" / "subject.j2", "Live {{ first_name }}")
+        deadline = time.monotonic() + 1.0
+        while time.monotonic() < deadline:
+            source = watcher.get("welcome_user")
+            if source is not None and source.subject_template.startswith("Live"):
+                break
+            time.sleep(0.01)
+        else:
+            pytest.fail("template was not reloaded within a second")
+    partial_registry.clear()
+
+
+def test_watcher_is_rejected_in_production(tmp_path):
+    config = Settings(env="production", template_watch_path=str(tmp_path))
+    with pytest.raises(RuntimeError, match="TEMPLATE_WATCH_PATH"):
+        config.validate_runtime_safety()
+
+
+def test_service_picks_up_edits_without_sync(template_dir, watcher, repo):
+    service = EmailService(repo, template_provider=watcher)
+    first = service.enqueue_template(
+        template_name="welcome_user",
+        to=["user@example.com"],
+        context={"first_name": "Ana"},
+        idempotency_key="watch-1",
+    )
+    _write(template_dir / "welcome_user" / "subject.j2", "Hello again {{ first_name }}")
+    watcher.scan()
+    second = service.enqueue_template(
+        template_name="welcome_user",
+        to=["user@example.com"],
+        context={"first_name": "Ana"},
+        idempotency_key="watch-2",
+    )
+    assert (first.subject, second.subject) == ("Hi Ana", "Hello again Ana")